@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List
+
+from db.models import Inventory, InventoryCreate, InventoryUpdate
+from services import inventories as inventory_service
+from services.inventory_parser import InventoryError
+from core.security import RoleChecker
+
+router = APIRouter()
+
+@router.get("/", response_model=List[Inventory], response_model_exclude={"__all__": {"content"}})
+async def get_inventories():
+    """
+    Get all stored inventories, without their content.
+    """
+    return await inventory_service.get_all_inventories()
+
+@router.get("/{inventory_id}", response_model=Inventory)
+async def get_inventory(inventory_id: str):
+    """
+    Get an inventory by ID.
+    """
+    inventory = await inventory_service.get_inventory_by_id(inventory_id)
+    if not inventory:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
+    return inventory
+
+@router.post("/", response_model=Inventory)
+async def create_inventory(
+    inventory: InventoryCreate,
+    _: bool = Depends(RoleChecker(["admin"]))
+):
+    """
+    Store a new INI or YAML inventory. Requires admin role.
+    """
+    try:
+        return await inventory_service.create_inventory(inventory)
+    except InventoryError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid inventory: {e}")
+
+@router.put("/{inventory_id}", response_model=Inventory)
+async def update_inventory(
+    inventory_id: str,
+    inventory_update: InventoryUpdate,
+    _: bool = Depends(RoleChecker(["admin"]))
+):
+    """
+    Update an inventory. Requires admin role.
+    """
+    try:
+        inventory = await inventory_service.update_inventory(inventory_id, inventory_update)
+    except InventoryError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid inventory: {e}")
+    if not inventory:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
+    return inventory
+
+@router.delete("/{inventory_id}")
+async def delete_inventory(
+    inventory_id: str,
+    _: bool = Depends(RoleChecker(["admin"]))
+):
+    """
+    Delete an inventory. Requires admin role.
+    """
+    if not await inventory_service.delete_inventory(inventory_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
+    return {"message": "Inventory deleted successfully"}
+
+@router.get("/{inventory_id}/hosts")
+async def get_inventory_hosts(
+    inventory_id: str,
+    pattern: str = "all",
+    limit: str | None = None,
+    max_hosts: int = Query(1000, ge=0, le=100000),
+):
+    """
+    Resolve a host pattern (and an optional `--limit` style pattern) against
+    an inventory. Returns the number of matching hosts and the first
+    `max_hosts` of them.
+    """
+    inventory = await inventory_service.get_inventory_by_id(inventory_id)
+    if not inventory:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
+    try:
+        hosts = await inventory_service.resolve_targets(inventory.content, [pattern], limit)
+    except InventoryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"count": len(hosts), "hosts": hosts[:max_hosts]}
@@ -1,17 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from db.models import Project, ProjectCreate, ProjectUpdate, ProjectSync
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+from db.models import Project, ProjectCreate, ProjectUpdate, ProjectSync, PlaybookInfo
 from services import projects as project_service
 from core.security import RoleChecker
+from bson.errors import InvalidId
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 @router.get("/", response_model=List[Project])
-async def get_projects():
+async def get_projects(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    name: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    """
+    Get projects, one page at a time.
+
+    Pages are ordered by ID. When more projects exist, the `X-Next-Cursor`
+    header holds the value to pass as `after` for the next page. `fields`
+    takes a comma-separated list of fields to return. With `format=ndjson`
+    all matching projects are streamed, one JSON document per line.
+    """
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        if format == "ndjson":
+            stream = project_service.stream_projects(limit, after, status_filter, name, field_list)
+            return StreamingResponse(stream, media_type="application/x-ndjson")
+
+        documents, next_cursor = await project_service.list_projects(
+            limit or DEFAULT_PAGE_SIZE, after, status_filter, name, field_list
+        )
+    except (InvalidId, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if field_list:
+        return Response(
+            project_service.encode_projects(documents),
+            media_type="application/json",
+            headers=headers,
+        )
+    response.headers.update(headers)
+    return [Project(**document) for document in documents]
+
+@router.get("/sync/stats")
+async def get_sync_stats():
     """
-    Get all projects.
+    Returns counters of started and coalesced project syncs in this process.
     """
-    return await project_service.get_all_projects()
+    return project_service.sync_stats
 
 @router.get("/{project_id}", response_model=Project)
 async def get_project(project_id: str):
@@ -109,4 +154,24 @@ async def get_project_playbooks(project_id: str):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get project playbooks: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/{project_id}/playbooks/details", response_model=List[PlaybookInfo])
+async def get_project_playbook_details(project_id: str):
+    """
+    Get the playbooks of a project with their hosts, variables and tags.
+    """
+    project = await project_service.get_project_by_id(project_id)
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+    try:
+        return await project_service.get_project_playbook_index(project_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get project playbooks: {str(e)}"
+        )
@@ -1,48 +1,469 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-import os
+from fastapi import APIRouter, HTTPException, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from email.utils import parsedate_to_datetime
+import asyncio
+import hashlib
+import json
+import time
 import uuid
+from datetime import datetime, timedelta
 
-from services.ansible_runner import execute_ansible_playbook
-from store import task_results
-from schemas.task import RunPlaybookRequest
+from services.dispatch import cancel_job, submit_batch, submit_job
+from services.scheduler import scheduler
+from services import event_index, inventories as inventory_service
+from services.inventory_parser import InventoryError
+from services.artifact_store import artifact_store
+from services.events import event_bus
+from services.jobs import STATUS_FIELDS, TERMINAL_STATUSES, job_repository, summarize_group, to_response
+from services.playbook_catalog import playbook_catalog
+from services.progress import HOST_OUTCOMES, host_status
+from core.config import settings
+from schemas.task import EventOutcome, RunBatchRequest, RunPlaybookRequest, TaskView, TaskWaitUntil
 
 router = APIRouter()
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Returns whether an If-None-Match header names the given ETag.
+    """
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags or "*" in tags
+
 @router.get("/playbooks")
-def list_playbooks():
+def list_playbooks(
+    if_none_match: str | None = Header(None),
+    if_modified_since: str | None = Header(None),
+):
+    """
+    Lists all available Ansible playbooks in the 'ansible' directory.
+
+    The list is served from memory and only rebuilt when the directory
+    changes. Responses carry ETag and Last-Modified headers, and conditional
+    requests for an unchanged list are answered with 304 Not Modified.
     """
-    Lists all available Ansible playbooks by scanning the 'ansible' directory.
+    snapshot = playbook_catalog.snapshot()
+    headers = {
+        "ETag": snapshot.etag,
+        "Last-Modified": snapshot.last_modified_header,
+        "Cache-Control": "no-cache",
+    }
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, snapshot.etag)
+    elif if_modified_since is not None:
+        try:
+            not_modified = snapshot.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            not_modified = False
+    else:
+        not_modified = False
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"playbooks": snapshot.playbooks}, headers=headers)
+
+async def _resolve_inventory(playbook_name: str, request: RunPlaybookRequest) -> tuple[str | None, int | None]:
     """
-    ansible_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'ansible'))
-    playbooks = []
-    for filename in os.listdir(ansible_dir):
-        if filename.endswith(".yml"):
-            playbooks.append(filename.replace(".yml", ""))
-    return {"playbooks": playbooks}
+    Returns the inventory text of a run request and the number of hosts it
+    targets, or None when that cannot be known before the run.
+
+    Raises:
+        HTTPException: If the inventory is missing or invalid, or no host
+            matches the playbook's host patterns and the limit.
+    """
+    if request.inventory is not None and request.inventory_id is not None:
+        raise HTTPException(status_code=422, detail="Pass either inventory or inventory_id, not both")
+    content = request.inventory
+    if request.inventory_id is not None:
+        stored = await inventory_service.get_inventory_by_id(request.inventory_id)
+        if not stored:
+            raise HTTPException(status_code=404, detail="Inventory not found")
+        content = stored.content
+    if not content:
+        return None, None
+
+    patterns = playbook_catalog.host_patterns(playbook_name) or ["all"]
+    if any("{{" in pattern for pattern in patterns):
+        # Templated host patterns are only known once Ansible runs.
+        return content, None
+    try:
+        targets = await inventory_service.resolve_targets(content, patterns, request.limit)
+    except InventoryError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid inventory: {e}")
+    if not targets:
+        detail = f"No hosts match {', '.join(patterns)}"
+        if request.limit:
+            detail += f" with limit {request.limit}"
+        raise HTTPException(status_code=422, detail=detail)
+    return content, len(targets)
 
 @router.post("/playbooks/{playbook_name}/run", status_code=202)
-def run_playbook(playbook_name: str, request: RunPlaybookRequest, background_tasks: BackgroundTasks):
+async def run_playbook(playbook_name: str, request: RunPlaybookRequest, response: Response):
     """
-    Triggers the execution of a specific Ansible playbook in the background.
+    Queues a specific Ansible playbook for execution by the job scheduler,
+    or by a runner worker when jobs are dispatched through the broker.
     A unique task ID is generated to track the execution status.
+
+    The inventory is given inline or as the ID of a stored inventory. Its
+    hosts are matched against the playbook's host patterns and `limit`
+    before the job is queued, and requests that target no host are rejected.
+
+    The ETag header is that of the task's status view, so a client can
+    long-poll for the first status change right away.
     """
+    if not playbook_catalog.exists(playbook_name):
+        raise HTTPException(status_code=404, detail=f"Playbook {playbook_name}.yml not found")
+    inventory, target_hosts = await _resolve_inventory(playbook_name, request)
+
     task_id = str(uuid.uuid4())
-    task_results[task_id] = {"status": "running", "data": None}
-    background_tasks.add_task(
-        execute_ansible_playbook, 
-        task_id, 
-        playbook_name, 
-        inventory=request.inventory, 
-        extra_vars=request.extra_vars
+    position = await submit_job(
+        task_id,
+        playbook_name,
+        inventory=inventory,
+        extra_vars=request.extra_vars,
+        project_id=request.project_id,
+        priority=request.priority,
+        limit=request.limit,
     )
-    return {"task_id": task_id}
+    job = await job_repository.get(task_id, STATUS_FIELDS)
+    if job:
+        response.headers["ETag"] = _task_etag(job, "status")
+    return {"task_id": task_id, "queue_position": position, "target_hosts": target_hosts}
+
+@router.post("/playbooks/batch", status_code=202)
+async def run_playbook_batch(request: RunBatchRequest):
+    """
+    Queues several playbook runs as one group, e.g. the same playbook
+    against many inventories. Follow them all with `GET /groups/{group_id}`.
+
+    Every job is validated as by `POST /playbooks/{playbook_name}/run`
+    before any is queued. Errors name the failing job by its index in
+    `jobs`.
+    """
+    resolved = []
+    for index, job in enumerate(request.jobs):
+        try:
+            if not playbook_catalog.exists(job.playbook):
+                raise HTTPException(status_code=404, detail=f"Playbook {job.playbook}.yml not found")
+            resolved.append(await _resolve_inventory(job.playbook, job))
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"jobs[{index}]: {e.detail}")
+
+    group_id = str(uuid.uuid4())
+    specs = [
+        {
+            "task_id": str(uuid.uuid4()),
+            "playbook": job.playbook,
+            "inventory": inventory,
+            "extra_vars": job.extra_vars,
+            "project_id": job.project_id,
+            "priority": job.priority,
+            "limit": job.limit,
+        }
+        for job, (inventory, _) in zip(request.jobs, resolved)
+    ]
+    positions = await submit_batch(group_id, specs)
+    return {
+        "group_id": group_id,
+        "jobs": [
+            {"task_id": spec["task_id"], "queue_position": position, "target_hosts": target_hosts}
+            for spec, position, (_, target_hosts) in zip(specs, positions, resolved)
+        ],
+    }
+
+@router.get("/groups/{group_id}")
+async def get_group_status(
+    group_id: str,
+    response: Response,
+    if_none_match: str | None = Header(None),
+):
+    """
+    Returns the aggregated status of a group of jobs queued together, with
+    the status of each job in submission order, from a single query.
+
+    Responses carry an ETag, and conditional requests for an unchanged
+    group are answered with 304 Not Modified.
+    """
+    jobs = await job_repository.list_group(group_id, STATUS_FIELDS)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Group not found")
+    body = {
+        "group_id": group_id,
+        **summarize_group(jobs),
+        "jobs": [to_response(job, "status") for job in jobs],
+    }
+    etag = _content_etag(body, "g")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return body
+
+@router.get("/playbooks/{playbook_name}/hosts")
+async def get_playbook_hosts(
+    playbook_name: str,
+    outcome: EventOutcome = "changed",
+    hours: float = Query(24, gt=0),
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Lists the hosts with a given outcome in any run of a playbook during the
+    last `hours`, along with the jobs and tasks concerned.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return {"hosts": await event_index.playbook_hosts(playbook_name, outcome, since, limit)}
+
+@router.get("/events")
+async def query_events(
+    job_id: str | None = None,
+    playbook: str | None = None,
+    host: str | None = None,
+    task: str | None = None,
+    play: str | None = None,
+    outcome: EventOutcome | None = None,
+    hours: float | None = Query(None, gt=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Searches the indexed host results (runner_on_ok, runner_on_failed, ...)
+    of all jobs by job, playbook, host, task, play, outcome and age.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours) if hours else None
+    events = await event_index.find_events(
+        job_id=job_id, playbook=playbook, host=host, task=task,
+        play=play, outcome=outcome, since=since, limit=limit,
+    )
+    return {"events": events}
+
+@router.get("/scheduler/stats")
+def get_scheduler_stats():
+    """
+    Returns queue depth, running jobs and queue wait times of the job scheduler.
+    """
+    return scheduler.stats()
+
+def _content_etag(body: dict, prefix: str) -> str:
+    digest = hashlib.blake2b(json.dumps(body, default=str).encode(), digest_size=8)
+    return f'"{prefix}-{digest.hexdigest()}"'
+
+def _task_etag(job: dict, view: TaskView) -> str:
+    if view == "status":
+        # Derived from the content, so it only changes with the fields of the view.
+        return _content_etag(to_response(job, view), "s")
+    return f'"{job.get("version", 0)}"'
 
 @router.get("/tasks/{task_id}")
-def get_task_result(task_id: str):
+async def get_task_result(
+    task_id: str,
+    response: Response,
+    view: TaskView = "full",
+    wait: float = Query(0, ge=0, le=settings.TASK_WAIT_MAX_SECONDS),
+    until: TaskWaitUntil = "change",
+    if_none_match: str | None = Header(None),
+):
     """
     Retrieves the current status and result of a previously triggered playbook execution task.
+
+    Responses carry an ETag; a request whose If-None-Match names the
+    current one is answered with 304 Not Modified. With `wait`, such a
+    request is held until the task changes or `wait` seconds pass, so a
+    client follows a task with one request per change instead of polling.
+    `view=status` returns the status, timestamps and outcome only, and
+    with `wait` returns when the status changes. With `until=finished` the
+    request is held until the task finishes, so a client that only needs
+    the outcome follows a task with a single request.
     """
-    result = task_results.get(task_id)
-    if not result:
+    fields = STATUS_FIELDS if view == "status" else None
+    job = await job_repository.get(task_id, fields)
+    if not job:
         raise HTTPException(status_code=404, detail="Task not found")
-    return result
\ No newline at end of file
+    etag = _task_etag(job, view)
+    deadline = time.monotonic() + wait
+    while job["status"] not in TERMINAL_STATUSES and (until == "finished" or _etag_matches(if_none_match, etag)):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        changed = await job_repository.wait_for_change(task_id, job.get("version", 0), remaining, fields)
+        if changed is None:
+            break
+        job, etag = changed, _task_etag(changed, view)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return to_response(job, view)
+
+@router.post("/tasks/{task_id}/cancel", status_code=202)
+async def cancel_task(task_id: str):
+    """
+    Cancels a queued or running task.
+
+    A queued task is dropped at once (`status` is "canceled"). A running task
+    is stopped together with every process it started and ends with the
+    status "canceled" shortly after (`status` is "canceling").
+    """
+    status = await cancel_job(task_id)
+    if status is None:
+        job = await job_repository.get(task_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Task not found")
+        raise HTTPException(status_code=409, detail=f"Task already finished with status {job['status']}")
+    return {"task_id": task_id, "status": status}
+
+@router.get("/tasks/{task_id}/hosts")
+async def get_task_hosts(
+    task_id: str,
+    outcome: EventOutcome = "failed",
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Lists the hosts of a task with at least one result of the given outcome,
+    along with the tasks concerned.
+    """
+    return {"hosts": await event_index.job_hosts(task_id, outcome, limit)}
+
+@router.get("/tasks/{task_id}/host_status")
+async def get_task_host_status(
+    task_id: str,
+    after: str | None = None,
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Lists the hosts of a task in name order, with their status and number
+    of results per outcome. A host is done once it failed, became
+    unreachable or reported a result for every task.
+
+    Pass `next_after` back as `after` to read the following hosts.
+    """
+    job = await job_repository.get(task_id, ("progress",))
+    if not job:
+        raise HTTPException(status_code=404, detail="Task not found")
+    tasks_total = (job.get("progress") or {}).get("tasks_total") or 0
+    finished = job["status"] in TERMINAL_STATUSES
+    hosts = await event_index.job_host_counters(task_id, after, limit)
+    for host in hosts:
+        counters = {outcome: host[outcome] for outcome in HOST_OUTCOMES}
+        host["status"] = host_status(counters, tasks_total, finished)
+    return {"hosts": hosts, "next_after": hosts[-1]["host"] if len(hosts) == limit else None}
+
+@router.get("/tasks/{task_id}/task_summary")
+async def get_task_summary(task_id: str, limit: int = Query(1000, ge=1, le=10000)):
+    """
+    Lists the tasks of a task's playbook in the order they ran, with the
+    number of host results per outcome.
+    """
+    return {"tasks": await event_index.job_task_counters(task_id, limit)}
+
+@router.get("/tasks/{task_id}/events")
+async def get_task_events(
+    task_id: str,
+    start: int = Query(1, ge=1),
+    end: int | None = Query(None, ge=1),
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Returns the stored ansible-runner events of a task with offsets in
+    `[start, end)`, at most `limit` of them.
+
+    Pass `next_start` back as `start` to read the following events.
+    """
+    if not artifact_store.exists(task_id):
+        raise HTTPException(status_code=404, detail="No events stored for this task")
+    stop = start + limit if end is None else min(end, start + limit)
+    events = await asyncio.to_thread(artifact_store.read_events, task_id, start, stop)
+    full_page = bool(events) and len(events) == stop - start and stop != end
+    return {
+        "events": [{"offset": offset, "event": event} for offset, event in events],
+        "next_start": events[-1][0] + 1 if full_page else None,
+    }
+
+@router.get("/tasks/{task_id}/stdout")
+def get_task_stdout(task_id: str):
+    """
+    Streams the plain-text output of a task, rebuilt from its stored events.
+    """
+    if not artifact_store.exists(task_id):
+        raise HTTPException(status_code=404, detail="No events stored for this task")
+    return StreamingResponse(artifact_store.iter_stdout(task_id), media_type="text/plain; charset=utf-8")
+
+def _event_source(job: dict, offset: int, idle_timeout: float | None = None):
+    """
+    Returns the live event stream of a task, or a source reading its events
+    from the artifact store: one that follows the store until the task
+    finishes if another process (a runner worker) runs it, a replay once the
+    live stream was evicted. None if there is nothing to read.
+    """
+    task_id = job["_id"]
+    if event_bus.get(task_id) is not None:
+        return event_bus.subscribe(task_id, offset, idle_timeout=idle_timeout)
+    if job["status"] not in TERMINAL_STATUSES:
+        async def finished() -> bool:
+            current = await job_repository.get(task_id, STATUS_FIELDS)
+            return current is None or current["status"] in TERMINAL_STATUSES
+        return artifact_store.tail(task_id, offset, finished, idle_timeout=idle_timeout)
+    if artifact_store.exists(task_id):
+        return artifact_store.replay(task_id, offset)
+    return None
+
+# Seconds of silence after which an SSE keep-alive comment is sent.
+SSE_KEEPALIVE_SECONDS = 15
+
+@router.get("/tasks/{task_id}/events/stream")
+async def stream_task_events(
+    task_id: str,
+    offset: int = Query(0, ge=0),
+    last_event_id: str | None = Header(None),
+):
+    """
+    Streams the ansible-runner events of a task as Server-Sent Events.
+
+    Each message carries the event offset as its `id`. Reconnecting clients
+    resume after the `Last-Event-ID` header (or the `offset` query parameter).
+    Tasks run by a worker are followed, and finished tasks replayed, from the
+    artifact store.
+    """
+    job = await job_repository.get(task_id, STATUS_FIELDS)
+    if not job:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+    source = _event_source(job, offset, idle_timeout=SSE_KEEPALIVE_SECONDS)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Event stream is no longer available")
+
+    async def generate():
+        async for item in source:
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            event_offset, event = item
+            yield f"id: {event_offset}\nevent: {event.get('event', 'message')}\ndata: {json.dumps(event)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/tasks/{task_id}/events/ws")
+async def websocket_task_events(websocket: WebSocket, task_id: str, offset: int = 0):
+    """
+    Streams the ansible-runner events of a task over a WebSocket.
+
+    Messages are JSON objects of the form `{"offset": n, "event": {...}}`.
+    The socket is closed once the task has finished and all events were sent.
+    """
+    await websocket.accept()
+    job = await job_repository.get(task_id, STATUS_FIELDS)
+    source = _event_source(job, offset) if job else None
+    if source is None:
+        await websocket.close(code=4404, reason="Event stream not found")
+        return
+    try:
+        async for event_offset, event in source:
+            await websocket.send_json({"offset": event_offset, "event": event})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
@@ -1,40 +1,32 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from typing import Annotated
 
-from db.models import User, UserCreate, UserUpdate
+from db.models import User, UserCreate, UserInDB, UserUpdate
+from schemas.auth import RefreshTokenRequest
 from core.security import get_current_user, RoleChecker
 from services import users as user_service
-from core.token import create_access_token
+from core.config import settings
+from core.token import create_access_token, create_refresh_token, decode_refresh_token
+from core.auth_cache import auth_cache
+from core.password import PasswordHasherBusy
+from core.rate_limit import login_account_limiter, login_ip_limiter
 
 router = APIRouter()
 
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    user = await get_user_by_token(token)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return user
-
-class RoleChecker:
-    def __init__(self, allowed_roles: List):
-        self.allowed_roles = allowed_roles
+def _access_token(user: UserInDB) -> str:
+    return create_access_token(
+        data={"sub": user.email, "roles": user.roles, "ver": user.token_version},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
 
-    def __call__(self, user: User = Depends(get_current_user)):
-        if not any(role in self.allowed_roles for role in user.get("roles", [])):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Operation not permitted",
-            )
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many password operations in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
 
 @router.post("/register", response_model=User)
 async def register_user(user: UserCreate):
@@ -47,31 +39,114 @@ async def register_user(user: UserCreate):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
-    return await user_service.create_user(user=user)
+    try:
+        return await user_service.create_user(user=user)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
 
 @router.post("/token")
 async def login_for_access_token(
+    request: Request,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ):
     """
     Logs in a user and returns an access token.
+
+    Attempts are throttled per account and per client IP before any
+    password hashing happens.
     """
-    user = await user_service.authenticate_user(email=form_data.username, password=form_data.password)
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = max(
+        login_account_limiter.hit(form_data.username.lower()),
+        login_ip_limiter.hit(client_ip),
+    )
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+    try:
+        user = await user_service.authenticate_user(email=form_data.username, password=form_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    login_account_limiter.reset(form_data.username.lower())
+    return {
+        "access_token": _access_token(user),
+        "refresh_token": create_refresh_token({"sub": user.email, "ver": user.token_version}),
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+@router.post("/token/refresh")
+async def refresh_access_token(request: RefreshTokenRequest):
+    """
+    Exchanges a refresh token for a new access token.
+
+    The user is reloaded, so the new token carries their current roles.
+    Refresh tokens issued before the user's token version was bumped are
+    rejected.
+    """
+    claims = decode_refresh_token(request.refresh_token)
+    user = await user_service.get_user_by_email(claims["sub"]) if claims else None
+    if not user or claims.get("ver", 0) != user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return {
+        "access_token": _access_token(user),
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
 
 @router.get("/users/me", response_model=User)
 async def read_users_me(current_user: Annotated[User, Depends(get_current_user)]):
     """
     Returns the currently authenticated user.
     """
-    return current_user
\ No newline at end of file
+    return current_user
+
+@router.put("/users/{email}", response_model=User)
+async def update_user(
+    email: str,
+    user_update: UserUpdate,
+    _: bool = Depends(RoleChecker(["admin"]))
+):
+    """
+    Updates a user's email, roles or password. Requires admin role.
+
+    Changing the email to one another user already has is a conflict.
+    """
+    if not user_update.dict(exclude_none=True):
+        raise HTTPException(status_code=422, detail="Pass at least one of email, roles or password")
+    if user_update.email and user_update.email != email:
+        if await user_service.get_user_by_email(email=user_update.email):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Email already registered",
+            )
+    try:
+        user = await user_service.update_user(email, user_update)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    return user
+
+@router.get("/auth/stats")
+def get_auth_stats():
+    """
+    Returns the hit ratio and latency of token authentication.
+    """
+    return auth_cache.stats()
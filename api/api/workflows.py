@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from typing import Any, Dict, List
+
+from db.models import Workflow, WorkflowCreate, WorkflowUpdate
+from services import workflows as workflow_service
+from services.workflow_engine import to_response, workflow_engine
+from services.workflows import WorkflowError
+from core.security import RoleChecker
+
+router = APIRouter()
+
+@router.get("/", response_model=List[Workflow])
+async def get_workflows():
+    """
+    Get all workflows.
+    """
+    return await workflow_service.get_all_workflows()
+
+@router.get("/runs/{run_id}")
+async def get_workflow_run(run_id: str):
+    """
+    Get a workflow run: its status and, per node, the status, task ID and
+    artifacts passed on to the nodes after it.
+    """
+    run = await workflow_engine.get(run_id)
+    if not run:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workflow run not found")
+    return to_response(run)
+
+@router.post("/runs/{run_id}/cancel", status_code=202)
+async def cancel_workflow_run(run_id: str):
+    """
+    Cancel a workflow run. Its queued and running jobs are canceled and the
+    nodes that have not started are skipped.
+    """
+    if await workflow_engine.cancel(run_id) is None:
+        run = await workflow_engine.get(run_id)
+        if not run:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workflow run not found")
+        raise HTTPException(status_code=409, detail=f"Workflow run already finished with status {run['status']}")
+    return {"run_id": run_id, "status": "canceling"}
+
+@router.get("/{workflow_id}", response_model=Workflow)
+async def get_workflow(workflow_id: str):
+    """
+    Get a workflow by ID.
+    """
+    workflow = await workflow_service.get_workflow_by_id(workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workflow not found")
+    return workflow
+
+@router.post("/", response_model=Workflow)
+async def create_workflow(
+    workflow: WorkflowCreate,
+    _: bool = Depends(RoleChecker(["admin"]))
+):
+    """
+    Store a new workflow. Requires admin role.
+    """
+    try:
+        return await workflow_service.create_workflow(workflow)
+    except WorkflowError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid workflow: {e}")
+
+@router.put("/{workflow_id}", response_model=Workflow)
+async def update_workflow(
+    workflow_id: str,
+    workflow_update: WorkflowUpdate,
+    _: bool = Depends(RoleChecker(["admin"]))
+):
+    """
+    Update a workflow. Requires admin role.
+    """
+    try:
+        workflow = await workflow_service.update_workflow(workflow_id, workflow_update)
+    except WorkflowError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid workflow: {e}")
+    if not workflow:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workflow not found")
+    return workflow
+
+@router.delete("/{workflow_id}")
+async def delete_workflow(
+    workflow_id: str,
+    _: bool = Depends(RoleChecker(["admin"]))
+):
+    """
+    Delete a workflow. Requires admin role.
+    """
+    if not await workflow_service.delete_workflow(workflow_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workflow not found")
+    return {"message": "Workflow deleted successfully"}
+
+@router.post("/{workflow_id}/runs", status_code=202)
+async def run_workflow(
+    workflow_id: str,
+    extra_vars: Dict[str, Any] | None = Body(None, embed=True),
+):
+    """
+    Start a run of a workflow. Nodes without parents are queued at once;
+    the others when the edges leading to them fire. `extra_vars` are passed
+    to every node and override their own variables and the artifacts
+    passed on to them.
+    """
+    workflow = await workflow_service.get_workflow_by_id(workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workflow not found")
+    try:
+        # Playbooks may have been removed since the workflow was stored.
+        workflow_service.validate(workflow.nodes, workflow.edges)
+    except WorkflowError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid workflow: {e}")
+    run = await workflow_engine.start(workflow, extra_vars)
+    return {"run_id": run["_id"], "status": run["status"]}
+
+@router.get("/{workflow_id}/runs")
+async def get_workflow_runs(workflow_id: str, limit: int = Query(20, ge=1, le=1000)):
+    """
+    Get the latest runs of a workflow, newest first.
+    """
+    return [to_response(run) for run in await workflow_engine.list_runs(workflow_id, limit)]
@@ -0,0 +1,92 @@
+"""
+A stand-in for `ansible-runner run ... -j` used by the benchmarks.
+
+It prints ansible-runner style JSON events, one per line, at a configurable
+rate so the API can be exercised without Ansible or WSL installed.
+
+Usage:
+    python fake_runner.py --duration 5 --events 50
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+
+def _event(counter: int, event: str, ident: str, stdout: str, **event_data) -> dict:
+    return {
+        "uuid": str(uuid.uuid4()),
+        "counter": counter,
+        "stdout": stdout,
+        "runner_ident": ident,
+        "event": event,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "event_data": event_data,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=1.0, help="Total run time in seconds.")
+    parser.add_argument("--events", type=int, default=10, help="Number of task events to emit.")
+    parser.add_argument("--hosts", type=int, default=1, help="Hosts each task runs on.")
+    parser.add_argument("--fail-every", type=int, default=0, help="Fail every Nth host result (0: never).")
+    parser.add_argument("--change-every", type=int, default=0, help="Mark every Nth host result changed (0: never).")
+    parser.add_argument("--rc", type=int, default=0, help="Exit code to return.")
+    parser.add_argument("--output-bytes", type=int, default=0, help="Module output added to each host result.")
+    parser.add_argument("--artifacts", type=json.loads, default=None,
+                        help="JSON object reported as set_stats artifact data.")
+    args = parser.parse_args()
+
+    ident = str(uuid.uuid4())
+    output = ("x" * 79 + "\n") * (args.output_bytes // 80) + "x" * (args.output_bytes % 80)
+    interval = args.duration / max(args.events, 1)
+    counter = 1
+
+    def emit(event: str, stdout: str = "", **event_data):
+        nonlocal counter
+        sys.stdout.write(json.dumps(_event(counter, event, ident, stdout, **event_data)) + "\n")
+        sys.stdout.flush()
+        counter += 1
+
+    emit("playbook_on_start", playbook="fake.yml")
+    emit("playbook_on_play_start", "PLAY [all] ***", play="all", pattern="all")
+    hosts = [f"host{h:04d}" for h in range(args.hosts)] if args.hosts > 1 else ["localhost"]
+    stats = {"ok": {}, "changed": {}, "failures": {}}
+    result_number = 0
+    for i in range(args.events):
+        time.sleep(interval)
+        task = f"task {i}"
+        emit("playbook_on_task_start", f"TASK [{task}] ***", play="all", task=task)
+        for host in hosts:
+            result_number += 1
+            if args.fail_every and result_number % args.fail_every == 0:
+                stats["failures"][host] = stats["failures"].get(host, 0) + 1
+                emit("runner_on_failed", f"fatal: [{host}]: FAILED!", host=host, play="all", task=task,
+                     res={"changed": False, "msg": "fake failure"})
+                continue
+            changed = bool(args.change_every and result_number % args.change_every == 0)
+            stats["ok"][host] = stats["ok"].get(host, 0) + 1
+            if changed:
+                stats["changed"][host] = stats["changed"].get(host, 0) + 1
+            result = {"changed": changed}
+            if output:
+                result["stdout"] = output
+            stdout = f"{'changed' if changed else 'ok'}: [{host}] => {task}"
+            emit("runner_on_ok", f"{stdout}\n{output}" if output else stdout, host=host, play="all",
+                 task=task, res=result)
+    recap = "\n".join(
+        f"{host} : ok={stats['ok'].get(host, 0)} changed={stats['changed'].get(host, 0)} "
+        f"unreachable=0 failed={stats['failures'].get(host, 0)}"
+        for host in hosts
+    )
+    if args.artifacts is not None:
+        stats["artifact_data"] = args.artifacts
+    emit("playbook_on_stats", f"PLAY RECAP ***\n{recap}", dark={}, **stats)
+    sys.exit(args.rc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Measures `/token` throughput under concurrent logins.
+
+The API is served by uvicorn in a background thread. N clients log in
+repeatedly with distinct accounts, while another client samples
+`GET /api/v1/playbooks` to show how much the login burst delays unrelated
+requests. Login throttling is raised out of the way for the run.
+
+`--inline` swaps the hashing pool for a synchronous bcrypt call on the event
+loop, which is how logins were verified before, for comparison.
+
+Usage (from the `api` directory):
+    python -m benchmarks.login_throughput --concurrency 32 --seconds 10 [--mock] [--inline]
+
+`--mock` uses mongomock-motor instead of a MongoDB server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+
+os.environ.setdefault("MONGODB_DB_NAME", "ansible_aap_bench")
+os.environ.setdefault("LOGIN_ATTEMPTS_PER_ACCOUNT", "1000000")
+os.environ.setdefault("LOGIN_ATTEMPTS_PER_IP", "1000000")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from benchmarks.playbook_latency import _summary  # noqa: E402
+from core import password  # noqa: E402
+from main import app  # noqa: E402
+from services import users as user_service  # noqa: E402
+
+PASSWORD = "bench-password"
+
+
+async def _seed(count):
+    db = user_service.db
+    await db.users.delete_many({"email": {"$regex": "^bench-"}})
+    hashed = password.get_password_hash(PASSWORD)
+    await db.users.insert_many([
+        {"email": f"bench-{i}@example.com", "hashed_password": hashed, "roles": ["user"]}
+        for i in range(count)
+    ])
+
+
+async def _login_loop(client, email, deadline, samples, failures):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/api/v1/token", data={"username": email, "password": PASSWORD})
+        if response.status_code == 200:
+            samples.append(time.perf_counter() - start)
+        else:
+            failures[response.status_code] = failures.get(response.status_code, 0) + 1
+
+
+async def _probe_loop(client, deadline, samples):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/api/v1/playbooks")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def _run(args):
+    await _seed(args.concurrency)
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        idle = []
+        await _probe_loop(client, time.perf_counter() + 1, idle)
+
+        logins, probes, failures = [], [], {}
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            _probe_loop(client, deadline, probes),
+            *(
+                _login_loop(client, f"bench-{i}@example.com", deadline, logins, failures)
+                for i in range(args.concurrency)
+            ),
+        )
+
+    await user_service.db.users.delete_many({"email": {"$regex": "^bench-"}})
+    return {
+        "mode": "inline" if args.inline else "pool",
+        "concurrency": args.concurrency,
+        "logins_per_second": round(len(logins) / args.seconds, 2),
+        "login_latency": _summary(logins) if logins else None,
+        "failures": failures,
+        "probe_idle": _summary(idle),
+        "probe_during_logins": _summary(probes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent login clients.")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Length of the login burst.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--mock", action="store_true", help="Use mongomock-motor instead of MongoDB.")
+    parser.add_argument("--inline", action="store_true", help="Verify passwords on the event loop.")
+    args = parser.parse_args()
+
+    if args.mock:
+        from mongomock_motor import AsyncMongoMockClient
+        user_service.db = AsyncMongoMockClient()[os.environ["MONGODB_DB_NAME"]]
+    if args.inline:
+        async def verify_inline(plain_password, hashed_password):
+            return password.verify_password(plain_password, hashed_password)
+        user_service.verify_password_async = verify_inline
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        print(json.dumps(asyncio.run(_run(args)), indent=2))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Measures API latency while playbooks are running.
+
+The API is served by uvicorn in a background thread and `ansible-runner` is
+replaced with `fake_runner.py`, so no Ansible installation is needed. The
+benchmark first samples `GET /api/v1/playbooks` on an idle server, then
+starts N playbook runs and samples again. With a non-blocking execution
+engine the p99 of both phases should be about the same.
+
+Usage (from the `api` directory):
+    python -m benchmarks.playbook_latency --runs 50 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from main import app
+from services import ansible_runner
+
+FAKE_RUNNER = os.path.join(os.path.dirname(__file__), "fake_runner.py")
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summary(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+    }
+
+
+async def _sample_latency(client: httpx.AsyncClient, seconds: float):
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/api/v1/playbooks")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def _run(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        idle = await _sample_latency(client, args.sample_seconds)
+
+        task_ids = []
+        for _ in range(args.runs):
+            response = await client.post(f"/api/v1/playbooks/{args.playbook}/run", json={})
+            task_ids.append(response.json()["task_id"])
+
+        loaded = await _sample_latency(client, min(args.sample_seconds, args.duration))
+
+        # Wait for the runs so the server is idle again before shutdown.
+        pending = set(task_ids)
+        while pending:
+            for task_id in list(pending):
+                response = await client.get(f"/api/v1/tasks/{task_id}")
+                if response.json().get("status") not in ("queued", "running"):
+                    pending.discard(task_id)
+            await asyncio.sleep(0.2)
+
+    return {"idle": _summary(idle), "under_load": _summary(loaded), "runs": args.runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="Number of concurrent playbook runs.")
+    parser.add_argument("--duration", type=float, default=5.0, help="Run time of each fake playbook in seconds.")
+    parser.add_argument("--events", type=int, default=50, help="Events emitted per fake playbook.")
+    parser.add_argument("--sample-seconds", type=float, default=3.0, help="Length of each sampling phase.")
+    parser.add_argument("--playbook", default="monitoring", help="Playbook name from the ansible/ directory.")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    ansible_runner._build_command = lambda *_: [
+        sys.executable, FAKE_RUNNER, "--duration", str(args.duration), "--events", str(args.events),
+    ]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        print(json.dumps(asyncio.run(_run(args)), indent=2))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares ways of listing projects at 10k and 100k documents.
+
+Seeds a scratch database (MONGODB_DB_NAME defaults to `ansible_aap_bench`)
+and times, per size:
+  - full_list: the old `get_all_projects` path (every document validated
+    into a Project model)
+  - first_page / deep_page: one keyset page of 100 at the start and end
+  - projected_page: one page with `fields=name,status`
+  - ndjson_stream: streaming every document as NDJSON
+Peak Python memory is reported for the full list and the stream.
+
+Usage (from the `api` directory):
+    python -m benchmarks.project_listing [--sizes 10000 100000] [--mock]
+
+`--mock` uses mongomock-motor instead of a MongoDB server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+os.environ.setdefault("MONGODB_DB_NAME", "ansible_aap_bench")
+
+from services import projects as project_service  # noqa: E402
+
+
+async def _timed(coro_factory, measure_memory=False):
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = await coro_factory()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+async def _seed(db, size):
+    await db.projects.delete_many({})
+    now = datetime.utcnow()
+    batch = []
+    for i in range(size):
+        batch.append({
+            "name": f"project-{i:06d}",
+            "description": "Benchmark project " * 4,
+            "git_url": f"https://example.com/org/repo-{i}.git",
+            "branch": "main",
+            "status": "active" if i % 10 else "error",
+            "created_at": now,
+            "updated_at": now,
+        })
+        if len(batch) == 5000:
+            await db.projects.insert_many(batch)
+            batch = []
+    if batch:
+        await db.projects.insert_many(batch)
+    await project_service.ensure_indexes()
+
+
+async def _drain(stream):
+    total = 0
+    async for chunk in stream:
+        total += len(chunk)
+    return total
+
+
+async def _bench_size(db, size):
+    await _seed(db, size)
+    results = {}
+
+    projects, elapsed, peak = await _timed(project_service.get_all_projects, measure_memory=True)
+    results["full_list"] = {"seconds": round(elapsed, 4), "count": len(projects), "peak_bytes": peak}
+    del projects
+
+    (_, cursor), elapsed, _ = await _timed(lambda: project_service.list_projects(100))
+    results["first_page"] = {"seconds": round(elapsed, 4)}
+
+    last = await db.projects.find({}, {"_id": 1}).sort("_id", -1).skip(150).limit(1).to_list(1)
+    (_, _), elapsed, _ = await _timed(lambda: project_service.list_projects(100, after=str(last[0]["_id"])))
+    results["deep_page"] = {"seconds": round(elapsed, 4)}
+
+    (_, _), elapsed, _ = await _timed(lambda: project_service.list_projects(100, fields=["name", "status"]))
+    results["projected_page"] = {"seconds": round(elapsed, 4)}
+
+    size_bytes, elapsed, peak = await _timed(
+        lambda: _drain(project_service.stream_projects()), measure_memory=True
+    )
+    results["ndjson_stream"] = {"seconds": round(elapsed, 4), "bytes": size_bytes, "peak_bytes": peak}
+    return results
+
+
+async def _run(args):
+    if args.mock:
+        from mongomock_motor import AsyncMongoMockClient
+        project_service.db = AsyncMongoMockClient()[os.environ["MONGODB_DB_NAME"]]
+    db = project_service.db
+    try:
+        return {str(size): await _bench_size(db, size) for size in args.sizes}
+    finally:
+        await db.projects.delete_many({})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--mock", action="store_true", help="Use mongomock-motor instead of MongoDB.")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(_run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
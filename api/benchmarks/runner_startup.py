@@ -0,0 +1,101 @@
+"""
+Measures the time from starting a playbook run to its first runner event,
+with ansible-runner started cold and with pre-warmed launchers.
+
+Unlike the other benchmarks this one needs a real ansible-runner and
+Ansible, since their start-up is what is measured. A one-task playbook on
+the implicit localhost is run `--runs` times per phase; between two runs the
+benchmark waits `--settle` seconds, so the pool has replaced the launcher it
+handed out, as it would between jobs on a server.
+
+Usage (from the `api` directory):
+    python -m benchmarks.runner_startup --runs 10
+    python -m benchmarks.runner_startup --mode wsl   # on Windows
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+
+from benchmarks.playbook_latency import _summary
+from core.config import settings
+from services import ansible_runner, job_dirs
+
+PLAYBOOK = """\
+- hosts: localhost
+  gather_facts: false
+  tasks:
+    - name: Say hello
+      debug:
+        msg: hello
+"""
+
+
+async def _time_run(project_dir: str):
+    task_id = uuid.uuid4().hex
+    job_dir = job_dirs.create(task_id, None, None)
+    command = ansible_runner._build_command(job_dir, project_dir, "startup", task_id)
+    try:
+        start = time.perf_counter()
+        process = await ansible_runner._start_runner(command, job_dir)
+        first_event = None
+        async for line in process.stdout:
+            if first_event is None and line.lstrip().startswith(b"{"):
+                first_event = time.perf_counter() - start
+        await process.stderr.read()
+        returncode = await process.wait()
+        total = time.perf_counter() - start
+    finally:
+        job_dirs.remove(job_dir)
+    if returncode != 0 or first_event is None:
+        raise RuntimeError(f"ansible-runner failed with exit code {returncode}")
+    return first_event, total
+
+
+async def _phase(project_dir: str, runs: int, settle: float):
+    first_events, totals = [], []
+    for _ in range(runs):
+        await asyncio.sleep(settle)
+        first_event, total = await _time_run(project_dir)
+        first_events.append(first_event)
+        totals.append(total)
+    return {"first_event": _summary(first_events), "total": _summary(totals)}
+
+
+async def _run(args):
+    with tempfile.TemporaryDirectory() as project_dir:
+        with open(os.path.join(project_dir, "startup.yml"), "w") as f:
+            f.write(PLAYBOOK)
+
+        cold = await _phase(project_dir, args.runs, args.settle)
+
+        pool = ansible_runner.runner_pool
+        pool.size = args.pool_size
+        pool.start()
+        try:
+            warm = await _phase(project_dir, args.runs, args.settle)
+        finally:
+            await pool.stop()
+        if pool.disabled:
+            raise RuntimeError(pool.disabled)
+
+    return {"mode": ansible_runner.runner_mode(), "runs": args.runs, "cold": cold, "warm": warm}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds between runs")
+    parser.add_argument("--pool-size", type=int, default=1)
+    parser.add_argument("--mode", choices=("auto", "wsl", "native"), default=settings.RUNNER_MODE)
+    args = parser.parse_args()
+    settings.RUNNER_MODE = args.mode
+
+    print(json.dumps(asyncio.run(_run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
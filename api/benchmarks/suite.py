@@ -0,0 +1,606 @@
+"""
+End-to-end benchmark suite with machine-readable results and regression
+thresholds.
+
+Serves `main.app` with uvicorn in a background thread, replaces
+`ansible-runner` with `fake_runner.py` and drives the API with concurrent
+clients. Scenarios:
+  - mixed: clients polling tasks, starting runs, logging in and listing
+    playbooks and projects at once
+  - sync_storm: many concurrent syncs of a few projects, served by local
+    git repositories over HTTP, on a cold cache, unchanged and after a push
+  - large_output: concurrent jobs emitting thousands of large events, with
+    API latency sampled while they run and the cost of fetching the results
+  - dashboard: dashboards following running jobs by polling the full task
+    versus long-polling its status view, in requests and bytes
+
+The results are printed as JSON (and written to `--output`) together with
+the outcome of every check in `--thresholds`. A check fails when a metric
+is beyond its limit or, given `--baseline` (the results of an earlier
+release), worse than the baseline by more than `--tolerance`. The exit code
+is 1 if any check fails.
+
+Usage (from the `api` directory):
+    python -m benchmarks.suite --mock [--scenarios mixed sync_storm large_output]
+        [--output results.json] [--baseline previous.json]
+
+`--mock` uses mongomock-motor instead of a MongoDB server; the
+`sync_storm` scenario needs `git`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORK_DIR = tempfile.mkdtemp(prefix="ansible_aap_bench_")
+os.environ.setdefault("MONGODB_DB_NAME", "ansible_aap_bench")
+os.environ.setdefault("LOGIN_ATTEMPTS_PER_ACCOUNT", "1000000")
+os.environ.setdefault("LOGIN_ATTEMPTS_PER_IP", "1000000")
+os.environ.setdefault("ARTIFACTS_DIR", os.path.join(WORK_DIR, "artifacts"))
+os.environ.setdefault("PROJECTS_DIR", os.path.join(WORK_DIR, "projects"))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+FAKE_RUNNER = os.path.join(os.path.dirname(__file__), "fake_runner.py")
+THRESHOLDS = os.path.join(os.path.dirname(__file__), "thresholds.json")
+SCENARIOS = ("mixed", "sync_storm", "large_output", "dashboard")
+PASSWORD = "bench-password"
+ADMIN = "bench-admin@example.com"
+PLAYBOOK = "monitoring"
+TERMINAL = ("success", "error", "canceled")
+# Seconds between two reads of a task by a polling dashboard.
+POLL_INTERVAL = 0.5
+
+
+class Runner:
+    """
+    The fake ansible-runner command line, changed between scenarios.
+    """
+    def __init__(self):
+        self.args = {"--duration": 1.0, "--events": 10}
+
+    def command(self, *_):
+        options = [str(item) for pair in self.args.items() for item in pair]
+        return [sys.executable, FAKE_RUNNER, *options]
+
+
+class Server:
+    """
+    uvicorn serving the app in a background thread, with a handle on its
+    event loop for seeding data through the app's own database client.
+    """
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.loop = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        async def serve():
+            self.loop = asyncio.get_running_loop()
+            await self.server.serve()
+        asyncio.run(serve())
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def _summary(samples):
+    # Imported late: playbook_latency imports the app, which has to find
+    # the mongomock database in place with --mock.
+    from benchmarks.playbook_latency import _summary as summary
+    return summary(samples)
+
+
+def _seconds_between(start: str, end: str) -> float:
+    return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+
+
+async def _timed(samples, method, *args, **kwargs):
+    start = time.perf_counter()
+    response = await method(*args, **kwargs)
+    samples.append(time.perf_counter() - start)
+    return response
+
+
+async def _login(client) -> str:
+    response = await client.post("/api/v1/token", data={"username": ADMIN, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def _wait_for_jobs(client, task_ids, timeout: float = 600):
+    """
+    Polls until every job has finished.
+
+    Returns:
+        The final job documents.
+    """
+    jobs, pending = {}, set(task_ids)
+    deadline = time.perf_counter() + timeout
+    while pending and time.perf_counter() < deadline:
+        for task_id in list(pending):
+            job = (await client.get(f"/api/v1/tasks/{task_id}")).json()
+            if job.get("status") in TERMINAL:
+                jobs[task_id] = job
+                pending.discard(task_id)
+        await asyncio.sleep(0.2)
+    return list(jobs.values())
+
+
+def _job_timings(jobs, run_seconds: float):
+    """
+    Queue wait, and run time beyond what the fake runner spends, from the
+    timestamps the API stored.
+    """
+    waits = [_seconds_between(job["created_at"], job["started_at"]) for job in jobs if job.get("started_at")]
+    overheads = [
+        _seconds_between(job["started_at"], job["finished_at"]) - run_seconds
+        for job in jobs if job.get("started_at") and job.get("finished_at")
+    ]
+    return {
+        "count": len(jobs),
+        "failed": sum(1 for job in jobs if job.get("status") != "success"),
+        "queue_wait": _summary(waits) if waits else None,
+        "run_overhead": _summary(overheads) if overheads else None,
+    }
+
+
+async def _mixed(client, runner, args):
+    """
+    Clients repeatedly pick an operation: poll a task (60%), list
+    playbooks or projects (20%), start a run (10%) or log in (10%).
+    """
+    run_seconds = 2.0
+    runner.args = {"--duration": run_seconds, "--events": 20, "--hosts": 5}
+    token = await _login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    first = await client.post(f"/api/v1/playbooks/{PLAYBOOK}/run", json={})
+    task_ids = [first.json()["task_id"]]
+    operations = ("poll", "list", "run", "login")
+    samples = {name: [] for name in operations}
+    errors = {}
+
+    async def poll():
+        return await client.get(f"/api/v1/tasks/{random.choice(task_ids)}")
+
+    async def listing():
+        if random.random() < 0.5:
+            return await client.get("/api/v1/playbooks")
+        return await client.get("/api/v1/projects/", params={"limit": 50}, headers=headers)
+
+    async def run():
+        response = await client.post(f"/api/v1/playbooks/{PLAYBOOK}/run", json={})
+        if response.status_code == 202:
+            task_ids.append(response.json()["task_id"])
+        return response
+
+    async def login():
+        return await client.post("/api/v1/token", data={"username": ADMIN, "password": PASSWORD})
+
+    calls = {"poll": poll, "list": listing, "run": run, "login": login}
+    weights = (60, 20, 10, 10)
+
+    async def user(deadline):
+        while time.perf_counter() < deadline:
+            name = random.choices(operations, weights)[0]
+            try:
+                response = await _timed(samples[name], calls[name])
+            except httpx.TransportError as e:
+                key = f"{name}:{type(e).__name__}"
+            else:
+                if response.status_code < 400:
+                    continue
+                key = f"{name}:{response.status_code}"
+            errors[key] = errors.get(key, 0) + 1
+
+    deadline = time.perf_counter() + args.seconds
+    await asyncio.gather(*(user(deadline) for _ in range(args.clients)))
+    total = sum(len(values) for values in samples.values())
+    jobs = await _wait_for_jobs(client, task_ids)
+    return {
+        "clients": args.clients,
+        "seconds": args.seconds,
+        "requests_per_second": round(total / args.seconds, 2),
+        "errors": errors,
+        "operations": {name: _summary(values) for name, values in samples.items() if values},
+        "jobs": _job_timings(jobs, run_seconds),
+    }
+
+
+class _GitHandler(BaseHTTPRequestHandler):
+    """
+    Serves the repositories under `root` with git's smart HTTP protocol,
+    through `git http-backend` as a CGI program.
+    """
+    root = ""
+
+    def do_GET(self):
+        self._backend()
+
+    def do_POST(self):
+        self._backend()
+
+    def _backend(self):
+        path, _, query = self.path.partition("?")
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        env = {
+            **os.environ,
+            "GIT_PROJECT_ROOT": self.root,
+            "GIT_HTTP_EXPORT_ALL": "1",
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "REQUEST_METHOD": self.command,
+            "CONTENT_TYPE": self.headers.get("Content-Type", ""),
+            "CONTENT_LENGTH": str(len(body)),
+        }
+        output = subprocess.run(["git", "http-backend"], input=body, env=env, capture_output=True).stdout
+        head, _, payload = output.partition(b"\r\n\r\n")
+        headers = [line.split(":", 1) for line in head.decode().split("\r\n") if ":" in line]
+        status = next((int(value.split()[0]) for name, value in headers if name.lower() == "status"), 200)
+        self.send_response(status)
+        for name, value in headers:
+            if name.lower() != "status":
+                self.send_header(name, value.strip())
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *_):
+        pass
+
+
+def _git(*args, cwd=None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def _commit(worktree: str, bare: str, message: str):
+    with open(os.path.join(worktree, "site.yml"), "a") as f:
+        f.write(f"# {message}\n")
+    _git("add", "-A", cwd=worktree)
+    _git("-c", "user.name=bench", "-c", "user.email=bench@example.com", "commit", "-qm", message, cwd=worktree)
+    _git("push", "-q", bare, "HEAD:main", cwd=worktree)
+
+
+def _create_repositories(root: str, count: int):
+    """
+    Creates bare repositories with a playbook each, to be served over HTTP.
+
+    Returns:
+        The bare repository and work tree paths.
+    """
+    repositories = []
+    for i in range(count):
+        bare = os.path.join(root, f"repo-{i}.git")
+        worktree = os.path.join(root, f"work-{i}")
+        _git("init", "-q", "--bare", "-b", "main", bare)
+        _git("init", "-q", "-b", "main", worktree)
+        with open(os.path.join(worktree, "site.yml"), "w") as f:
+            f.write("- hosts: all\n  tasks:\n    - ansible.builtin.ping:\n")
+        _commit(worktree, bare, "initial")
+        repositories.append((bare, worktree))
+    return repositories
+
+
+async def _sync_wave(client, headers, project_ids, storm: int):
+    before = (await client.get("/api/v1/projects/sync/stats")).json()
+    samples, statuses = [], {}
+
+    async def sync(project_id):
+        response = await _timed(samples, client.post, f"/api/v1/projects/{project_id}/sync", headers=headers)
+        status = response.json().get("status") if response.status_code == 200 else str(response.status_code)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sync(project_id) for project_id in project_ids for _ in range(storm)))
+    wall = time.perf_counter() - start
+    after = (await client.get("/api/v1/projects/sync/stats")).json()
+    return {
+        "requests": len(samples),
+        "wall_seconds": round(wall, 4),
+        "latency": _summary(samples),
+        "statuses": statuses,
+        "syncs_started": after["started"] - before["started"],
+        "coalesced": after["coalesced"] - before["coalesced"],
+    }
+
+
+async def _sync_storm(client, runner, args):
+    """
+    `--storm` concurrent sync requests for each of `--repos` projects, in
+    three waves: first clone, nothing changed, and after a new commit.
+    """
+    if shutil.which("git") is None:
+        return {"skipped": "git is not installed"}
+    root = tempfile.mkdtemp(dir=WORK_DIR)
+    repositories = _create_repositories(root, args.repos)
+    handler = type("GitHandler", (_GitHandler,), {"root": root})
+    http = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    try:
+        headers = {"Authorization": f"Bearer {await _login(client)}"}
+        project_ids = []
+        for i, (bare, _) in enumerate(repositories):
+            response = await client.post("/api/v1/projects/", headers=headers, json={
+                "name": f"bench-sync-{i}-{os.getpid()}",
+                "git_url": f"http://127.0.0.1:{http.server_port}/{os.path.basename(bare)}",
+                "branch": "main",
+            })
+            response.raise_for_status()
+            project = response.json()
+            project_ids.append(project.get("id") or project["_id"])
+        results = {"repos": len(project_ids), "storm": args.storm}
+        results["cold"] = await _sync_wave(client, headers, project_ids, args.storm)
+        results["unchanged"] = await _sync_wave(client, headers, project_ids, args.storm)
+        for bare, worktree in repositories:
+            _commit(worktree, bare, "update")
+        results["changed"] = await _sync_wave(client, headers, project_ids, args.storm)
+        for project_id in project_ids:
+            await client.delete(f"/api/v1/projects/{project_id}", headers=headers)
+        return results
+    finally:
+        http.shutdown()
+        http.server_close()
+
+
+async def _large_output(client, runner, args):
+    """
+    `--large-jobs` concurrent jobs, each emitting one event of
+    `--output-bytes` per host and task.
+    """
+    run_seconds, hosts, tasks = 5.0, 50, 100
+    runner.args = {
+        "--duration": run_seconds, "--events": tasks, "--hosts": hosts, "--output-bytes": args.output_bytes,
+    }
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    task_ids = []
+    for _ in range(args.large_jobs):
+        response = await client.post(f"/api/v1/playbooks/{PLAYBOOK}/run", json={})
+        task_ids.append(response.json()["task_id"])
+
+    probes = []
+    waiting = asyncio.create_task(_wait_for_jobs(client, task_ids))
+    while not waiting.done():
+        await _timed(probes, client.get, "/api/v1/playbooks")
+        await asyncio.sleep(0.01)
+    jobs = await waiting
+
+    fetch, stdout, events, sizes = [], [], [], []
+    for task_id in task_ids:
+        response = await _timed(fetch, client.get, f"/api/v1/tasks/{task_id}")
+        sizes.append(len(response.content))
+        await _timed(stdout, client.get, f"/api/v1/tasks/{task_id}/stdout")
+        await _timed(events, client.get, f"/api/v1/tasks/{task_id}/events", params={"limit": 200})
+    events_per_job = tasks * (hosts + 1) + 3
+    finished = [job for job in jobs if job.get("started_at") and job.get("finished_at")]
+    # All events over the time from the first job starting to the last one finishing.
+    window = _seconds_between(min(job["started_at"] for job in finished), max(job["finished_at"] for job in finished))
+    return {
+        "jobs": args.large_jobs,
+        "events_per_job": events_per_job,
+        "output_bytes_per_job": tasks * hosts * args.output_bytes,
+        "events_per_second": round(events_per_job * len(finished) / max(window, 1e-9), 1),
+        "job_timings": _job_timings(jobs, run_seconds),
+        "probe_during_jobs": _summary(probes),
+        "task_fetch": _summary(fetch),
+        "task_response_bytes": max(sizes),
+        "stdout_fetch": _summary(stdout),
+        "events_page_fetch": _summary(events),
+        # kilobytes on Linux
+        "peak_rss_growth": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+    }
+
+
+async def _dashboard(client, runner, args):
+    """
+    `--watchers` dashboards follow `--watched-jobs` jobs until they finish,
+    first by reading the full task every `POLL_INTERVAL`, then, for a new
+    set of jobs, by long-polling the status view until the job finishes.
+    """
+    run_seconds = 5.0
+    runner.args = {"--duration": run_seconds, "--events": 20, "--hosts": 5}
+
+    async def polling(task_id, totals):
+        while True:
+            response = await client.get(f"/api/v1/tasks/{task_id}")
+            totals["requests"] += 1
+            totals["bytes"] += len(response.content)
+            if response.json()["status"] in TERMINAL:
+                return
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def long_polling(task_id, totals, etag):
+        while True:
+            headers = {"If-None-Match": etag} if etag else {}
+            params = {"view": "status", "wait": 25, "until": "finished"}
+            response = await client.get(f"/api/v1/tasks/{task_id}", params=params, headers=headers)
+            totals["requests"] += 1
+            totals["bytes"] += len(response.content)
+            if response.status_code == 304:
+                continue
+            etag = response.headers["etag"]
+            if response.json()["status"] in TERMINAL:
+                return
+
+    results = {"watchers": args.watchers, "jobs": args.watched_jobs}
+    for name, follow in (("polling", polling), ("long_polling", long_polling)):
+        started = []
+        for _ in range(args.watched_jobs):
+            response = await client.post(f"/api/v1/playbooks/{PLAYBOOK}/run", json={})
+            started.append((response.json()["task_id"], response.headers.get("etag")))
+        totals = {"requests": 0, "bytes": 0}
+        if follow is polling:
+            followers = [polling(task_id, totals) for task_id, _ in started for _ in range(args.watchers)]
+        else:
+            # The run response carries the status ETag, so the first request already waits.
+            followers = [long_polling(task_id, totals, etag) for task_id, etag in started for _ in range(args.watchers)]
+        await asyncio.gather(*followers)
+        results[name] = totals
+    results["request_reduction"] = round(results["polling"]["requests"] / results["long_polling"]["requests"], 1)
+    results["byte_reduction"] = round(results["polling"]["bytes"] / results["long_polling"]["bytes"], 1)
+    return results
+
+
+def _lookup(results: dict, path: str):
+    value = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value if isinstance(value, (int, float)) else None
+
+
+def check(results: dict, thresholds: dict, baseline: dict = None, tolerance: float = 0.5):
+    """
+    Compares results with thresholds and, optionally, an earlier run.
+
+    Args:
+        results: The `scenarios` of a run.
+        thresholds: Maps a dotted metric path to {"max": ...} or {"min": ...}.
+        baseline: The `scenarios` of an earlier run.
+        tolerance: How much worse than the baseline a metric may get, as a fraction.
+
+    Returns:
+        One entry per checked metric; metrics of scenarios that did not run
+        are left out.
+    """
+    checks = []
+    for path, limits in thresholds.items():
+        value = _lookup(results, path)
+        if value is None:
+            continue
+        entry = {"metric": path, "value": value, **limits, "passed": True}
+        if "max" in limits and value > limits["max"]:
+            entry["passed"] = False
+        if "min" in limits and value < limits["min"]:
+            entry["passed"] = False
+        previous = _lookup(baseline, path) if baseline else None
+        if previous is not None:
+            entry["baseline"] = previous
+            if "max" in limits and value > previous * (1 + tolerance):
+                entry["passed"] = False
+            if "min" in limits and value < previous * (1 - tolerance):
+                entry["passed"] = False
+        checks.append(entry)
+    return checks
+
+
+async def _run(args, runner, server):
+    from core import password
+    from db import database
+
+    # Seeded on the server's loop, where the app's database client lives.
+    async def seed():
+        await database.db.users.delete_many({"email": ADMIN})
+        await database.db.users.insert_one({
+            "email": ADMIN, "hashed_password": password.get_password_hash(PASSWORD), "roles": ["admin"],
+        })
+    server.call(seed())
+
+    scenarios = {"mixed": _mixed, "sync_storm": _sync_storm, "large_output": _large_output, "dashboard": _dashboard}
+    results = {}
+    connections = max(args.clients, args.repos * args.storm, args.watchers * args.watched_jobs)
+    limits = httpx.Limits(max_connections=connections + 8)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=600, limits=limits) as client:
+        for name in args.scenarios:
+            start = time.perf_counter()
+            results[name] = await scenarios[name](client, runner, args)
+            results[name]["elapsed_seconds"] = round(time.perf_counter() - start, 2)
+    server.call(database.db.users.delete_many({"email": ADMIN}))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent clients in the mixed scenario.")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Length of the mixed scenario.")
+    parser.add_argument("--repos", type=int, default=5, help="Projects synced in the sync storm.")
+    parser.add_argument("--storm", type=int, default=20, help="Concurrent sync requests per project.")
+    parser.add_argument("--large-jobs", type=int, default=4, help="Concurrent jobs in the large output scenario.")
+    parser.add_argument("--output-bytes", type=int, default=2048, help="Module output per host result.")
+    parser.add_argument("--watchers", type=int, default=10, help="Dashboards following each job.")
+    parser.add_argument("--watched-jobs", type=int, default=8, help="Jobs followed in the dashboard scenario.")
+    parser.add_argument("--thresholds", default=THRESHOLDS, help="JSON file of metric limits.")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed regression against the baseline.")
+    parser.add_argument("--output", help="Also write the results to this file.")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--mock", action="store_true", help="Use mongomock-motor instead of MongoDB.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random operation mix.")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    if args.mock:
+        # Replaced before the services import it.
+        from mongomock.store import CollectionStore
+        from mongomock_motor import AsyncMongoMockClient
+        from db import database
+        database.db = AsyncMongoMockClient()[os.environ["MONGODB_DB_NAME"]]
+        # mongomock scans a collection for expired documents on every access
+        # when it has a TTL index, which makes event inserts quadratic;
+        # MongoDB expires documents in the background.
+        CollectionStore._remove_expired_documents = lambda self: None
+
+    from main import app
+    from services import ansible_runner
+
+    runner = Runner()
+    ansible_runner._build_command = runner.command
+    server = Server(app, args.port)
+    server.start()
+    try:
+        scenarios = asyncio.run(_run(args, runner, server))
+    finally:
+        server.stop()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["scenarios"]
+    checks = check(scenarios, thresholds, baseline, args.tolerance)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "mongomock" if args.mock else "mongodb",
+            "options": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        },
+        "scenarios": scenarios,
+        "checks": checks,
+        "passed": all(entry["passed"] for entry in checks),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import hashlib
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from core.config import settings
+
+"""
+This module provides a cache of verified access tokens and the users they
+belong to, so authenticated requests skip JWT decoding and the user lookup,
+and a cache of each user's current token version for revocation checks.
+"""
+
+LATENCY_SAMPLE_SIZE = 1000
+
+def _token_key(token: str) -> str:
+    # Raw tokens are never kept in memory as dictionary keys.
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class AuthCache:
+    """
+    A bounded LRU cache from token hash to the authenticated user.
+
+    An entry expires after `ttl_seconds` or at the token's `exp`, whichever
+    comes first. Entries of a user can be dropped explicitly when their
+    roles or password change. The cache is per process, so other workers
+    pick up such changes once their entries expire.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str, object]]" = OrderedDict()
+        self._keys_by_email: Dict[str, Set[str]] = {}
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        """
+        Returns the cached user of a token, or None on a miss.
+        """
+        key = _token_key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, email, user = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, email: str, user, token_exp: float):
+        """
+        Caches the user a token was verified for.
+
+        Args:
+            token: The raw access token.
+            email: The user's email, used for invalidation.
+            user: The user object to return on later hits.
+            token_exp: The token's `exp` claim as a Unix timestamp.
+        """
+        key = _token_key(token)
+        expires_at = min(time.time() + self.ttl_seconds, token_exp)
+        self._remove(key)
+        self._entries[key] = (expires_at, email, user)
+        self._keys_by_email.setdefault(email, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, email: str):
+        """
+        Drops every cached token of a user.
+        """
+        for key in self._keys_by_email.pop(email, set()):
+            self._entries.pop(key, None)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_by_email.get(entry[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_email[entry[1]]
+
+    def record_latency(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def stats(self) -> dict:
+        """
+        Returns the hit ratio and recent authentication latencies.
+        """
+        lookups = self.hits + self.misses
+        latencies = sorted(self._latencies)
+
+        def percentile(pct: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(pct * len(latencies)))] * 1000, 3)
+
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "latency_ms": {"p50": percentile(0.50), "p99": percentile(0.99)},
+        }
+
+class TokenVersionCache:
+    """
+    A bounded LRU cache from user email to their current token version.
+
+    Unknown users are cached as None, so tokens of deleted users are
+    rejected without a lookup per request as well.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Optional[int]]]" = OrderedDict()
+
+    def get(self, email: str) -> Tuple[bool, Optional[int]]:
+        """
+        Returns (hit, version) for a user.
+        """
+        entry = self._entries.get(email)
+        if entry is None or entry[0] <= time.time():
+            self._entries.pop(email, None)
+            return False, None
+        self._entries.move_to_end(email)
+        return True, entry[1]
+
+    def put(self, email: str, version: Optional[int]):
+        self._entries[email] = (time.time() + self.ttl_seconds, version)
+        self._entries.move_to_end(email)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, email: str):
+        self._entries.pop(email, None)
+
+auth_cache = AuthCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+token_version_cache = TokenVersionCache(settings.AUTH_CACHE_SIZE, settings.TOKEN_VERSION_CACHE_TTL_SECONDS)
@@ -9,6 +9,52 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     MONGODB_URL: str = "mongodb://localhost:27017"
     MONGODB_DB_NAME: str = "ansible_aap"
+    SCHEDULER_MAX_WORKERS: int = 8
+    SCHEDULER_MAX_PER_PROJECT: int = 4
+    SCHEDULER_MAX_PER_PLAYBOOK: int = 0  # 0 disables the per-playbook cap
+    JOB_RESULT_TTL_SECONDS: int = 7 * 24 * 3600
+    JOB_CACHE_SIZE: int = 1024
+    JOB_DISPATCH: str = "inline"  # inline: run in the API process, broker: hand off to workers
+    JOB_BROKER: str = "mongo"  # mongo or memory (single-process stand-in)
+    EMBEDDED_WORKER: bool = False
+    JOB_LEASE_SECONDS: int = 30  # jobs of a worker or API process that stopped renewing its lease this long are lost
+    JOB_MAX_ATTEMPTS: int = 3
+    WORKER_POLL_INTERVAL: float = 1.0
+    BATCH_MAX_JOBS: int = 500  # jobs accepted by one POST /playbooks/batch
+    TASK_WAIT_MAX_SECONDS: int = 30  # upper bound of the `wait` long-poll parameter of GET /tasks/{task_id}
+    WORKFLOW_MAX_NODES: int = 100
+    WORKFLOW_LEASE_SECONDS: int = 30  # a run is resumed by another API process this long after its process died
+    JOB_WAIT_POLL_INTERVAL: float = 1.0  # seconds between reads of a long-polled job run by another process
+    PROJECTS_DIR: str = "/tmp/ansible_projects"
+    GIT_SYNC_DEPTH: int = 1  # 0 fetches the full history
+    GIT_SYNC_FILTER: str = ""  # e.g. "blob:none" for partial clones
+    GIT_TIMEOUT: int = 120
+    RUNNER_MODE: str = "auto"  # wsl, native, or auto: wsl on Windows, native elsewhere
+    RUNNER_POOL_SIZE: int = 2  # pre-warmed runner launchers, 0 disables the pool
+    RUNNER_PYTHON: str = ""  # interpreter with ansible-runner; empty: python3 in WSL, the API's own natively
+    JOB_TIMEOUT_SECONDS: int = 0  # wall-clock limit of a run, 0 disables it
+    JOB_IDLE_TIMEOUT_SECONDS: int = 0  # limit on a run printing nothing, 0 disables it
+    RUNNER_MEMORY_LIMIT_MB: int = 0  # per process, or per job with RUNNER_CGROUP_ROOT; 0 disables it
+    RUNNER_CPU_LIMIT: float = 0  # CPUs per job, needs RUNNER_CGROUP_ROOT; 0 disables it
+    RUNNER_CGROUP_ROOT: str = ""  # a delegated cgroup v2 directory for per-job cgroups
+    RUNNER_WORK_DIR: str = ""  # empty: /dev/shm when available, else the temp directory
+    INVENTORY_CACHE_SIZE: int = 256
+    INVENTORY_MAX_HOSTS: int = 100000  # hosts an inventory may define, counting expanded ranges
+    ARTIFACTS_DIR: str = "/tmp/ansible_artifacts"
+    ARTIFACT_RETENTION_DAYS: int = 30
+    ARTIFACT_MAX_JOBS: int = 10000
+    ARTIFACT_PRUNE_INTERVAL_SECONDS: int = 3600
+    TRACING_ENABLED: bool = False  # OpenTelemetry spans, needs the opentelemetry API installed
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_MINUTES: int = 7 * 24 * 60
+    TOKEN_VERSION_CACHE_TTL_SECONDS: int = 30
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    LOGIN_ATTEMPTS_PER_ACCOUNT: int = 10
+    LOGIN_ATTEMPTS_PER_IP: int = 30
+    LOGIN_WINDOW_SECONDS: int = 60
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,318 @@
+import asyncio
+import bisect
+import math
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from core import tracing
+
+"""
+This module provides Prometheus-style counters, gauges and histograms, the
+ASGI middleware timing HTTP requests, and the rendering of all metrics in the
+Prometheus text format for `GET /metrics`.
+
+Recording a value is a dictionary lookup and a few additions without locks,
+so instrumentation can sit on hot paths. Metrics are updated from the event
+loop; an update racing with one from a worker thread can at worst lose a
+single increment.
+"""
+
+# Seconds; request and database latencies.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds; queue waits, job runtimes and git syncs.
+LONG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Registry:
+    """
+    The set of metrics rendered by `/metrics`.
+    """
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric"):
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        registry.register(self)
+
+    def labels(self, *values: str):
+        """
+        Returns the time series of a label combination, creating it on first use.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes the labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+class Counter(_Metric):
+    """
+    A value that only goes up.
+    """
+    type = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}_total{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self._children.items()
+        ]
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. An unlabelled gauge can instead read its
+    value from a function at scrape time, see `set_function`.
+    """
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], float]] = None
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def render(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self._children.items()
+        ]
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class Histogram(_Metric):
+    """
+    Counts observations in cumulative buckets, e.g. request durations.
+    """
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(*args, **kwargs)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time until the response headers were sent, by router (module under api/), method and status.",
+    ("router", "method", "status"),
+)
+AUTH_SECONDS = Histogram(
+    "auth_duration_seconds",
+    "Time spent authenticating a request, by dependency (user or claims).",
+    ("kind",),
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds",
+    "Time spent hashing or verifying a password, including the wait for a hashing thread.",
+    ("operation",),
+)
+DB_COMMAND_SECONDS = Histogram(
+    "db_command_duration_seconds",
+    "MongoDB command latency, by collection and command.",
+    ("collection", "command"),
+)
+JOB_QUEUE_WAIT_SECONDS = Histogram(
+    "job_queue_wait_seconds",
+    "Time jobs waited for a slot, in the job broker and the scheduler queue, by priority.",
+    ("priority",),
+    buckets=LONG_BUCKETS,
+)
+JOB_RUN_SECONDS = Histogram(
+    "job_run_duration_seconds",
+    "Playbook run time, by playbook and final status.",
+    ("playbook", "status"),
+    buckets=LONG_BUCKETS,
+)
+RUNNER_START_SECONDS = Histogram(
+    "runner_start_duration_seconds",
+    "Time to start ansible-runner, on a pre-warmed launcher (warm) or a new process (cold).",
+    ("start",),
+)
+GIT_SYNC_SECONDS = Histogram(
+    "git_sync_duration_seconds",
+    "Project sync time, by outcome (changed, unchanged or error).",
+    ("outcome",),
+    buckets=LONG_BUCKETS,
+)
+JOBS_RUNNING = Gauge("jobs_running", "Jobs running in this process.")
+JOBS_QUEUED = Gauge("jobs_queued", "Jobs waiting in this process's scheduler queue.")
+RUNNER_POOL_IDLE = Gauge("runner_pool_idle", "Idle pre-warmed runner launchers.")
+
+def render() -> str:
+    return REGISTRY.render()
+
+async def serve(port: int, host: str = "0.0.0.0"):
+    """
+    Serves `GET /metrics` on its own port, for processes without an HTTP
+    server such as runner workers. Runs until cancelled.
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            if request_line.split(b" ")[:2] == [b"GET", b"/metrics"]:
+                status, body = "200 OK", render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+def _router(scope) -> str:
+    module = getattr(scope.get("endpoint"), "__module__", "")
+    return module[4:] if module.startswith("api.") else "other"
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording `http_request_duration_seconds`, and a server
+    span per request when tracing is on and no server span was started
+    before, e.g. by `opentelemetry-instrument`.
+
+    Requests are timed until the response headers are sent, so a streaming
+    response (SSE, NDJSON) counts as fast as its first byte rather than as
+    long as the client listens. The router label is the module under `api/`
+    of the matched endpoint, e.g. `tasks`, `users` or `projects`.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not tracing.ENABLED or tracing.in_span():
+            await self._timed(scope, receive, send)
+            return
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        method = scope["method"]
+        with tracing.span(method, carrier=headers, server=True, **{"http.method": method, "http.target": scope["path"]}) as current:
+            await self._timed(scope, receive, send)
+            endpoint = scope.get("endpoint")
+            if endpoint is not None:
+                current.update_name(f"{method} {endpoint.__name__}")
+                current.set_attribute("http.router", _router(scope))
+
+    async def _timed(self, scope, receive, send):
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            nonlocal observed
+            observed = True
+            HTTP_REQUEST_SECONDS.labels(_router(scope), scope["method"], str(status)).observe(time.perf_counter() - start)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if not observed:
+                observe(500)
@@ -1,7 +1,27 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from passlib.context import CryptContext
 
+from core.config import settings
+from core.metrics import PASSWORD_HASH_SECONDS
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt releases the GIL while hashing, so a thread pool runs hashes in
+# parallel without blocking the event loop.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash",
+)
+_pending = 0
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when too many password hashes are already queued.
+    """
+
 def verify_password(plain_password, hashed_password):
     """
     Verifies a plain password against a hashed password.
@@ -12,4 +32,34 @@ def get_password_hash(password):
     """
     Hashes a plain password.
     """
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+async def _run_in_pool(operation: str, func, *args):
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHasherBusy("Too many password operations in progress")
+    _pending += 1
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+        PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
+async def verify_password_async(plain_password, hashed_password):
+    """
+    Verifies a password on the hashing thread pool.
+
+    Raises:
+        PasswordHasherBusy: If the pool's queue is full.
+    """
+    return await _run_in_pool("verify", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """
+    Hashes a password on the hashing thread pool.
+
+    Raises:
+        PasswordHasherBusy: If the pool's queue is full.
+    """
+    return await _run_in_pool("hash", get_password_hash, password)
@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from core.config import settings
+
+"""
+This module provides in-memory token-bucket rate limiters.
+"""
+
+class RateLimiter:
+    """
+    A token bucket per key.
+
+    Each key may spend `capacity` attempts at once, and regains them evenly
+    over `window_seconds`. Only the most recently used `max_keys` buckets are
+    kept, so memory stays bounded under a flood of distinct keys.
+    """
+    def __init__(self, capacity: int, window_seconds: float, max_keys: int = 100_000):
+        self.capacity = capacity
+        self.refill_rate = capacity / window_seconds
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def hit(self, key: str) -> float:
+        """
+        Spends one attempt for a key.
+
+        Returns:
+            0 if the attempt is allowed, otherwise the number of seconds
+            until the next attempt will be.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            return (1 - tokens) / self.refill_rate
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0
+
+    def reset(self, key: str):
+        self._buckets.pop(key, None)
+
+login_account_limiter = RateLimiter(settings.LOGIN_ATTEMPTS_PER_ACCOUNT, settings.LOGIN_WINDOW_SECONDS)
+login_ip_limiter = RateLimiter(settings.LOGIN_ATTEMPTS_PER_IP, settings.LOGIN_WINDOW_SECONDS)
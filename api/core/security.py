@@ -1,7 +1,10 @@
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
-from services.users import get_user_by_token
+from core.auth_cache import auth_cache
+from core.metrics import AUTH_SECONDS
+from services.users import get_user_by_token, verify_token_claims
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/token")
 
@@ -18,7 +21,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     Returns:
         The user.
     """
+    start = time.perf_counter()
     user = await get_user_by_token(token)
+    elapsed = time.perf_counter() - start
+    auth_cache.record_latency(elapsed)
+    AUTH_SECONDS.labels("user").observe(elapsed)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -27,6 +34,32 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         )
     return user
 
+async def get_token_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Gets the verified claims of an access token.
+
+    Only the token signature, expiry and the (cached) token version are
+    checked, so no user document is loaded.
+
+    Args:
+        token: The token to verify.
+
+    Returns:
+        The token claims.
+    """
+    start = time.perf_counter()
+    claims = await verify_token_claims(token)
+    elapsed = time.perf_counter() - start
+    auth_cache.record_latency(elapsed)
+    AUTH_SECONDS.labels("claims").observe(elapsed)
+    if not claims:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
+
 class RoleChecker:
     """
     A class that checks if a user has the required roles.
@@ -34,15 +67,14 @@ class RoleChecker:
     def __init__(self, allowed_roles: list):
         self.allowed_roles = allowed_roles
 
-    async def __call__(self, token: str = Depends(oauth2_scheme)):
+    async def __call__(self, claims: dict = Depends(get_token_claims)):
         """
-        Checks if the user has the required roles.
+        Checks if the token's `roles` claim contains a required role.
 
         Args:
-            token: The token to get the user from.
+            claims: The verified token claims.
         """
-        user = await get_current_user(token)
-        if not user or not any(role in self.allowed_roles for role in user.roles):
+        if not any(role in self.allowed_roles for role in claims.get("roles", [])):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Operation not permitted",
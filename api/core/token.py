@@ -1,3 +1,4 @@
+import uuid
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 
@@ -6,41 +7,85 @@ from core.config import settings
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+
 """
-This module provides functions for creating and decoding JWT access tokens.
+This module provides functions for creating and decoding JWT tokens.
+
+Access tokens carry the user's roles (`roles`) and token version (`ver`), so
+authorization can be decided from the verified claims. Refresh tokens only
+carry the subject and version, and are exchanged for new access tokens.
 """
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
+def create_access_token(data: dict, expires_delta: timedelta | None = None, token_type: str = ACCESS_TOKEN):
     """
-    Creates a JWT access token.
+    Creates a JWT token.
 
     Args:
         data: The data to encode in the token.
         expires_delta: The expiration time for the token.
+        token_type: The `type` claim, `access` or `refresh`.
 
     Returns:
-        The encoded JWT access token.
+        The encoded JWT token.
     """
     to_encode = data.copy()
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+        expire = now + timedelta(minutes=15)
+    to_encode.update({"exp": expire, "iat": now, "type": token_type})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_access_token(token: str):
+def create_refresh_token(data: dict, expires_delta: timedelta | None = None):
     """
-    Decodes a JWT access token.
+    Creates a JWT refresh token.
 
     Args:
-        token: The token to decode.
+        data: The data to encode in the token, usually `sub` and `ver`.
+        expires_delta: The expiration time for the token.
 
     Returns:
-        The decoded token, or None if the token is invalid.
+        The encoded JWT refresh token.
     """
+    if expires_delta is None:
+        expires_delta = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
+    return create_access_token(
+        {**data, "jti": uuid.uuid4().hex}, expires_delta, token_type=REFRESH_TOKEN
+    )
+
+def _decode(token: str, token_type: str):
     try:
         decoded_token = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return decoded_token if decoded_token["exp"] >= datetime.utcnow().timestamp() else None
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+    # Tokens minted before the `type` claim existed are access tokens.
+    if decoded_token.get("type", ACCESS_TOKEN) != token_type:
+        return None
+    return decoded_token if decoded_token["exp"] >= datetime.utcnow().timestamp() else None
+
+def decode_access_token(token: str):
+    """
+    Decodes a JWT access token.
+
+    Args:
+        token: The token to decode.
+
+    Returns:
+        The decoded token, or None if the token is invalid or not an access token.
+    """
+    return _decode(token, ACCESS_TOKEN)
+
+def decode_refresh_token(token: str):
+    """
+    Decodes a JWT refresh token.
+
+    Args:
+        token: The token to decode.
+
+    Returns:
+        The decoded token, or None if the token is invalid or not a refresh token.
+    """
+    return _decode(token, REFRESH_TOKEN)
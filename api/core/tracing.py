@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from core.config import settings
+
+try:
+    from opentelemetry import propagate, trace
+except ImportError:  # tracing is optional
+    trace = None
+
+"""
+This module provides optional OpenTelemetry spans.
+
+With `TRACING_ENABLED` set and the opentelemetry API installed, HTTP requests
+and job runs become spans, and a job's span is a child of the span of the
+request that queued it, even when a runner worker in another process runs
+the job. Spans are exported by whatever SDK the deployment configures, e.g.
+by starting the API under `opentelemetry-instrument`. Otherwise every
+function here is a no-op.
+"""
+
+ENABLED = settings.TRACING_ENABLED and trace is not None
+_tracer = trace.get_tracer("ansible_aap") if ENABLED else None
+
+@contextmanager
+def span(name: str, carrier: Optional[Dict[str, str]] = None, server: bool = False, **attributes) -> Iterator:
+    """
+    Runs a block in a span.
+
+    Args:
+        name: The span name.
+        carrier: W3C trace context headers of the parent span, e.g. from an
+            incoming request or a stored job; the current span otherwise.
+        server: Whether the span serves a remote caller.
+        attributes: Span attributes.
+
+    Yields:
+        The span, or None when tracing is off.
+    """
+    if not ENABLED:
+        yield None
+        return
+    context = propagate.extract(carrier) if carrier else None
+    kind = trace.SpanKind.SERVER if server else trace.SpanKind.INTERNAL
+    with _tracer.start_as_current_span(name, context=context, kind=kind, attributes=attributes) as current:
+        yield current
+
+def in_span() -> bool:
+    """
+    Returns whether a span is already active, e.g. one that an instrumented
+    server or framework started for the request.
+    """
+    return ENABLED and trace.get_current_span().get_span_context().is_valid
+
+def current_context() -> Optional[Dict[str, str]]:
+    """
+    Returns the W3C trace context of the current span, to be stored with a
+    job, or None when tracing is off.
+    """
+    if not ENABLED:
+        return None
+    carrier: Dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier or None
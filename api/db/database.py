@@ -1,8 +1,37 @@
 """
 This module provides a database client for the application.
 """
+from typing import Dict, Tuple
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
 from core.config import settings
+from core.metrics import DB_COMMAND_SECONDS
+
+class CommandLatencyListener(monitoring.CommandListener):
+    """
+    Records the latency of every MongoDB command in `db_command_duration_seconds`.
+    """
+    def __init__(self):
+        self._collections: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMore names its collection separately; admin commands have none.
+            collection = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        DB_COMMAND_SECONDS.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
 
-client = AsyncIOMotorClient(settings.MONGODB_URL)
-db = client[settings.MONGODB_DB_NAME]
\ No newline at end of file
+client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[CommandLatencyListener()])
+db = client[settings.MONGODB_DB_NAME]
@@ -2,7 +2,7 @@ from typing import Any
 from pydantic import BaseModel, EmailStr, Field, GetCoreSchemaHandler, HttpUrl
 from pydantic_core import core_schema
 from bson import ObjectId
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 
 class PyObjectId(ObjectId):
@@ -70,6 +70,7 @@ class User(UserBase):
 
 class UserInDB(User):
     hashed_password: str
+    token_version: int = 0
 
 class ProjectBase(BaseModel):
     """
@@ -104,6 +105,7 @@ class Project(ProjectBase):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_sync: Optional[datetime] = None
+    commit_sha: Optional[str] = None
 
     class Config:
         allow_population_by_field_name = True
@@ -117,4 +119,114 @@ class ProjectSync(BaseModel):
     project_id: str
     status: str
     message: str
-    sync_started_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    commit_sha: Optional[str] = None
+    sync_started_at: datetime = Field(default_factory=datetime.utcnow)
+
+class PlaybookInfo(BaseModel):
+    """
+    Model for an indexed playbook of a project.
+    """
+    path: str
+    plays: int
+    names: List[str] = []
+    hosts: List[str] = []
+    vars: List[str] = []
+    tags: List[str] = []
+
+class InventoryBase(BaseModel):
+    """
+    Base model for a stored inventory.
+    """
+    name: str
+    description: Optional[str] = None
+    content: str
+
+class InventoryCreate(InventoryBase):
+    """
+    Model for creating a new inventory.
+    """
+    pass
+
+class InventoryUpdate(BaseModel):
+    """
+    Model for updating an inventory.
+    """
+    name: Optional[str] = None
+    description: Optional[str] = None
+    content: Optional[str] = None
+
+class Inventory(InventoryBase):
+    """
+    Model for representing an inventory in the database.
+    """
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    content_hash: str
+    host_count: int = 0
+    group_count: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        allow_population_by_field_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str, datetime: lambda v: v.isoformat()}
+
+class WorkflowNode(BaseModel):
+    """
+    A playbook run in a workflow. Takes the fields of a single run.
+    """
+    id: str = Field(pattern=r"^[A-Za-z0-9_-]+$")
+    playbook: str
+    inventory: Optional[str] = None
+    inventory_id: Optional[str] = None
+    limit: Optional[str] = None
+    extra_vars: Optional[Dict[str, Any]] = None
+    project_id: Optional[str] = None
+    priority: Literal["high", "normal", "low"] = "normal"
+    # any: run when one incoming edge fires, all: only when every one does
+    converge: Literal["any", "all"] = "any"
+
+class WorkflowEdge(BaseModel):
+    """
+    Runs `target` after `source` finished with the given outcome.
+    """
+    source: str
+    target: str
+    on: Literal["success", "failure", "always"] = "success"
+
+class WorkflowBase(BaseModel):
+    """
+    Base model for a workflow: a DAG of playbook runs.
+    """
+    name: str
+    description: Optional[str] = None
+    nodes: List[WorkflowNode] = Field(min_length=1)
+    edges: List[WorkflowEdge] = []
+
+class WorkflowCreate(WorkflowBase):
+    """
+    Model for creating a new workflow.
+    """
+    pass
+
+class WorkflowUpdate(BaseModel):
+    """
+    Model for updating a workflow. Nodes and edges are replaced together.
+    """
+    name: Optional[str] = None
+    description: Optional[str] = None
+    nodes: Optional[List[WorkflowNode]] = None
+    edges: Optional[List[WorkflowEdge]] = None
+
+class Workflow(WorkflowBase):
+    """
+    Model for representing a workflow in the database.
+    """
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        allow_population_by_field_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str, datetime: lambda v: v.isoformat()}
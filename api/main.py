@@ -1,12 +1,88 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api import tasks, users, projects
+from fastapi.responses import PlainTextResponse
+from api import tasks, users, projects, inventories, workflows
+from core import metrics
 from core.config import settings
+from services.scheduler import scheduler
+from services.jobs import job_repository
+from services.broker import broker
+from services.ansible_runner import runner_pool
+from services.artifact_store import artifact_store, run_retention
+from services.playbook_catalog import ANSIBLE_DIR
+from services import event_index, liveness, locks
+from services import projects as project_service
+from services import inventories as inventory_service
+from services import workflows as workflow_service
+from services.dispatch import abandon_jobs, holds_jobs, run_reaper
+from services.workflow_engine import workflow_engine
+from services.process_identity import PROCESS_ID
+from services.runner_worker import RunnerWorker
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts and stops the application's background services.
+    """
+    try:
+        await job_repository.ensure_indexes()
+        await broker.ensure_indexes()
+        await locks.ensure_indexes()
+        await event_index.ensure_indexes()
+        await project_service.ensure_indexes()
+        await inventory_service.ensure_indexes()
+        await workflow_service.ensure_indexes()
+        await workflow_engine.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Could not create database indexes: {e}")
+
+    retention_task = asyncio.create_task(
+        run_retention(artifact_store, ANSIBLE_DIR, settings.ARTIFACT_PRUNE_INTERVAL_SECONDS)
+    )
+
+    # The memory broker is only visible inside this process, so it always
+    # needs a worker here; with MongoDB an embedded worker is optional.
+    worker = None
+    if settings.JOB_DISPATCH == "broker" and (settings.JOB_BROKER == "memory" or settings.EMBEDDED_WORKER):
+        worker = RunnerWorker(broker, scheduler, PROCESS_ID)
+        worker_task = asyncio.create_task(worker.run())
+    # Playbooks run in this process: keep runner launchers warm for them.
+    if settings.JOB_DISPATCH != "broker" or worker:
+        runner_pool.start()
+    # Lets other processes tell whether the jobs held here are lost.
+    liveness_task = None
+    if holds_jobs():
+        liveness_task = asyncio.create_task(liveness.run(settings.JOB_LEASE_SECONDS, abandon_jobs))
+    # Fails jobs left unfinished by processes that died.
+    reaper_task = asyncio.create_task(run_reaper(settings.JOB_LEASE_SECONDS))
+    # Resumes runs left by stopped processes, including an earlier run of this one.
+    workflow_task = asyncio.create_task(workflow_engine.run())
+    yield
+    # Before the scheduler cancels their jobs, which would fail the nodes.
+    workflow_engine.stop()
+    await workflow_task
+    if worker:
+        worker.stop()
+        await worker_task
+    await scheduler.shutdown()
+    if liveness_task:
+        # Only now that its jobs are stopped, this process counts as gone.
+        liveness_task.cancel()
+        await asyncio.gather(liveness_task, return_exceptions=True)
+    await runner_pool.stop()
+    retention_task.cancel()
+    reaper_task.cancel()
 
 app = FastAPI(
     title="Ansible AAP API",
     description="A web-based interface to run Ansible playbooks.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -16,15 +92,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.JOBS_RUNNING.set_function(lambda: scheduler.running)
+metrics.JOBS_QUEUED.set_function(lambda: scheduler.queued)
+metrics.RUNNER_POOL_IDLE.set_function(lambda: runner_pool.idle)
+
 app.include_router(tasks.router, prefix=settings.API_V1_STR, tags=["tasks"])
 app.include_router(users.router, prefix=settings.API_V1_STR, tags=["users"])
 app.include_router(projects.router, prefix=f"{settings.API_V1_STR}/projects", tags=["projects"])
+app.include_router(inventories.router, prefix=f"{settings.API_V1_STR}/inventories", tags=["inventories"])
+app.include_router(workflows.router, prefix=f"{settings.API_V1_STR}/workflows", tags=["workflows"])
 
 @app.get("/")
 def read_root():
     """
     Root endpoint of the API.
     """
-    return {"message": "Welcome to the Ansible AAP API"}
\ No newline at end of file
+    return {"message": "Welcome to the Ansible AAP API"}
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """
+    Metrics of this process in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
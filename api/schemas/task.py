@@ -1,6 +1,25 @@
-from pydantic import BaseModel
-from typing import Dict, Any
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Literal
+
+from core.config import settings
 
 class RunPlaybookRequest(BaseModel):
     inventory: str | None = None
-    extra_vars: Dict[str, Any] | None = None
\ No newline at end of file
+    inventory_id: str | None = None
+    limit: str | None = None
+    extra_vars: Dict[str, Any] | None = None
+    project_id: str | None = None
+    priority: Literal["high", "normal", "low"] = "normal"
+
+class BatchJobSpec(RunPlaybookRequest):
+    playbook: str
+
+class RunBatchRequest(BaseModel):
+    jobs: List[BatchJobSpec] = Field(min_length=1, max_length=settings.BATCH_MAX_JOBS)
+
+EventOutcome = Literal["ok", "changed", "failed", "unreachable", "skipped"]
+
+TaskView = Literal["full", "status"]
+
+# What a long-poll of a task waits for: any change of the view, or the end of the task.
+TaskWaitUntil = Literal["change", "finished"]
@@ -1,13 +1,44 @@
-import os
-import subprocess
+import asyncio
 import json
-from typing import Dict, Any
+import logging
+import os
+import sys
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Deque
+
+from core.config import settings
+from core.metrics import JOB_RUN_SECONDS, RUNNER_START_SECONDS
+from services import job_dirs, job_limits
+from services.artifact_store import ArtifactWriter, artifact_store
+from services.event_index import EventIndexer
+from services.events import event_bus
+from services.jobs import job_repository
+from services.playbook_catalog import ANSIBLE_DIR, playbook_catalog
+from services.playbook_index import estimate_task_count
+from services.progress import JobProgress
+from services.runner_pool import RunnerPool
 
-from store import task_results
+logger = logging.getLogger(__name__)
 
 """
 This module provides functions for running Ansible playbooks.
 """
+
+# ansible-runner emits one JSON event per line with `-j`; a single event can
+# carry a whole task result, so allow lines far above asyncio's 64 KiB default.
+STREAM_LIMIT = 16 * 1024 * 1024
+# Raw output lines kept for error reports; everything else is streamed.
+OUTPUT_TAIL_LINES = 200
+LAUNCHER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runner_launcher.py")
+# Seconds ansible-runner gets to stop ansible-playbook before it is killed.
+KILL_GRACE_SECONDS = 5.0
+# Seconds between two checks for a cancellation requested through another process.
+CANCEL_POLL_INTERVAL = 2.0
+
+# Runs executing in this process, by task ID; setting the event stops the run.
+_cancel_events: Dict[str, asyncio.Event] = {}
+
 def wsl_path(windows_path: str) -> str:
     """
     Converts a Windows path to a WSL path.
@@ -22,82 +53,382 @@ def wsl_path(windows_path: str) -> str:
     drive, rest = path.split(':', 1)
     return f"/mnt/{drive.lower()}{rest}"
 
-async def execute_ansible_playbook(playbook_name: str, inventory: str, extra_vars: dict) -> dict:
+def runner_mode() -> str:
     """
-    Executes an Ansible playbook using ansible-runner in WSL.
+    Returns how ansible-runner is started: `wsl` or `native`.
+    """
+    if settings.RUNNER_MODE in ("wsl", "native"):
+        return settings.RUNNER_MODE
+    return "wsl" if os.name == "nt" else "native"
 
-    Args:
-        playbook_name: The name of the playbook to execute.
-        inventory: The inventory to use for the playbook.
-        extra_vars: Extra variables to pass to the playbook.
+def runner_path(path: str) -> str:
+    """
+    Returns a path as ansible-runner sees it.
+    """
+    return wsl_path(path) if runner_mode() == "wsl" else path
 
-    Returns:
-        A dictionary containing the task result.
+def _runner_executable() -> List[str]:
+    return ['wsl', 'ansible-runner'] if runner_mode() == "wsl" else ['ansible-runner']
+
+def _launcher_command() -> List[str]:
+    """
+    Builds the command line starting one pre-warmed runner launcher.
     """
-    ansible_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'ansible'))
-    playbook_path = os.path.join(ansible_dir, f"{playbook_name}.yml")
+    if runner_mode() == "wsl":
+        return ['wsl', settings.RUNNER_PYTHON or 'python3', '-u', wsl_path(LAUNCHER_SCRIPT)]
+    return [settings.RUNNER_PYTHON or sys.executable, '-u', LAUNCHER_SCRIPT]
 
-    if not os.path.exists(playbook_path):
-        task_results[task_id] = {"status": "error", "error": f"Playbook {playbook_name}.yml not found"}
-        return
+runner_pool = RunnerPool(_launcher_command, settings.RUNNER_POOL_SIZE)
 
-    wsl_ansible_dir = wsl_path(ansible_dir)
+def _build_command(
+    private_data_dir: str,
+    project_dir: str,
+    playbook_name: str,
+    ident: Optional[str] = None,
+    limit: Optional[str] = None,
+) -> List[str]:
+    """
+    Builds the ansible-runner command line for a playbook run.
 
-    command = [
-        'wsl',
-        'ansible-runner',
+    Inventory and extra variables are read by ansible-runner from the job's
+    private data directory, see `services.job_dirs`. In `wsl` mode the
+    command goes through the `wsl` wrapper and paths are translated; in
+    `native` mode ansible-runner is started directly.
+
+    Args:
+        private_data_dir: The job's private data directory.
+        project_dir: The directory containing the playbooks.
+        playbook_name: The name of the playbook to execute.
+        ident: The name of the run's `artifacts/` directory.
+        limit: A host pattern further limiting the hosts the playbook runs on.
+
+    Returns:
+        The command as a list of arguments.
+    """
+    command = _runner_executable() + [
         'run',
-        wsl_ansible_dir,
+        runner_path(private_data_dir),
+        '--project-dir',
+        runner_path(project_dir),
         '--playbook',
         f'{playbook_name}.yml',
     ]
 
-    inventory_path = None
-    if inventory:
-        inventory_path = os.path.join(ansible_dir, f"inventory_{task_id}.ini")
-        with open(inventory_path, "w") as f:
-            f.write(inventory)
-        command.extend(['--inventory', wsl_path(inventory_path)])
+    if ident:
+        command.extend(['--ident', ident])
+
+    if limit:
+        command.extend(['--limit', limit])
 
-    if extra_vars:
-        command.extend(['--extravars', json.dumps(extra_vars)])
-    
     command.append('-j')
+    return command
+
+async def _start_runner(
+    command: List[str], job_dir: str, cgroup: Optional[str] = None
+) -> asyncio.subprocess.Process:
+    """
+    Starts ansible-runner, on a pre-warmed launcher when one is idle.
 
+    The process leads a process group of its own, see `services.job_limits`.
 
-    try:
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            check=True,
-            cwd=ansible_dir
+    Args:
+        command: The command line built by `_build_command`.
+        job_dir: The job's private data directory, used as working directory.
+        cgroup: The job's cgroup, if any.
+
+    Returns:
+        The process, with stdout and stderr piped.
+    """
+    start = time.perf_counter()
+    executable = _runner_executable()
+    if command[:len(executable)] == executable:
+        process = await runner_pool.launch(command[len(executable):], runner_path(job_dir), cgroup)
+        if process is not None:
+            RUNNER_START_SECONDS.labels("warm").observe(time.perf_counter() - start)
+            return process
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=job_dir,
+        limit=STREAM_LIMIT,
+        start_new_session=True,
+        preexec_fn=job_limits.preexec(cgroup),
+    )
+    RUNNER_START_SECONDS.labels("cold").observe(time.perf_counter() - start)
+    return process
+
+def cancel_run(task_id: str) -> bool:
+    """
+    Stops a run executing in this process.
+
+    Returns:
+        True if the run was found here.
+    """
+    event = _cancel_events.get(task_id)
+    if event is None:
+        return False
+    event.set()
+    return True
+
+class _Activity:
+    """
+    The time of the runner's last output line, for the idle timeout.
+    """
+    def __init__(self):
+        self.last_output = time.monotonic()
+
+    def touch(self):
+        self.last_output = time.monotonic()
+
+async def _supervise(
+    task_id: str, output: asyncio.Future, activity: _Activity, cancel: asyncio.Event
+) -> Optional[Dict[str, Any]]:
+    """
+    Waits until the runner's output ends or the run has to be stopped: it
+    was canceled, in this process or through the job's `cancel_requested`
+    flag, it ran past `JOB_TIMEOUT_SECONDS`, or it printed nothing for
+    `JOB_IDLE_TIMEOUT_SECONDS`.
+
+    Args:
+        task_id: The ID of the task being run.
+        output: Completes once the runner's pipes are drained.
+        activity: Tracks the runner's last output.
+        cancel: Set to cancel the run.
+
+    Returns:
+        None if the output ended, otherwise the result of the stopped run.
+    """
+    started = time.monotonic()
+    next_poll = started + CANCEL_POLL_INTERVAL
+    timeout = settings.JOB_TIMEOUT_SECONDS
+    idle_timeout = settings.JOB_IDLE_TIMEOUT_SECONDS
+    while True:
+        deadlines = [next_poll]
+        if timeout:
+            deadlines.append(started + timeout)
+        if idle_timeout:
+            deadlines.append(activity.last_output + idle_timeout)
+        canceled = asyncio.ensure_future(cancel.wait())
+        done, _ = await asyncio.wait(
+            {output, canceled},
+            timeout=max(0.0, min(deadlines) - time.monotonic()),
+            return_when=asyncio.FIRST_COMPLETED,
         )
-        stdout = result.stdout.decode('utf-8', errors='replace')
-        output_lines = stdout.strip().split('\n')
-        json_output = {}
-        for line in reversed(output_lines):
+        canceled.cancel()
+        if output in done:
+            return None
+
+        now = time.monotonic()
+        if cancel.is_set():
+            return {"status": "canceled"}
+        if timeout and now - started >= timeout:
+            return {"status": "error", "error": f"Job exceeded its timeout of {timeout} seconds"}
+        if idle_timeout and now - activity.last_output >= idle_timeout:
+            return {"status": "error", "error": f"Job printed no output for {idle_timeout} seconds"}
+        if now >= next_poll:
+            next_poll = now + CANCEL_POLL_INTERVAL
             try:
-                parsed_json = json.loads(line)
-                json_output = parsed_json
-                break
-            except json.JSONDecodeError:
+                if await job_repository.cancel_requested(task_id):
+                    return {"status": "canceled"}
+            except Exception as e:
+                logger.warning(f"Could not check job {task_id} for cancellation: {e}")
+
+async def _stop(process: asyncio.subprocess.Process, cgroup: Optional[str]):
+    """
+    Stops a run: its processes get SIGTERM and `KILL_GRACE_SECONDS` to exit,
+    then whatever is left is killed.
+    """
+    pids = await asyncio.to_thread(job_limits.descendants, process.pid)
+    job_limits.terminate(process, pids)
+    try:
+        await asyncio.wait_for(process.wait(), KILL_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        pids += await asyncio.to_thread(job_limits.descendants, process.pid)
+    job_limits.kill(process, pids, cgroup)
+
+async def _read_tail(stream: asyncio.StreamReader, tail: Deque[str]):
+    """
+    Drains a subprocess pipe, keeping only its last lines.
+
+    Args:
+        stream: The pipe to read from.
+        tail: A bounded deque the decoded lines are appended to.
+    """
+    async for raw_line in stream:
+        tail.append(raw_line.decode('utf-8', errors='replace').rstrip('\r\n'))
+
+async def _stream_events(
+    task_id: str,
+    stream: asyncio.StreamReader,
+    tail: Deque[str],
+    writer: ArtifactWriter,
+    indexer: EventIndexer,
+    progress: JobProgress,
+    activity: Optional[_Activity] = None,
+) -> Dict[str, Any]:
+    """
+    Publishes ansible-runner events to the event bus as they are printed.
+
+    Each stdout line is parsed on arrival instead of buffering the whole
+    output, so memory use stays flat for arbitrarily long playbooks. Lines
+    that are not JSON are forwarded as `verbose` events. Every event is also
+    appended to the job's artifact file, host results are indexed and the
+    job's progress counters are updated.
+
+    Args:
+        task_id: The ID of the task the events belong to.
+        stream: The stdout pipe of ansible-runner.
+        tail: A bounded deque receiving the last raw lines for error reports.
+        writer: The artifact writer of the task.
+        indexer: The event indexer of the task.
+        progress: The progress aggregator of the task.
+        activity: Tracks the time of the last line, if given.
+
+    Returns:
+        The last JSON object printed, which is the run summary.
+    """
+    summary: Dict[str, Any] = {}
+    async for raw_line in stream:
+        if activity:
+            activity.touch()
+        line = raw_line.decode('utf-8', errors='replace').rstrip('\r\n')
+        tail.append(line)
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            event = {"event": "verbose", "stdout": line}
+        else:
+            if not isinstance(event, dict):
                 continue
+            summary = event
+            await indexer.add(event)
+            progress.add(event)
+            await progress.maybe_persist()
+        writer.append(event)
+        event_bus.publish(task_id, event)
+    return summary
+
+async def execute_ansible_playbook(
+    task_id: str, playbook_name: str, inventory: str, extra_vars: dict, limit: Optional[str] = None
+) -> dict:
+    """
+    Executes an Ansible playbook using ansible-runner, in WSL or natively.
 
-        task_results[task_id] = {"status": "success", "data": json_output}
+    The runner is started with asyncio's subprocess support, or handed to a
+    pre-warmed launcher of `runner_pool`, and both pipes are drained
+    concurrently, so other requests keep being served while it runs. Events
+    are published to `services.events.event_bus` as they arrive.
 
-    except subprocess.CalledProcessError as e:
-        error_details = {
-            "status": "error",
-            "error": e.stderr.decode('utf-8', errors='replace'),
-            "stdout": e.stdout.decode('utf-8', errors='replace'),
-            "returncode": e.returncode
-        }
-        task_results[task_id] = error_details
+    A run is stopped when it is canceled (see `cancel_run`), exceeds
+    `JOB_TIMEOUT_SECONDS` or prints nothing for `JOB_IDLE_TIMEOUT_SECONDS`.
+    A run that cannot be set up or started ends as an error as well, so the
+    job never stays `running` once this returns.
+
+    Args:
+        task_id: The ID of the job the result is stored on.
+        playbook_name: The name of the playbook to execute.
+        inventory: The inventory to use for the playbook.
+        extra_vars: Extra variables to pass to the playbook.
+        limit: A host pattern further limiting the hosts the playbook runs on.
+
+    Returns:
+        A dictionary containing the task result.
+    """
+    ansible_dir = ANSIBLE_DIR
+
+    if not playbook_catalog.exists(playbook_name):
+        result = {"status": "error", "error": f"Playbook {playbook_name}.yml not found"}
+        await job_repository.update(task_id, result)
+        event_bus.close(task_id)
+        return result
+
+    job_dir = progress = indexer = cgroup = process = output = None
+    result: Optional[Dict[str, Any]] = None
+    started = time.perf_counter()
+
+    try:
+        job_dir = await asyncio.to_thread(job_dirs.create, task_id, inventory, extra_vars)
+        command = _build_command(job_dir, ansible_dir, playbook_name, task_id, limit)
+        writer = artifact_store.open(task_id)
+        indexer = EventIndexer(task_id, playbook_name)
+        estimated_tasks = await asyncio.to_thread(estimate_task_count, playbook_catalog.path(playbook_name))
+        progress = JobProgress(task_id, estimated_tasks)
+        cgroup = job_limits.create_cgroup(task_id)
+        cancel = _cancel_events[task_id] = asyncio.Event()
+
+        process = await _start_runner(command, job_dir, cgroup)
+        stdout_tail: Deque[str] = deque(maxlen=OUTPUT_TAIL_LINES)
+        stderr_tail: Deque[str] = deque(maxlen=OUTPUT_TAIL_LINES)
+        activity = _Activity()
+        output = asyncio.gather(
+            _stream_events(task_id, process.stdout, stdout_tail, writer, indexer, progress, activity),
+            _read_tail(process.stderr, stderr_tail),
+        )
+        stopped = await _supervise(task_id, output, activity, cancel)
+
+        if stopped is not None:
+            await _stop(process, cgroup)
+            try:
+                # Keep what the run printed while it was stopping.
+                await asyncio.wait_for(output, KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            result = {**stopped, "stdout": "\n".join(stdout_tail), "returncode": await process.wait()}
+        else:
+            summary, _ = output.result()
+            returncode = await process.wait()
+            if returncode == 0:
+                result = {"status": "success", "data": summary}
+            else:
+                # The final stats event, if the playbook got that far, still
+                # carries the artifacts set before the failure.
+                result = {
+                    "status": "error",
+                    "data": summary,
+                    "error": "\n".join(stderr_tail),
+                    "stdout": "\n".join(stdout_tail),
+                    "returncode": returncode
+                }
     except FileNotFoundError:
-        task_results[task_id] = {
+        missing = "WSL is" if runner_mode() == "wsl" else "ansible-runner is"
+        result = {
             "status": "error",
-            "error": "WSL is not installed or not in the system's PATH."
+            "error": f"{missing} not installed or not in the system's PATH."
         }
+    except asyncio.CancelledError:
+        # The scheduler is shutting down; the run must not outlive it. The
+        # job is left as it is, for a worker to pick it up again.
+        if output is not None:
+            output.cancel()
+        if process is not None and process.returncode is None:
+            await _stop(process, cgroup)
+        raise
+    except Exception as e:
+        # E.g. a runner that cannot be executed, or a path WSL cannot translate.
+        logger.exception(f"Job {task_id} failed to run")
+        if output is not None:
+            output.cancel()
+        if process is not None and process.returncode is None:
+            await _stop(process, cgroup)
+        result = {"status": "error", "error": str(e) or type(e).__name__}
     finally:
-        if inventory_path and os.path.exists(inventory_path):
-            os.remove(inventory_path)
\ No newline at end of file
+        _cancel_events.pop(task_id, None)
+        artifact_store.close(task_id)
+        if indexer is not None:
+            try:
+                await indexer.flush()
+            except Exception:
+                # The job must still be finalized and its files cleaned up.
+                logger.exception(f"Failed to index the last events of job {task_id}")
+        # Every event was ingested from stdout, so the inventory, extra vars
+        # and ansible-runner's own per-event files all go with the directory.
+        if job_dir is not None:
+            await asyncio.to_thread(job_dirs.remove, job_dir)
+        job_limits.remove_cgroup(cgroup)
+        if result is not None:
+            JOB_RUN_SECONDS.labels(playbook_name, result["status"]).observe(time.perf_counter() - started)
+            await job_repository.update(task_id, {**result, **(progress.snapshot() if progress else {})})
+            event_bus.close(task_id)
+
+    return result
@@ -0,0 +1,308 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import shutil
+import struct
+import time
+import zlib
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+from core.config import settings
+from services import job_dirs
+from services.jobs import job_repository
+
+logger = logging.getLogger(__name__)
+
+"""
+This module stores the ansible-runner events of each job in one compressed,
+append-only file instead of ansible-runner's tree of small files.
+
+Per job there are two files in `ARTIFACTS_DIR`:
+  - `<task_id>.events`: a sequence of independently zlib-compressed frames,
+    each holding up to `FRAME_EVENTS` newline-separated JSON events.
+  - `<task_id>.idx`: one fixed-size record per frame with the frame's file
+    offset, compressed length, first event number and event count.
+
+Event numbers start at 1 and match the offsets of `services.events`, so any
+range can be read by decompressing only the frames that overlap it.
+"""
+
+FRAME_EVENTS = 64
+# A partial frame is written once its oldest event is this old, so readers in
+# other processes see slow jobs progress.
+FRAME_MAX_AGE_SECONDS = 1.0
+# How often `ArtifactStore.tail` checks for new frames.
+TAIL_POLL_SECONDS = 0.5
+# offset, compressed length, first event number, event count
+INDEX_RECORD = struct.Struct("<QIII")
+# ansible-runner's own run directories are only needed while the run lasts.
+STALE_RUNNER_ARTIFACTS_SECONDS = 24 * 3600
+EVENTS_SUFFIX = ".events"
+INDEX_SUFFIX = ".idx"
+
+def _paths(directory: str, task_id: str) -> Tuple[str, str]:
+    base = os.path.join(directory, task_id)
+    return base + EVENTS_SUFFIX, base + INDEX_SUFFIX
+
+class ArtifactWriter:
+    """
+    Appends the events of one job to its event and index files.
+
+    Events are buffered until a frame is full or `FRAME_MAX_AGE_SECONDS` old,
+    whichever comes first. A frame is written before its
+    index record, so readers never see a record for an incomplete frame.
+    """
+    def __init__(self, directory: str, task_id: str):
+        self.task_id = task_id
+        self.events_path, self.index_path = _paths(directory, task_id)
+        # (number of the first buffered event, buffered events), replaced as
+        # a whole on flush so readers in other threads get a consistent view.
+        self.buffer: Tuple[int, List[bytes]] = (1, [])
+        # A retried job starts over, like its event stream does.
+        self._events_file = open(self.events_path, "wb")
+        self._index_file = open(self.index_path, "wb")
+        self._offset = 0
+        self._first_buffered_at = 0.0
+
+    def append(self, event: dict) -> int:
+        """
+        Buffers an event and flushes a frame once enough have accumulated.
+
+        Returns:
+            The number assigned to the event.
+        """
+        first_event, pending = self.buffer
+        now = time.monotonic()
+        if not pending:
+            self._first_buffered_at = now
+        pending.append(json.dumps(event, separators=(",", ":")).encode())
+        number = first_event + len(pending) - 1
+        if len(pending) >= FRAME_EVENTS or now - self._first_buffered_at >= FRAME_MAX_AGE_SECONDS:
+            self.flush()
+        return number
+
+    def flush(self):
+        first_event, pending = self.buffer
+        if not pending:
+            return
+        frame = zlib.compress(b"\n".join(pending))
+        self._events_file.write(frame)
+        self._events_file.flush()
+        self._index_file.write(INDEX_RECORD.pack(self._offset, len(frame), first_event, len(pending)))
+        self._index_file.flush()
+        self._offset += len(frame)
+        self.buffer = (first_event + len(pending), [])
+
+    def close(self):
+        self.flush()
+        self._events_file.close()
+        self._index_file.close()
+
+class ArtifactStore:
+    """
+    Creates writers for running jobs and serves reads of stored events.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._writers: Dict[str, ArtifactWriter] = {}
+
+    def open(self, task_id: str) -> ArtifactWriter:
+        """
+        Returns the writer of a job, creating its files on first use.
+        """
+        writer = self._writers.get(task_id)
+        if writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            writer = self._writers[task_id] = ArtifactWriter(self.directory, task_id)
+        return writer
+
+    def close(self, task_id: str):
+        writer = self._writers.pop(task_id, None)
+        if writer:
+            writer.close()
+
+    def exists(self, task_id: str) -> bool:
+        return task_id in self._writers or os.path.exists(_paths(self.directory, task_id)[1])
+
+    def _read_index(self, task_id: str) -> List[Tuple[int, int, int, int]]:
+        index_path = _paths(self.directory, task_id)[1]
+        with open(index_path, "rb") as f:
+            data = f.read()
+        # A record being written concurrently may be incomplete.
+        usable = len(data) - len(data) % INDEX_RECORD.size
+        return list(INDEX_RECORD.iter_unpack(data[:usable]))
+
+    def _iter_frames(self, task_id: str, start: int, end: Optional[int]) -> Iterator[Tuple[int, List[bytes]]]:
+        records = self._read_index(task_id)
+        first_events = [record[2] for record in records]
+        position = max(0, bisect.bisect_right(first_events, start) - 1)
+        with open(_paths(self.directory, task_id)[0], "rb") as f:
+            for offset, length, first_event, count in records[position:]:
+                if end is not None and first_event >= end:
+                    break
+                if first_event + count <= start:
+                    continue
+                f.seek(offset)
+                yield first_event, zlib.decompress(f.read(length)).split(b"\n")
+
+    def iter_events(self, task_id: str, start: int = 1, end: Optional[int] = None) -> Iterator[Tuple[int, dict]]:
+        """
+        Yields `(number, event)` pairs of a job with `start <= number < end`.
+
+        Only the frames overlapping the range are read and decompressed.
+        Events still buffered by this process's writer are included.
+        """
+        # Taken before the index is read, so a frame flushed in between is
+        # still covered by the buffer snapshot.
+        writer = self._writers.get(task_id)
+        first_pending, pending = writer.buffer if writer else (0, [])
+        pending = list(pending)
+        last = start - 1
+        for first_event, lines in self._iter_frames(task_id, start, end):
+            for i, line in enumerate(lines):
+                number = first_event + i
+                if number >= start and (end is None or number < end):
+                    last = number
+                    yield number, json.loads(line)
+        for i, line in enumerate(pending):
+            number = first_pending + i
+            if number > last and (end is None or number < end):
+                yield number, json.loads(line)
+
+    def read_events(self, task_id: str, start: int = 1, end: Optional[int] = None) -> List[Tuple[int, dict]]:
+        return list(self.iter_events(task_id, start, end))
+
+    async def replay(self, task_id: str, offset: int = 0, batch: int = 1000) -> AsyncIterator[Tuple[int, dict]]:
+        """
+        Yields the stored `(number, event)` pairs of a job after `offset`,
+        reading `batch` events at a time off the event loop.
+        """
+        start = offset + 1
+        while True:
+            events = await asyncio.to_thread(self.read_events, task_id, start, start + batch)
+            for item in events:
+                yield item
+            if len(events) < batch:
+                return
+            start = events[-1][0] + 1
+
+    async def tail(
+        self,
+        task_id: str,
+        offset: int,
+        finished: Callable[[], Awaitable[bool]],
+        idle_timeout: Optional[float] = None,
+    ) -> AsyncIterator[Optional[Tuple[int, dict]]]:
+        """
+        Yields the `(number, event)` pairs of a job after `offset` as they are
+        stored, until `finished()` returns True and every event was read.
+
+        This follows jobs run by another process, e.g. a runner worker, whose
+        events never reach this process's event bus.
+
+        Args:
+            task_id: The job to follow.
+            offset: The last event number the client has seen.
+            finished: Returns whether the job has reached a terminal state.
+            idle_timeout: If set, `None` is yielded whenever no event arrived
+                for this many seconds, so callers can send keep-alives.
+        """
+        idle = 0.0
+        while True:
+            # Checked before reading: a job's events are all stored by the
+            # time its final status is written.
+            done = await finished()
+            if self.exists(task_id):
+                async for item in self.replay(task_id, offset):
+                    offset = item[0]
+                    idle = 0.0
+                    yield item
+            if done:
+                return
+            if idle_timeout is not None and idle >= idle_timeout:
+                idle = 0.0
+                yield None
+            await asyncio.sleep(TAIL_POLL_SECONDS)
+            idle += TAIL_POLL_SECONDS
+
+    def iter_stdout(self, task_id: str) -> Iterator[str]:
+        """
+        Yields the stdout of a job, rebuilt from the `stdout` of its events.
+        """
+        for _, event in self.iter_events(task_id):
+            stdout = event.get("stdout")
+            if stdout:
+                yield stdout + "\n"
+
+    def prune(self, max_age_seconds: float, max_jobs: int) -> int:
+        """
+        Deletes stored jobs older than `max_age_seconds`, and the oldest ones
+        beyond `max_jobs`. Jobs that are still being written are kept.
+
+        Returns:
+            The number of jobs removed.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        jobs = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(INDEX_SUFFIX):
+                task_id = entry.name[:-len(INDEX_SUFFIX)]
+                if task_id not in self._writers:
+                    jobs.append((entry.stat().st_mtime, task_id))
+        jobs.sort(reverse=True)
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for position, (mtime, task_id) in enumerate(jobs):
+            if mtime >= cutoff and position < max_jobs:
+                continue
+            for path in _paths(self.directory, task_id):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        return removed
+
+def remove_runner_artifacts(private_data_dir: str, max_age_seconds: float):
+    """
+    Removes the run directories under `<private_data_dir>/artifacts` that are
+    older than `max_age_seconds`.
+    """
+    artifacts_dir = os.path.join(private_data_dir, "artifacts")
+    if not os.path.isdir(artifacts_dir):
+        return
+    cutoff = time.time() - max_age_seconds
+    for entry in os.scandir(artifacts_dir):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+async def run_retention(store: ArtifactStore, legacy_artifacts_dir: str, interval: float):
+    """
+    Applies the artifact retention settings every `interval` seconds.
+
+    Job directories left behind by interrupted runs (but not those of jobs
+    that are still queued or running), and run directories
+    ansible-runner wrote into `legacy_artifacts_dir` before runs got private
+    data directories, are removed as well.
+    """
+    max_age = settings.ARTIFACT_RETENTION_DAYS * 24 * 3600
+    while True:
+        try:
+            removed = await asyncio.to_thread(store.prune, max_age, settings.ARTIFACT_MAX_JOBS)
+            if removed:
+                logger.info(f"Pruned the artifacts of {removed} jobs")
+            active = {job["_id"] for job in await job_repository.list_unfinished()}
+            await asyncio.to_thread(job_dirs.remove_stale, STALE_RUNNER_ARTIFACTS_SECONDS, active)
+            await asyncio.to_thread(
+                remove_runner_artifacts, legacy_artifacts_dir, STALE_RUNNER_ARTIFACTS_SECONDS
+            )
+        except (OSError, PyMongoError) as e:
+            logger.warning(f"Artifact retention failed: {e}")
+        await asyncio.sleep(interval)
+
+artifact_store = ArtifactStore(settings.ARTIFACTS_DIR)
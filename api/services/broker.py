@@ -0,0 +1,201 @@
+import itertools
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+from core.config import settings
+from db.database import db
+from services.scheduler import PRIORITY_LEVELS
+
+"""
+This module provides the job queue that runner workers pull from.
+
+A job is delivered to one worker at a time under a lease. The worker keeps
+extending the lease while it runs the job and deletes the job from the queue
+once it is done. If the worker dies, the lease runs out and the job is handed
+to the next worker that asks for one.
+"""
+
+class Broker(ABC):
+    """
+    Interface of a job queue with lease-based delivery.
+    """
+    async def ensure_indexes(self):
+        """
+        Prepares the backing store. The default implementation does nothing.
+        """
+
+    @abstractmethod
+    async def enqueue(self, job: Dict[str, Any]):
+        """
+        Adds a job to the queue.
+
+        Args:
+            job: The job spec. It must contain `task_id`, `playbook` and
+                `priority`; everything else is passed through to the worker.
+        """
+
+    @abstractmethod
+    async def claim(self, worker_id: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """
+        Leases the next job to a worker.
+
+        Jobs are handed out by priority, then in the order they were enqueued.
+        Jobs whose lease has run out are eligible again.
+
+        Returns:
+            The job spec with an `attempts` count, or None if the queue is empty.
+        """
+
+    @abstractmethod
+    async def heartbeat(self, worker_id: str, task_ids: Iterable[str], lease_seconds: int):
+        """
+        Extends the leases a worker holds on its jobs.
+        """
+
+    @abstractmethod
+    async def ack(self, worker_id: str, task_id: str):
+        """
+        Removes a finished job from the queue.
+        """
+
+    @abstractmethod
+    async def cancel(self, task_id: str) -> bool:
+        """
+        Removes a job no worker has claimed yet.
+
+        Returns:
+            True if the job was removed, False if it is not in the queue or
+            a worker holds it.
+        """
+
+class MongoBroker(Broker):
+    """
+    A queue in a MongoDB collection. Claims are atomic `find_one_and_update`
+    calls, so any number of workers on any number of nodes can share it.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [("state", ASCENDING), ("priority", ASCENDING), ("enqueued_at", ASCENDING)]
+        )
+        await self.collection.create_index("lease_expires_at")
+
+    async def enqueue(self, job: Dict[str, Any]):
+        await self.collection.insert_one({
+            **job,
+            "_id": job["task_id"],
+            "priority": PRIORITY_LEVELS[job["priority"]],
+            "priority_name": job["priority"],
+            "state": "ready",
+            "attempts": 0,
+            "enqueued_at": datetime.utcnow(),
+            "lease_owner": None,
+            "lease_expires_at": None,
+        })
+
+    async def claim(self, worker_id: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        doc = await self.collection.find_one_and_update(
+            {"$or": [
+                {"state": "ready"},
+                {"state": "leased", "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "state": "leased",
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", ASCENDING), ("enqueued_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return None
+        doc["priority"] = doc.pop("priority_name")
+        return doc
+
+    async def heartbeat(self, worker_id: str, task_ids: Iterable[str], lease_seconds: int):
+        task_ids = list(task_ids)
+        if not task_ids:
+            return
+        await self.collection.update_many(
+            {"_id": {"$in": task_ids}, "lease_owner": worker_id},
+            {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=lease_seconds)}},
+        )
+
+    async def ack(self, worker_id: str, task_id: str):
+        await self.collection.delete_one({"_id": task_id, "lease_owner": worker_id})
+
+    async def cancel(self, task_id: str) -> bool:
+        result = await self.collection.delete_one({"_id": task_id, "state": "ready"})
+        return result.deleted_count == 1
+
+class MemoryBroker(Broker):
+    """
+    An in-process stand-in for `MongoBroker` with the same delivery semantics.
+
+    It only works when the producer and the workers share a process, which
+    makes it useful for development and for exercising the worker protocol.
+    """
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._seq = itertools.count()
+
+    async def enqueue(self, job: Dict[str, Any]):
+        self._jobs[job["task_id"]] = {
+            **job,
+            "attempts": 0,
+            "seq": next(self._seq),
+            "enqueued_at": datetime.utcnow(),
+            "lease_owner": None,
+            "lease_expires_at": None,
+        }
+
+    async def claim(self, worker_id: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        candidates: List[Dict[str, Any]] = [
+            job for job in self._jobs.values()
+            if job["lease_owner"] is None or job["lease_expires_at"] < now
+        ]
+        if not candidates:
+            return None
+        job = min(candidates, key=lambda j: (PRIORITY_LEVELS[j["priority"]], j["seq"]))
+        job["lease_owner"] = worker_id
+        job["lease_expires_at"] = now + timedelta(seconds=lease_seconds)
+        job["attempts"] += 1
+        return dict(job)
+
+    async def heartbeat(self, worker_id: str, task_ids: Iterable[str], lease_seconds: int):
+        expires = datetime.utcnow() + timedelta(seconds=lease_seconds)
+        for task_id in task_ids:
+            job = self._jobs.get(task_id)
+            if job and job["lease_owner"] == worker_id:
+                job["lease_expires_at"] = expires
+
+    async def ack(self, worker_id: str, task_id: str):
+        job = self._jobs.get(task_id)
+        if job and job["lease_owner"] == worker_id:
+            del self._jobs[task_id]
+
+    async def cancel(self, task_id: str) -> bool:
+        job = self._jobs.get(task_id)
+        if job and job["lease_owner"] is None:
+            del self._jobs[task_id]
+            return True
+        return False
+
+def _create_broker() -> Broker:
+    if settings.JOB_BROKER == "memory":
+        return MemoryBroker()
+    if settings.JOB_BROKER == "mongo":
+        return MongoBroker(db.job_queue)
+    raise ValueError(f"Unknown JOB_BROKER: {settings.JOB_BROKER}")
+
+broker = _create_broker()
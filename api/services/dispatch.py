@@ -0,0 +1,266 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from core import tracing
+from core.config import settings
+from services import liveness
+from services.ansible_runner import cancel_run, execute_ansible_playbook
+from services.broker import broker
+from services.events import event_bus
+from services.jobs import TERMINAL_STATUSES, job_repository
+from services.process_identity import PROCESS_ID
+from services.scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+"""
+This module decides where a playbook job runs: in this process through the
+job scheduler, or on a runner worker through the job broker.
+"""
+
+def holds_jobs() -> bool:
+    """
+    Returns whether the jobs this process submits are lost if it dies:
+    those it runs itself and those in the memory broker. The MongoDB broker
+    hands a job abandoned by its worker to another one.
+    """
+    return settings.JOB_DISPATCH != "broker" or settings.JOB_BROKER == "memory"
+
+async def run_job(
+    task_id: str,
+    playbook: str,
+    inventory: Optional[str],
+    extra_vars: Optional[dict],
+    limit: Optional[str] = None,
+    trace_context: Optional[Dict[str, str]] = None,
+    **_,
+) -> dict:
+    """
+    Marks a job as running and executes its playbook, unless it was
+    canceled while it waited. With tracing on, the run is a span under the
+    request that queued the job.
+
+    A job that has already finished, e.g. because another process declared
+    it lost, is not run.
+    """
+    job = await job_repository.update(task_id, {"status": "running"})
+    if job is None:
+        return await job_repository.get(task_id) or {"status": "error", "error": f"Job {task_id} not found"}
+    if job.get("cancel_requested"):
+        result = {"status": "canceled"}
+        await job_repository.update(task_id, result)
+        event_bus.close(task_id)
+        return result
+    with tracing.span("job.run", carrier=trace_context, task_id=task_id, playbook=playbook) as current:
+        result = await execute_ansible_playbook(
+            task_id,
+            playbook,
+            inventory=inventory,
+            extra_vars=extra_vars,
+            limit=limit,
+        )
+        if current is not None:
+            current.set_attribute("job.status", result["status"])
+        return result
+
+async def submit_job(
+    task_id: str,
+    playbook: str,
+    inventory: Optional[str] = None,
+    extra_vars: Optional[Dict[str, Any]] = None,
+    project_id: Optional[str] = None,
+    priority: str = "normal",
+    limit: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Records a new job and hands it to the configured executor.
+
+    Args:
+        task_id: The ID of the new job.
+        playbook: The name of the playbook to run.
+        inventory: The inventory to use for the playbook.
+        extra_vars: Extra variables to pass to the playbook.
+        project_id: The project the playbook belongs to, if any.
+        priority: One of "high", "normal" or "low".
+        limit: A host pattern further limiting the hosts the playbook runs on.
+
+    Returns:
+        The job's position in the local scheduler queue, or None if it was
+        handed to the broker.
+    """
+    trace_context = tracing.current_context()
+    await job_repository.create(
+        task_id,
+        playbook,
+        project_id=project_id,
+        priority=priority,
+        limit=limit,
+        trace_context=trace_context,
+        **_holder(),
+    )
+    spec = {
+        "task_id": task_id,
+        "playbook": playbook,
+        "inventory": inventory,
+        "extra_vars": extra_vars,
+        "project_id": project_id,
+        "priority": priority,
+        "limit": limit,
+        "trace_context": trace_context,
+    }
+    return await _dispatch(spec)
+
+async def submit_batch(group_id: str, specs: List[Dict[str, Any]]) -> List[Optional[int]]:
+    """
+    Records a batch of jobs with one write and hands each to the configured
+    executor. The jobs share `group_id` and keep their order in the batch
+    as `group_index`.
+
+    Args:
+        group_id: The ID of the batch.
+        specs: One dict per job with `task_id`, `playbook` and, optionally,
+            the other arguments of `submit_job`.
+
+    Returns:
+        The position of each job in the local scheduler queue, or None for
+        jobs handed to the broker.
+    """
+    trace_context = tracing.current_context()
+    specs = [
+        {
+            "inventory": None,
+            "extra_vars": None,
+            "project_id": None,
+            "priority": "normal",
+            "limit": None,
+            **spec,
+            "trace_context": trace_context,
+        }
+        for spec in specs
+    ]
+    await job_repository.create_many([
+        {
+            "task_id": spec["task_id"],
+            "playbook": spec["playbook"],
+            "project_id": spec["project_id"],
+            "priority": spec["priority"],
+            "limit": spec["limit"],
+            "trace_context": trace_context,
+            "group_id": group_id,
+            "group_index": index,
+            **_holder(),
+        }
+        for index, spec in enumerate(specs)
+    ])
+    return [await _dispatch(spec) for spec in specs]
+
+def _holder() -> Dict[str, str]:
+    return {"process_id": PROCESS_ID} if holds_jobs() else {}
+
+async def _dispatch(spec: Dict[str, Any]) -> Optional[int]:
+    if settings.JOB_DISPATCH == "broker":
+        await broker.enqueue(spec)
+        return None
+
+    event_bus.open(spec["task_id"])
+    return scheduler.submit(
+        spec["task_id"],
+        lambda: run_job(**spec),
+        playbook=spec["playbook"],
+        project=spec["project_id"],
+        priority=spec["priority"],
+    )
+
+async def cancel_job(task_id: str) -> Optional[str]:
+    """
+    Cancels a queued or running job.
+
+    A job still waiting in this process's scheduler or in the broker is
+    removed right away. A job running in this process is stopped directly;
+    one held by another process is stopped by that process once it sees the
+    job's `cancel_requested` flag.
+
+    Returns:
+        "canceled" if the job never started, "canceling" if it is being
+        stopped, or None if it does not exist or has already finished.
+    """
+    if await job_repository.request_cancel(task_id) is None:
+        return None
+    if scheduler.remove(task_id) or await broker.cancel(task_id):
+        await job_repository.update(task_id, {"status": "canceled"})
+        event_bus.close(task_id)
+        return "canceled"
+    cancel_run(task_id)
+    return "canceling"
+
+async def is_lost(job: Dict[str, Any]) -> bool:
+    """
+    Returns whether an unfinished job will never finish because the process
+    holding it died. Jobs handed to the MongoDB broker are never lost.
+
+    Args:
+        job: The job, with at least `status` and `process_id`.
+    """
+    if job["status"] in TERMINAL_STATUSES or "process_id" not in job:
+        return False
+    if job["process_id"] == PROCESS_ID:
+        return False
+    return not await liveness.is_alive(job["process_id"])
+
+async def mark_lost(task_id: str, process_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Fails a job whose process died, so it expires like any finished job.
+
+    Returns:
+        The job, or None if it had finished in the meantime.
+    """
+    return await job_repository.update(task_id, {
+        "status": "error",
+        "error": f"Process {process_id} holding this job stopped",
+    })
+
+async def reap_lost_jobs() -> int:
+    """
+    Fails the unfinished jobs of every process that died, whether or not
+    anybody follows them.
+
+    Returns:
+        The number of jobs failed.
+    """
+    alive: Dict[str, bool] = {}
+    reaped = 0
+    for job in await job_repository.list_unfinished(("process_id",)):
+        process_id = job.get("process_id")
+        if process_id is None or process_id == PROCESS_ID:
+            continue
+        if process_id not in alive:
+            alive[process_id] = await liveness.is_alive(process_id)
+        if not alive[process_id] and await mark_lost(job["_id"], process_id):
+            reaped += 1
+    return reaped
+
+async def run_reaper(interval: float):
+    """
+    Calls `reap_lost_jobs` every `interval` seconds until canceled.
+    """
+    while True:
+        try:
+            reaped = await reap_lost_jobs()
+            if reaped:
+                logger.warning(f"Failed {reaped} jobs whose process stopped")
+        except Exception as e:
+            logger.error(f"Could not look for lost jobs: {e}")
+        await asyncio.sleep(interval)
+
+async def abandon_jobs():
+    """
+    Stops the jobs this process holds, once it could not prove to other
+    processes that it is alive: they are about to consider its jobs lost
+    and act on that, e.g. a workflow run following its failure edges.
+    Jobs still in the memory broker are not run once another process
+    marked them as failed.
+    """
+    for task_id in scheduler.task_ids():
+        if not scheduler.remove(task_id):
+            cancel_run(task_id)
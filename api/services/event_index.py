@@ -0,0 +1,255 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo import ASCENDING, DESCENDING
+
+from core.config import settings
+from db.database import db
+
+logger = logging.getLogger(__name__)
+
+"""
+This module indexes the per-host events of ansible-runner in the MongoDB
+`job_events` collection, so questions such as "which hosts failed in job X"
+or "which hosts changed in the last day for playbook Y" are answered by an
+indexed query instead of reading job output.
+"""
+
+collection = db.job_events
+
+# runner event -> outcome; runner_on_ok becomes `changed` if the task changed.
+OUTCOMES = {
+    "runner_on_ok": "ok",
+    "runner_on_failed": "failed",
+    "runner_on_async_failed": "failed",
+    "runner_on_unreachable": "unreachable",
+    "runner_on_skipped": "skipped",
+}
+OUTCOME_NAMES = ("ok", "changed", "failed", "unreachable", "skipped")
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+MAX_MESSAGE_LENGTH = 1000
+
+async def ensure_indexes():
+    """
+    Creates the query and expiry indexes of the job_events collection.
+    """
+    await collection.create_index([("job_id", ASCENDING), ("outcome", ASCENDING), ("host", ASCENDING)])
+    await collection.create_index([("job_id", ASCENDING), ("counter", ASCENDING)])
+    await collection.create_index([("playbook", ASCENDING), ("outcome", ASCENDING), ("created", DESCENDING)])
+    await collection.create_index([("host", ASCENDING), ("created", DESCENDING)])
+    await collection.create_index("expires_at", expireAfterSeconds=0)
+
+def _parse_created(value) -> datetime:
+    if isinstance(value, str):
+        try:
+            created = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            # MongoDB stores naive UTC datetimes.
+            return created.replace(tzinfo=None) - (created.utcoffset() or timedelta(0))
+        except ValueError:
+            pass
+    return datetime.utcnow()
+
+def to_record(job_id: str, playbook: str, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Converts a runner event to a `job_events` document.
+
+    Returns:
+        The document, or None for events that are not a host result.
+    """
+    outcome = OUTCOMES.get(event.get("event"))
+    if outcome is None:
+        return None
+    data = event.get("event_data") or {}
+    result = data.get("res") if isinstance(data.get("res"), dict) else {}
+    if outcome == "ok" and result.get("changed"):
+        outcome = "changed"
+    created = _parse_created(event.get("created"))
+    record = {
+        "job_id": job_id,
+        "playbook": playbook,
+        "counter": event.get("counter"),
+        "event": event["event"],
+        "outcome": outcome,
+        "host": data.get("host"),
+        "task": data.get("task"),
+        "play": data.get("play"),
+        "role": data.get("role"),
+        "ignore_errors": bool(data.get("ignore_errors")),
+        "created": created,
+        "expires_at": created + timedelta(seconds=settings.JOB_RESULT_TTL_SECONDS),
+    }
+    if outcome in ("failed", "unreachable") and result.get("msg"):
+        record["msg"] = str(result["msg"])[:MAX_MESSAGE_LENGTH]
+    return record
+
+class EventIndexer:
+    """
+    Batches the host events of one job into bulk inserts.
+
+    A batch is written once it holds `BATCH_SIZE` events or `FLUSH_INTERVAL`
+    seconds after its first event, whichever comes first. The interval is
+    kept by a timer, so a run that goes quiet does not hold its last events
+    back until the next one arrives.
+    """
+    def __init__(self, job_id: str, playbook: str):
+        self.job_id = job_id
+        self.playbook = playbook
+        self._batch: List[Dict[str, Any]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: Set[asyncio.Task] = set()
+
+    async def add(self, event: Dict[str, Any]):
+        record = to_record(self.job_id, self.playbook, event)
+        if record is None:
+            return
+        self._batch.append(record)
+        if len(self._batch) >= BATCH_SIZE:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(FLUSH_INTERVAL, self._flush_later)
+
+    async def flush(self):
+        """
+        Writes the current batch, and waits for the writes the timer started.
+        """
+        await self._write(self._take())
+        if self._writes:
+            await asyncio.gather(*self._writes)
+
+    def _flush_later(self):
+        self._timer = None
+        write = asyncio.ensure_future(self._write(self._take()))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+    def _take(self) -> List[Dict[str, Any]]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        return batch
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        try:
+            await collection.insert_many(batch, ordered=False)
+        except Exception as e:
+            # The index is a query aid; losing a batch must not fail the job.
+            logger.warning(f"Could not index {len(batch)} events of job {self.job_id}: {e}")
+
+def _hosts_pipeline(match: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$host",
+            "events": {"$sum": 1},
+            "tasks": {"$addToSet": "$task"},
+            "jobs": {"$addToSet": "$job_id"},
+            "last_seen": {"$max": "$created"},
+        }},
+        {"$sort": {"_id": 1}},
+        {"$limit": limit},
+        {"$project": {"_id": 0, "host": "$_id", "events": 1, "tasks": 1, "jobs": 1, "last_seen": 1}},
+    ]
+
+async def job_hosts(job_id: str, outcome: str, limit: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Returns the hosts of a job that had at least one event with an outcome,
+    with the tasks concerned.
+    """
+    pipeline = _hosts_pipeline({"job_id": job_id, "outcome": outcome}, limit)
+    hosts = await collection.aggregate(pipeline).to_list(length=limit)
+    for host in hosts:
+        host.pop("jobs", None)
+    return hosts
+
+async def playbook_hosts(playbook: str, outcome: str, since: datetime, limit: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Returns the hosts that had an event with an outcome in any run of a
+    playbook since a point in time, with the jobs and tasks concerned.
+    """
+    pipeline = _hosts_pipeline({"playbook": playbook, "outcome": outcome, "created": {"$gte": since}}, limit)
+    return await collection.aggregate(pipeline).to_list(length=limit)
+
+def _outcome_counters() -> Dict[str, Any]:
+    """
+    Returns `$group` accumulators counting results per outcome, with failures
+    under `ignore_errors` counted as "ignored", as `services.progress` does.
+    """
+    failed = {"$eq": ["$outcome", "failed"]}
+    counters = {
+        outcome: {"$sum": {"$cond": [{"$eq": ["$outcome", outcome]}, 1, 0]}}
+        for outcome in OUTCOME_NAMES if outcome != "failed"
+    }
+    ignored = {"$eq": ["$ignore_errors", True]}
+    counters["failed"] = {"$sum": {"$cond": [{"$and": [failed, {"$ne": ["$ignore_errors", True]}]}, 1, 0]}}
+    counters["ignored"] = {"$sum": {"$cond": [{"$and": [failed, ignored]}, 1, 0]}}
+    return counters
+
+async def job_host_counters(job_id: str, after: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Returns the number of results per outcome of each host of a job, ordered
+    by host name.
+
+    Args:
+        job_id: The ID of the job.
+        after: Only return hosts whose name sorts after this one, to read
+            the next page.
+        limit: The maximum number of hosts to return.
+    """
+    match: Dict[str, Any] = {"job_id": job_id}
+    if after is not None:
+        match["host"] = {"$gt": after}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$host", **_outcome_counters()}},
+        {"$sort": {"_id": 1}},
+        {"$limit": limit},
+    ]
+    hosts = await collection.aggregate(pipeline).to_list(length=limit)
+    return [{"host": host.pop("_id"), **host} for host in hosts]
+
+async def job_task_counters(job_id: str, limit: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Returns the number of host results per outcome of each task of a job,
+    in the order the tasks ran.
+    """
+    pipeline = [
+        {"$match": {"job_id": job_id}},
+        {"$group": {"_id": "$task", "first": {"$min": "$counter"}, **_outcome_counters()}},
+        {"$sort": {"first": 1}},
+        {"$limit": limit},
+    ]
+    tasks = await collection.aggregate(pipeline).to_list(length=limit)
+    return [{"task": task.pop("_id"), **{k: v for k, v in task.items() if k != "first"}} for task in tasks]
+
+async def find_events(
+    job_id: Optional[str] = None,
+    playbook: Optional[str] = None,
+    host: Optional[str] = None,
+    task: Optional[str] = None,
+    play: Optional[str] = None,
+    outcome: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """
+    Returns indexed host events matching every given filter. Events of a
+    single job come in the order they happened, others newest first.
+    """
+    query: Dict[str, Any] = {}
+    for field, value in (
+        ("job_id", job_id), ("playbook", playbook), ("host", host),
+        ("task", task), ("play", play), ("outcome", outcome),
+    ):
+        if value is not None:
+            query[field] = value
+    if since is not None:
+        query["created"] = {"$gte": since}
+    sort = [("counter", ASCENDING)] if job_id is not None else [("created", DESCENDING)]
+    cursor = collection.find(query, {"_id": 0, "expires_at": 0}).sort(sort).limit(limit)
+    return await cursor.to_list(length=limit)
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import deque, OrderedDict
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+"""
+This module provides an in-process event bus that fans ansible-runner job
+events out to live subscribers (Server-Sent Events and WebSocket clients).
+"""
+
+# Events kept per job for late or reconnecting subscribers.
+BUFFER_SIZE = 1000
+# How long a finished job's stream stays available for replay.
+RETENTION_SECONDS = 300
+# Upper bound on finished streams kept around at the same time.
+MAX_CLOSED_STREAMS = 500
+
+class JobEventStream:
+    """
+    A bounded replay buffer of events for a single job.
+
+    Every event gets a monotonically increasing offset starting at 1. Only the
+    last `BUFFER_SIZE` events are retained, so memory use does not depend on
+    how much output the playbook produces. A subscriber that falls further
+    behind than the buffer sees a jump in offsets.
+    """
+    def __init__(self, buffer_size: int = BUFFER_SIZE):
+        self.buffer: Deque[Tuple[int, dict]] = deque(maxlen=buffer_size)
+        self.last_offset = 0
+        self.closed = False
+        self.closed_at: Optional[float] = None
+        self._changed = asyncio.Event()
+
+    def append(self, event: dict) -> int:
+        self.last_offset += 1
+        self.buffer.append((self.last_offset, event))
+        self._notify()
+        return self.last_offset
+
+    def close(self):
+        self.closed = True
+        self.closed_at = time.monotonic()
+        self._notify()
+
+    def since(self, offset: int):
+        """
+        Returns the buffered events with an offset greater than `offset`.
+        """
+        if not self.buffer or offset >= self.last_offset:
+            return []
+        first_offset = self.buffer[0][0]
+        start = max(0, offset - first_offset + 1)
+        return [self.buffer[i] for i in range(start, len(self.buffer))]
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits for the next event or for the stream to close.
+
+        Returns:
+            False if the timeout elapsed first, True otherwise.
+        """
+        changed = self._changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+class EventBus:
+    """
+    Keeps one `JobEventStream` per job and lets callers subscribe to it.
+    """
+    def __init__(self):
+        self._streams: Dict[str, JobEventStream] = {}
+        self._closed: "OrderedDict[str, None]" = OrderedDict()
+
+    def open(self, task_id: str) -> JobEventStream:
+        """
+        Creates the stream for a job, so clients can subscribe before it starts.
+        """
+        self._evict()
+        stream = self._streams.get(task_id)
+        if stream is None:
+            stream = self._streams[task_id] = JobEventStream()
+        return stream
+
+    def get(self, task_id: str) -> Optional[JobEventStream]:
+        return self._streams.get(task_id)
+
+    def publish(self, task_id: str, event: dict) -> int:
+        """
+        Appends an event to a job's stream and wakes up its subscribers.
+
+        Returns:
+            The offset assigned to the event.
+        """
+        return self.open(task_id).append(event)
+
+    def close(self, task_id: str):
+        """
+        Marks a job's stream as finished. Subscribers drain it and return.
+        """
+        stream = self._streams.get(task_id)
+        if stream and not stream.closed:
+            stream.close()
+            self._closed[task_id] = None
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._closed:
+            task_id = next(iter(self._closed))
+            stream = self._streams.get(task_id)
+            expired = stream is None or now - stream.closed_at > RETENTION_SECONDS
+            if not expired and len(self._closed) <= MAX_CLOSED_STREAMS:
+                break
+            self._closed.popitem(last=False)
+            self._streams.pop(task_id, None)
+
+    async def subscribe(
+        self, task_id: str, offset: int = 0, idle_timeout: Optional[float] = None
+    ) -> AsyncIterator[Optional[Tuple[int, dict]]]:
+        """
+        Yields `(offset, event)` pairs of a job, starting after `offset`.
+
+        Args:
+            task_id: The job to follow.
+            offset: The last offset the client has seen; 0 replays the buffer.
+            idle_timeout: If set, `None` is yielded whenever no event arrived
+                for this many seconds, so callers can send keep-alives.
+        """
+        stream = self._streams.get(task_id)
+        if stream is None:
+            return
+        while True:
+            items = stream.since(offset)
+            if items:
+                for item in items:
+                    offset = item[0]
+                    yield item
+                continue
+            if stream.closed:
+                return
+            if not await stream.wait(idle_timeout):
+                yield None
+
+event_bus = EventBus()
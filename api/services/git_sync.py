@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+"""
+This module provides the Git synchronisation engine for projects.
+
+Every remote is fetched into one shared bare repository under
+`<PROJECTS_DIR>/.cache`, and each project checkout is a detached worktree of
+that repository. Projects that point at the same remote therefore share a
+single object store, and a sync is a fetch plus a hard reset of the worktree
+to the fetched commit instead of a fresh clone.
+"""
+
+GIT_ENV = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+
+class GitError(Exception):
+    """
+    Raised when a git command fails or times out.
+    """
+
+@dataclass
+class SyncResult:
+    commit_sha: str
+    changed: bool
+    message: str
+
+_cache_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+def project_dir(project_id: str) -> str:
+    """
+    Returns the checkout directory of a project.
+    """
+    return os.path.join(settings.PROJECTS_DIR, str(project_id))
+
+def cache_dir(git_url: str) -> str:
+    """
+    Returns the shared bare repository used for a remote.
+    """
+    digest = hashlib.sha1(git_url.encode()).hexdigest()
+    return os.path.join(settings.PROJECTS_DIR, ".cache", f"{digest}.git")
+
+async def _git(*args: str, cwd: Optional[str] = None, timeout: Optional[int] = None) -> str:
+    """
+    Runs a git command without blocking the event loop.
+
+    Returns:
+        The command's stdout, stripped.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "git", *args,
+        cwd=cwd,
+        env=GIT_ENV,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout or settings.GIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise GitError(f"git {args[0]} timed out")
+    if process.returncode != 0:
+        raise GitError(f"git {args[0]} failed: {stderr.decode(errors='replace').strip()}")
+    return stdout.decode(errors="replace").strip()
+
+async def resolve_remote_commit(git_url: str, branch: str) -> Optional[str]:
+    """
+    Returns the commit a remote branch points at, without fetching objects.
+    """
+    output = await _git("ls-remote", git_url, f"refs/heads/{branch}")
+    return output.split()[0] if output else None
+
+async def _head(path: str) -> Optional[str]:
+    if not os.path.isdir(path):
+        return None
+    try:
+        return await _git("rev-parse", "HEAD", cwd=path)
+    except GitError:
+        return None
+
+async def _fetch(cache: str, git_url: str, branch: str) -> str:
+    """
+    Fetches a branch into the shared bare repository.
+
+    Returns:
+        The fetched commit SHA.
+    """
+    if not os.path.isdir(cache):
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        await _git("init", "--bare", "--quiet", cache)
+
+    ref = f"refs/remotes/origin/{branch}"
+    command = ["--git-dir", cache, "fetch", "--quiet", "--no-tags", "--force"]
+    if settings.GIT_SYNC_DEPTH:
+        command.append(f"--depth={settings.GIT_SYNC_DEPTH}")
+    if settings.GIT_SYNC_FILTER:
+        command.append(f"--filter={settings.GIT_SYNC_FILTER}")
+    command.extend([git_url, f"+refs/heads/{branch}:{ref}"])
+    await _git(*command)
+    return await _git("--git-dir", cache, "rev-parse", ref)
+
+def _worktree_of(path: str) -> Optional[str]:
+    """
+    Returns the repository a worktree belongs to, or None if `path` is not a worktree.
+    """
+    try:
+        with open(os.path.join(path, ".git")) as f:
+            gitdir = f.read().strip()
+    except OSError:
+        return None
+    if not gitdir.startswith("gitdir: "):
+        return None
+    # gitdir points at <repository>/worktrees/<name>
+    return os.path.realpath(os.path.dirname(os.path.dirname(gitdir[len("gitdir: "):])))
+
+async def _checkout(cache: str, path: str, commit_sha: str):
+    """
+    Points a project worktree at a commit, creating the worktree if needed.
+    """
+    is_worktree = _worktree_of(path) == os.path.realpath(cache)
+    if os.path.exists(path) and not is_worktree:
+        # A full clone from before the shared cache existed, a checkout of a
+        # previous git_url, or a broken checkout.
+        await asyncio.to_thread(shutil.rmtree, path)
+
+    if not is_worktree:
+        await _git("--git-dir", cache, "worktree", "prune")
+        await _git("--git-dir", cache, "worktree", "add", "--detach", "--force", path, commit_sha)
+        return
+
+    await _git("reset", "--hard", "--quiet", commit_sha, cwd=path)
+    await _git("clean", "-fdq", cwd=path)
+
+async def sync_repository(project_id: str, git_url: str, branch: str, known_commit: Optional[str] = None) -> SyncResult:
+    """
+    Brings a project checkout to the current tip of its branch.
+
+    If the remote still points at `known_commit` and the checkout is already
+    there, nothing is fetched and the call returns after one `ls-remote`.
+
+    Args:
+        project_id: The ID of the project.
+        git_url: The URL of the remote repository.
+        branch: The branch to check out.
+        known_commit: The commit recorded by the previous sync, if any.
+
+    Returns:
+        The synced commit and whether it differs from `known_commit`.
+    """
+    path = project_dir(project_id)
+    if known_commit:
+        remote_commit = await resolve_remote_commit(git_url, branch)
+        if remote_commit is None:
+            raise GitError(f"Branch {branch} not found in {git_url}")
+        if remote_commit == known_commit and await _head(path) == known_commit:
+            return SyncResult(known_commit, False, f"Repository already up to date at {known_commit[:12]}")
+
+    cache = cache_dir(git_url)
+    async with _cache_locks[cache]:
+        commit_sha = await _fetch(cache, git_url, branch)
+        await _checkout(cache, path, commit_sha)
+
+    return SyncResult(
+        commit_sha,
+        commit_sha != known_commit,
+        f"Repository synced to {commit_sha[:12]}",
+    )
+
+async def remove_worktree(project_id: str, git_url: Optional[str] = None):
+    """
+    Deletes a project checkout and unregisters it from the shared cache.
+    """
+    path = project_dir(project_id)
+    if os.path.exists(path):
+        await asyncio.to_thread(shutil.rmtree, path)
+        logger.info(f"Cleaned up project directory: {path}")
+    if git_url and os.path.isdir(cache_dir(git_url)):
+        await _git("--git-dir", cache_dir(git_url), "worktree", "prune")
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from db.database import db
+from db.models import Inventory, InventoryCreate, InventoryUpdate
+from services import inventory_parser
+
+logger = logging.getLogger(__name__)
+
+"""
+This module stores inventories in MongoDB, so runs can reference them by ID
+instead of uploading the inventory text with every request.
+"""
+
+async def ensure_indexes():
+    await db.inventories.create_index("name")
+
+async def _parse(content: str) -> Tuple[str, inventory_parser.Inventory]:
+    """
+    Parses an inventory off the event loop, or returns it from the cache.
+
+    Raises:
+        InventoryError: If the content is not a valid inventory.
+    """
+    return await asyncio.to_thread(inventory_parser.load, content)
+
+async def _content_fields(content: str) -> dict:
+    digest, parsed = await _parse(content)
+    summary = parsed.summary()
+    return {
+        "content": content,
+        "content_hash": digest,
+        "host_count": summary["hosts"],
+        "group_count": summary["groups"],
+    }
+
+async def get_all_inventories() -> List[Inventory]:
+    """
+    Retrieves all inventories from the database.
+    """
+    inventories = []
+    async for inventory in db.inventories.find().sort("name", 1):
+        inventories.append(Inventory(**inventory))
+    return inventories
+
+async def get_inventory_by_id(inventory_id: str) -> Optional[Inventory]:
+    """
+    Retrieves an inventory by ID, or None if it does not exist.
+    """
+    try:
+        inventory = await db.inventories.find_one({"_id": ObjectId(inventory_id)})
+    except InvalidId:
+        return None
+    if inventory:
+        return Inventory(**inventory)
+    return None
+
+async def create_inventory(inventory: InventoryCreate) -> Inventory:
+    """
+    Validates and stores a new inventory.
+
+    Raises:
+        InventoryError: If the content is not a valid inventory.
+    """
+    document = inventory.dict()
+    document.update(await _content_fields(inventory.content))
+    document["created_at"] = document["updated_at"] = datetime.utcnow()
+    result = await db.inventories.insert_one(document)
+    document["_id"] = result.inserted_id
+    return Inventory(**document)
+
+async def update_inventory(inventory_id: str, inventory_update: InventoryUpdate) -> Optional[Inventory]:
+    """
+    Updates an inventory. New content is validated before it is stored.
+
+    Raises:
+        InventoryError: If the new content is not a valid inventory.
+    """
+    update_data = {k: v for k, v in inventory_update.dict().items() if v is not None}
+    if "content" in update_data:
+        update_data.update(await _content_fields(update_data["content"]))
+    if not update_data:
+        return None
+    update_data["updated_at"] = datetime.utcnow()
+    try:
+        result = await db.inventories.find_one_and_update(
+            {"_id": ObjectId(inventory_id)},
+            {"$set": update_data},
+            return_document=True
+        )
+    except InvalidId:
+        return None
+    if result:
+        return Inventory(**result)
+    return None
+
+async def delete_inventory(inventory_id: str) -> bool:
+    """
+    Deletes an inventory. Returns False if it did not exist.
+    """
+    try:
+        result = await db.inventories.delete_one({"_id": ObjectId(inventory_id)})
+    except InvalidId:
+        return False
+    return result.deleted_count == 1
+
+async def resolve_targets(content: str, patterns: List[str], limit: Optional[str] = None) -> List[str]:
+    """
+    Returns the hosts of an inventory selected by any of `patterns` (for a
+    playbook run, its plays' `hosts`), narrowed by an optional limit.
+
+    Raises:
+        InventoryError: If the content is not a valid inventory.
+    """
+    _, parsed = await _parse(content)
+    return inventory_parser.resolve_targets(parsed, patterns, limit)
@@ -0,0 +1,366 @@
+import fnmatch
+import hashlib
+import re
+import shlex
+import string
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import yaml
+
+from core.config import settings
+
+"""
+This module parses Ansible inventories (INI and YAML) into an in-memory
+host/group graph and resolves host patterns against it.
+
+Parsed inventories are cached by the SHA-256 of their content, so the same
+inventory text is parsed once no matter how often it is submitted.
+"""
+
+class InventoryError(ValueError):
+    """
+    Raised when an inventory cannot be parsed.
+    """
+
+IMPLICIT_LOCALHOST = ("localhost", "127.0.0.1", "::1")
+RANGE_PATTERN = re.compile(r"\[([0-9a-zA-Z]+):([0-9a-zA-Z]+)(?::([0-9]+))?\]")
+# `host:port`: the host has no colon outside brackets, so ranges such as
+# `web[01:03]:22` and bracketed IPv6 addresses such as `[::1]:22` match,
+# while a bare IPv6 address such as `fe80::1` does not.
+HOST_PORT_PATTERN = re.compile(r"((?:[^:\[\]]|\[[^\]]*\])+):([0-9]+)")
+
+@dataclass
+class Group:
+    # Dicts keep the definition order and make membership checks O(1).
+    hosts: Dict[str, None] = field(default_factory=dict)
+    children: Dict[str, None] = field(default_factory=dict)
+    vars: Dict[str, Any] = field(default_factory=dict)
+
+class Inventory:
+    """
+    A parsed inventory: hosts in definition order and groups with their
+    direct hosts and child groups. Group memberships are expanded lazily
+    and memoized.
+    """
+    def __init__(self):
+        self.hosts: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.groups: Dict[str, Group] = {"all": Group(), "ungrouped": Group()}
+        self._members: Dict[str, List[str]] = {}
+
+    def add_host(self, group: str, host: str, host_vars: Optional[Dict[str, Any]] = None):
+        if host not in self.hosts and len(self.hosts) >= settings.INVENTORY_MAX_HOSTS:
+            raise InventoryError(f"An inventory has at most {settings.INVENTORY_MAX_HOSTS} hosts")
+        self.hosts.setdefault(host, {}).update(host_vars or {})
+        self.group(group).hosts[host] = None
+
+    def group(self, name: str) -> Group:
+        if name not in self.groups:
+            self.groups[name] = Group()
+        return self.groups[name]
+
+    def add_child(self, parent: str, child: str):
+        self.group(child)
+        self.group(parent).children[child] = None
+
+    def finish(self):
+        """
+        Files hosts that are in no group other than `all` under `ungrouped`.
+        """
+        grouped = set()
+        for name, group in self.groups.items():
+            if name not in ("all", "ungrouped"):
+                grouped.update(group.hosts)
+        ungrouped = self.groups["ungrouped"].hosts
+        for host in self.hosts:
+            if host not in grouped:
+                ungrouped[host] = None
+        self._members.clear()
+
+    def members(self, name: str) -> List[str]:
+        """
+        Returns every host of a group, including the hosts of its children.
+        """
+        if name == "all":
+            return list(self.hosts)
+        cached = self._members.get(name)
+        if cached is not None:
+            return cached
+        result: "OrderedDict[str, None]" = OrderedDict()
+        stack, seen = [name], set()
+        while stack:
+            current = stack.pop(0)
+            if current in seen or current not in self.groups:
+                continue
+            seen.add(current)
+            result.update(self.groups[current].hosts)
+            stack.extend(self.groups[current].children)
+        self._members[name] = list(result)
+        return self._members[name]
+
+    def summary(self) -> Dict[str, int]:
+        return {"hosts": len(self.hosts), "groups": len(self.groups)}
+
+def _range_values(pattern: str, match: "re.Match[str]") -> Tuple[Sequence, int]:
+    """
+    Returns the values of one host range and the width numbers are padded
+    to. Numeric ranges are returned as `range`, so their size is known
+    without building them.
+    """
+    start, end, step = match.group(1), match.group(2), int(match.group(3) or 1)
+    if step < 1:
+        raise InventoryError(f"Invalid host range in {pattern!r}")
+    if start.isdigit() and end.isdigit():
+        width = len(start) if start.startswith("0") else 0
+        return range(int(start), int(end) + 1, step), width
+    letters = string.ascii_letters
+    if len(start) == 1 and len(end) == 1 and start in letters and end in letters:
+        return letters[letters.index(start):letters.index(end) + 1:step], 0
+    raise InventoryError(f"Invalid host range in {pattern!r}")
+
+def _expand_ranges(pattern: str) -> List[str]:
+    """
+    Expands `web[01:03]` and `db-[a:c]` style host ranges.
+
+    Raises:
+        InventoryError: If a range is invalid or the pattern expands to more
+            than `INVENTORY_MAX_HOSTS` hosts, which is checked before
+            anything is expanded.
+    """
+    matches = list(RANGE_PATTERN.finditer(pattern))
+    if not matches:
+        return [pattern]
+    ranges = [_range_values(pattern, match) for match in matches]
+    total = 1
+    for values, _ in ranges:
+        total *= len(values)
+        if total > settings.INVENTORY_MAX_HOSTS:
+            raise InventoryError(f"Host range {pattern!r} expands to more than {settings.INVENTORY_MAX_HOSTS} hosts")
+    hosts = [pattern[:matches[0].start()]]
+    for i, (match, (values, width)) in enumerate(zip(matches, ranges)):
+        tail = pattern[match.end():matches[i + 1].start() if i + 1 < len(matches) else None]
+        hosts = [host + str(value).zfill(width) + tail for host in hosts for value in values]
+    return hosts
+
+def _split_port(token: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Splits Ansible's `host:port` notation into the host pattern and its
+    `ansible_port` variable.
+    """
+    match = HOST_PORT_PATTERN.fullmatch(token)
+    if not match:
+        return token, {}
+    host = match.group(1)
+    if host.startswith("[") and host.endswith("]") and not RANGE_PATTERN.fullmatch(host):
+        host = host[1:-1]
+    return host, {"ansible_port": int(match.group(2))}
+
+def _parse_value(value: str) -> Any:
+    try:
+        return yaml.safe_load(value)
+    except yaml.YAMLError:
+        return value
+
+def _parse_assignments(tokens: List[str]) -> Dict[str, Any]:
+    assignments = {}
+    for token in tokens:
+        if "=" not in token:
+            raise InventoryError(f"Expected key=value, got {token!r}")
+        key, value = token.split("=", 1)
+        assignments[key] = _parse_value(value)
+    return assignments
+
+def parse_ini(content: str) -> Inventory:
+    inventory = Inventory()
+    section, kind = "ungrouped", "hosts"
+    for number, raw_line in enumerate(content.splitlines(), start=1):
+        line = raw_line.strip()
+        if not line or line.startswith(("#", ";")):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            name = line[1:-1].strip()
+            section, _, kind = name.partition(":")
+            kind = kind or "hosts"
+            if kind not in ("hosts", "vars", "children"):
+                raise InventoryError(f"Line {number}: unknown section type {kind!r}")
+            inventory.group(section)
+            continue
+        try:
+            tokens = shlex.split(line, comments=True)
+        except ValueError as e:
+            raise InventoryError(f"Line {number}: {e}")
+        if not tokens:
+            continue
+        if kind == "hosts":
+            pattern, port_vars = _split_port(tokens[0])
+            host_vars = {**port_vars, **_parse_assignments(tokens[1:])}
+            for host in _expand_ranges(pattern):
+                inventory.add_host(section, host, host_vars)
+        elif kind == "children":
+            inventory.add_child(section, tokens[0])
+        else:
+            if "=" not in line:
+                raise InventoryError(f"Line {number}: expected key=value")
+            key, value = line.split("=", 1)
+            inventory.group(section).vars[key.strip()] = _parse_value(value.strip())
+    for name in list(inventory.groups):
+        if name != "all":
+            inventory.add_child("all", name)
+    inventory.finish()
+    return inventory
+
+def _parse_yaml_group(inventory: Inventory, name: str, data: Any):
+    inventory.group(name)
+    if data is None:
+        return
+    if not isinstance(data, dict):
+        raise InventoryError(f"Group {name!r} must be a mapping")
+    for token, host_vars in (data.get("hosts") or {}).items():
+        pattern, port_vars = _split_port(str(token))
+        host_vars = {**port_vars, **(host_vars if isinstance(host_vars, dict) else {})}
+        for host in _expand_ranges(pattern):
+            inventory.add_host(name, host, host_vars)
+    if isinstance(data.get("vars"), dict):
+        inventory.group(name).vars.update(data["vars"])
+    for child, child_data in (data.get("children") or {}).items():
+        inventory.add_child(name, str(child))
+        _parse_yaml_group(inventory, str(child), child_data)
+
+def parse_yaml(document: Dict[str, Any]) -> Inventory:
+    inventory = Inventory()
+    for name, data in document.items():
+        _parse_yaml_group(inventory, str(name), data)
+    for name in list(inventory.groups):
+        if name != "all":
+            inventory.add_child("all", name)
+    inventory.finish()
+    return inventory
+
+def _looks_like_yaml(document: Any) -> bool:
+    return isinstance(document, dict) and all(
+        value is None or (isinstance(value, dict) and set(value) <= {"hosts", "vars", "children"})
+        for value in document.values()
+    )
+
+def parse_inventory(content: str) -> Inventory:
+    """
+    Parses an inventory, detecting whether it is YAML or INI.
+
+    Raises:
+        InventoryError: If the content is not a valid inventory.
+    """
+    try:
+        document = yaml.safe_load(content)
+    except yaml.YAMLError:
+        document = None
+    if _looks_like_yaml(document) and document:
+        return parse_yaml(document)
+    return parse_ini(content)
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+_cache: "OrderedDict[str, Inventory]" = OrderedDict()
+
+def load(content: str) -> Tuple[str, Inventory]:
+    """
+    Returns the content hash and the parsed inventory, parsing it only if
+    the same content is not cached yet.
+    """
+    digest = content_hash(content)
+    inventory = _cache.get(digest)
+    if inventory is None:
+        inventory = parse_inventory(content)
+        _cache[digest] = inventory
+        while len(_cache) > settings.INVENTORY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(digest)
+    return digest, inventory
+
+def _split_pattern(pattern: str) -> List[str]:
+    # Ansible accepts both separators; `:` is not a separator inside a range.
+    terms = re.split(r",|:(?![^\[]*\])", pattern)
+    return [term.strip() for term in terms if term.strip()]
+
+def _subscript(hosts: List[str], subscript: str) -> List[str]:
+    if ":" in subscript:
+        start, end = subscript.split(":", 1)
+        return hosts[int(start or 0):int(end) + 1 if end else None]
+    index = int(subscript)
+    return hosts[index:index + 1] if -len(hosts) <= index < len(hosts) else []
+
+def _match_term(inventory: Inventory, term: str) -> List[str]:
+    subscript = None
+    match = re.fullmatch(r"(.+?)\[(-?\d*:?-?\d*)\]", term)
+    if match and not term.startswith("~"):
+        term, subscript = match.group(1), match.group(2)
+
+    if term in ("all", "*"):
+        hosts = list(inventory.hosts)
+    elif term in inventory.groups:
+        hosts = inventory.members(term)
+    elif term in inventory.hosts:
+        hosts = [term]
+    elif term.startswith("~"):
+        try:
+            regex = re.compile(term[1:])
+        except re.error as e:
+            raise InventoryError(f"Invalid regular expression in {term}: {e}")
+        hosts = [host for host in inventory.hosts if regex.search(host)]
+        for name in inventory.groups:
+            if regex.search(name):
+                hosts.extend(inventory.members(name))
+    elif any(char in term for char in "*?["):
+        hosts = [host for host in inventory.hosts if fnmatch.fnmatchcase(host, term)]
+        for name in inventory.groups:
+            if fnmatch.fnmatchcase(name, term):
+                hosts.extend(inventory.members(name))
+    elif term in IMPLICIT_LOCALHOST:
+        hosts = [term]
+    else:
+        hosts = []
+    hosts = list(dict.fromkeys(hosts))
+    if subscript is not None:
+        try:
+            hosts = _subscript(hosts, subscript)
+        except ValueError:
+            raise InventoryError(f"Invalid subscript in {term}[{subscript}]")
+    return hosts
+
+def resolve(inventory: Inventory, pattern: str) -> List[str]:
+    """
+    Returns the hosts a pattern selects, in inventory order.
+
+    Supports the pattern syntax of Ansible: terms separated by `:` or `,`,
+    `&term` intersections, `!term` exclusions, globs, `~regex` and
+    `group[0]` / `group[0:2]` subscripts.
+    """
+    selected: "OrderedDict[str, None]" = OrderedDict()
+    intersections: List[Set[str]] = []
+    exclusions: Set[str] = set()
+    for term in _split_pattern(pattern):
+        if term.startswith("!"):
+            exclusions.update(_match_term(inventory, term[1:]))
+        elif term.startswith("&"):
+            intersections.append(set(_match_term(inventory, term[1:])))
+        else:
+            selected.update(dict.fromkeys(_match_term(inventory, term)))
+    hosts = [host for host in selected if host not in exclusions]
+    for allowed in intersections:
+        hosts = [host for host in hosts if host in allowed]
+    return hosts
+
+def resolve_targets(inventory: Inventory, patterns: List[str], limit: Optional[str] = None) -> List[str]:
+    """
+    Returns the hosts a run targets: the union of its plays' host patterns,
+    narrowed by `limit`.
+    """
+    hosts: "OrderedDict[str, None]" = OrderedDict()
+    for pattern in patterns:
+        hosts.update(dict.fromkeys(resolve(inventory, pattern)))
+    if limit:
+        allowed = set(resolve(inventory, limit))
+        return [host for host in hosts if host in allowed]
+    return list(hosts)
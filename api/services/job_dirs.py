@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Collection, Optional
+
+from core.config import settings
+
+"""
+This module manages the private data directory ansible-runner gets for each
+job. Inventory and extra variables are handed over through the directory
+instead of the shared playbook directory, so parallel runs never touch each
+other's files and all of a run's files go away with one directory.
+
+    <work root>/<task_id>/
+        inventory/hosts
+        env/extravars
+        artifacts/<task_id>/   (written by ansible-runner)
+"""
+
+TMPFS_ROOT = "/dev/shm"
+
+def work_root() -> str:
+    """
+    Returns the directory job directories are created in.
+
+    `RUNNER_WORK_DIR` wins; otherwise a memory-backed tmpfs is preferred
+    when the system has one, and the temporary directory is used if not.
+    """
+    if settings.RUNNER_WORK_DIR:
+        return settings.RUNNER_WORK_DIR
+    if os.path.isdir(TMPFS_ROOT) and os.access(TMPFS_ROOT, os.W_OK):
+        return os.path.join(TMPFS_ROOT, "ansible_aap_jobs")
+    return os.path.join(tempfile.gettempdir(), "ansible_aap_jobs")
+
+def create(task_id: str, inventory: Optional[str], extra_vars: Optional[dict]) -> str:
+    """
+    Creates the private data directory of a job.
+
+    Args:
+        task_id: The ID of the job, used as the directory name.
+        inventory: The inventory content, if the caller supplied one.
+        extra_vars: Extra variables to pass to the playbook.
+
+    Returns:
+        The path of the directory.
+    """
+    job_dir = os.path.join(work_root(), task_id)
+    # A retried job starts from a clean directory.
+    shutil.rmtree(job_dir, ignore_errors=True)
+    os.makedirs(job_dir, mode=0o700)
+    if inventory:
+        os.makedirs(os.path.join(job_dir, "inventory"))
+        with open(os.path.join(job_dir, "inventory", "hosts"), "w") as f:
+            f.write(inventory)
+    if extra_vars:
+        os.makedirs(os.path.join(job_dir, "env"))
+        with open(os.path.join(job_dir, "env", "extravars"), "w") as f:
+            json.dump(extra_vars, f)
+    return job_dir
+
+def remove(job_dir: str):
+    shutil.rmtree(job_dir, ignore_errors=True)
+
+def remove_stale(max_age_seconds: float, active: Collection[str] = ()) -> int:
+    """
+    Removes job directories older than `max_age_seconds`, left behind by
+    processes that died before cleaning up.
+
+    Args:
+        max_age_seconds: Directories modified more recently are kept.
+        active: IDs of unfinished jobs, whose directories are kept however
+            old they are, since ansible-runner may still be using them.
+
+    Returns:
+        The number of directories removed.
+    """
+    root = work_root()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for entry in os.scandir(root):
+        if entry.name in active:
+            continue
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
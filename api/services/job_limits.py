@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import signal
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core.config import settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+"""
+This module stops ansible-runner processes and caps the resources they use.
+
+Every run is started in a process group of its own. ansible-playbook and the
+modules it runs leave that group, so a run is stopped by signalling the group
+and every process descending from the runner.
+
+Memory is capped per process with RLIMIT_AS. If `RUNNER_CGROUP_ROOT` names a
+delegated cgroup v2 directory, each job gets a cgroup there instead, with
+`memory.max` and `cpu.max` applying to the job as a whole; the cgroup also
+catches processes that were orphaned.
+"""
+
+def _write(path: str, value: str):
+    with open(path, "w") as f:
+        f.write(value)
+
+def create_cgroup(task_id: str) -> Optional[str]:
+    """
+    Creates the cgroup of a job when cgroups are configured.
+
+    Returns:
+        The path of the cgroup, or None.
+    """
+    if not settings.RUNNER_CGROUP_ROOT:
+        return None
+    path = os.path.join(settings.RUNNER_CGROUP_ROOT, f"job-{task_id}")
+    try:
+        os.makedirs(path, exist_ok=True)
+        if settings.RUNNER_MEMORY_LIMIT_MB:
+            _write(os.path.join(path, "memory.max"), str(settings.RUNNER_MEMORY_LIMIT_MB * 1024 * 1024))
+        if settings.RUNNER_CPU_LIMIT:
+            period = 100000
+            _write(os.path.join(path, "cpu.max"), f"{int(settings.RUNNER_CPU_LIMIT * period)} {period}")
+    except OSError as e:
+        logger.warning(f"Could not create cgroup {path}, running job {task_id} without it: {e}")
+        remove_cgroup(path)
+        return None
+    return path
+
+def join_cgroup(cgroup: str, pid: int):
+    """
+    Moves a process into a job's cgroup. Processes it starts afterwards inherit it.
+    """
+    _write(os.path.join(cgroup, "cgroup.procs"), str(pid))
+
+def remove_cgroup(cgroup: Optional[str]):
+    if cgroup is None:
+        return
+    try:
+        os.rmdir(cgroup)
+    except OSError as e:
+        logger.warning(f"Could not remove cgroup {cgroup}: {e}")
+
+def preexec(cgroup: Optional[str] = None) -> Optional[Callable[[], None]]:
+    """
+    Returns the function that applies the limits in a new runner process
+    before it executes, or None if there is nothing to apply.
+
+    Args:
+        cgroup: The job's cgroup, if any. Launchers of the runner pool are
+            started before their job is known and join it later.
+    """
+    if resource is None:
+        return None
+    memory = settings.RUNNER_MEMORY_LIMIT_MB * 1024 * 1024
+    if settings.RUNNER_CGROUP_ROOT:
+        # memory.max of the job's cgroup replaces the per-process limit.
+        memory = 0
+    if not cgroup and not memory:
+        return None
+
+    def apply():
+        if cgroup:
+            _write(os.path.join(cgroup, "cgroup.procs"), "0")
+        if memory:
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    return apply
+
+def descendants(pid: int) -> List[int]:
+    """
+    Returns every process a process started, directly or not. Needs /proc,
+    so it finds nothing on other systems.
+    """
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+            # The command name may contain spaces; the fields after it are state, ppid, ...
+            ppid = int(stat[stat.rindex(b")") + 2:].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    result, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            result.append(child)
+            stack.append(child)
+    return result
+
+def _signal(process: asyncio.subprocess.Process, pids: Iterable[int], sig: int):
+    if hasattr(os, "killpg"):
+        targets = [(os.killpg, process.pid)] + [(os.kill, pid) for pid in pids]
+        for send, target in targets:
+            try:
+                send(target, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+    elif process.returncode is None:
+        process.kill() if sig != signal.SIGTERM else process.terminate()
+
+def terminate(process: asyncio.subprocess.Process, pids: Iterable[int] = ()):
+    """
+    Asks a run to stop: SIGTERM to its process group and to `pids`, the
+    processes it started outside of the group.
+    """
+    _signal(process, pids, signal.SIGTERM)
+
+def kill(process: asyncio.subprocess.Process, pids: Iterable[int] = (), cgroup: Optional[str] = None):
+    """
+    Kills a run's process group, `pids` and every process left in its cgroup.
+    """
+    _signal(process, pids, getattr(signal, "SIGKILL", signal.SIGTERM))
+    if cgroup is None:
+        return
+    try:
+        _write(os.path.join(cgroup, "cgroup.kill"), "1")
+    except OSError:
+        # Kernels before 5.14 have no cgroup.kill.
+        try:
+            with open(os.path.join(cgroup, "cgroup.procs")) as f:
+                pids = [int(line) for line in f if line.strip()]
+        except OSError:
+            return
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from core.config import settings
+from db.database import db
+
+logger = logging.getLogger(__name__)
+
+"""
+This module provides the MongoDB-backed repository for playbook jobs.
+"""
+
+TERMINAL_STATUSES = ("success", "error", "canceled")
+# Fields of the compact `view=status` representation of a task. It leaves
+# out the result payload and stdout, and everything that changes while a
+# job runs without its status changing, such as progress.
+STATUS_FIELDS = (
+    "playbook", "status", "returncode", "error", "cancel_requested", "created_at", "started_at", "finished_at",
+)
+
+class JobRepository:
+    """
+    Stores job state in the `jobs` collection so it survives restarts and is
+    shared by every API worker.
+
+    Finished jobs never change again, so they are kept in a small in-process
+    LRU cache. Jobs that are still queued or running are always read from
+    MongoDB, because another worker may be updating them.
+
+    Every write increments the job's `version`, which clients use to tell
+    whether a job changed since they last read it.
+    """
+    def __init__(self, collection, cache_size: int, ttl_seconds: int):
+        self.collection = collection
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Held by the waiters only, so an entry goes away with its last waiter.
+        self._changed: "weakref.WeakValueDictionary[str, asyncio.Event]" = weakref.WeakValueDictionary()
+
+    async def ensure_indexes(self):
+        """
+        Creates the query and expiry indexes of the jobs collection.
+        """
+        await self.collection.create_index([("status", ASCENDING), ("created_at", DESCENDING)])
+        await self.collection.create_index([("playbook", ASCENDING), ("created_at", DESCENDING)])
+        await self.collection.create_index([("group_id", ASCENDING), ("group_index", ASCENDING)], sparse=True)
+        # Documents are removed once `expires_at` has passed; it is only set
+        # when a job finishes, so queued and running jobs never expire.
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def create(self, task_id: str, playbook: str, **fields) -> Dict[str, Any]:
+        """
+        Inserts a new job in the `queued` state.
+
+        Args:
+            task_id: The ID of the job.
+            playbook: The name of the playbook to run.
+            fields: Additional fields to store, e.g. project_id or priority.
+
+        Returns:
+            The stored job document.
+        """
+        job = self._new(task_id, playbook, fields)
+        await self.collection.insert_one(job)
+        return job
+
+    async def create_many(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Inserts several new jobs in the `queued` state with one write.
+
+        Args:
+            jobs: The `task_id` and `playbook` of each job, along with any
+                additional fields to store.
+
+        Returns:
+            The stored job documents.
+        """
+        documents = [
+            self._new(job["task_id"], job["playbook"], {k: v for k, v in job.items() if k not in ("task_id", "playbook")})
+            for job in jobs
+        ]
+        await self.collection.insert_many(documents)
+        return documents
+
+    def _new(self, task_id: str, playbook: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        return {
+            "_id": task_id,
+            "playbook": playbook,
+            "status": "queued",
+            "version": 1,
+            "data": None,
+            "created_at": now,
+            "updated_at": now,
+            **fields,
+        }
+
+    async def update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Sets fields on a job. Moving to a terminal status stamps `finished_at`
+        and schedules the document for TTL expiry. The status of a finished
+        job is never changed again.
+
+        Returns:
+            The updated job document, or None if the job does not exist or,
+            when `fields` sets a status, has already finished.
+        """
+        now = datetime.utcnow()
+        update = {**fields, "updated_at": now}
+        if fields.get("status") == "running":
+            update.setdefault("started_at", now)
+        if fields.get("status") in TERMINAL_STATUSES:
+            update["finished_at"] = now
+            update["expires_at"] = now + timedelta(seconds=self.ttl_seconds)
+
+        query: Dict[str, Any] = {"_id": task_id}
+        if "status" in fields:
+            query["status"] = {"$nin": list(TERMINAL_STATUSES)}
+        job = await self.collection.find_one_and_update(
+            query,
+            {"$set": update, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        self._cache.pop(task_id, None)
+        if job and job["status"] in TERMINAL_STATUSES:
+            self._remember(job)
+        self._notify(task_id)
+        return job
+
+    async def get(self, task_id: str, fields: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns a job by ID, serving finished jobs from the LRU cache.
+
+        Args:
+            task_id: The ID of the job.
+            fields: Only read these fields (and `status` and `version`) from MongoDB.
+        """
+        job = self._cache.get(task_id)
+        if job is not None:
+            self._cache.move_to_end(task_id)
+            return job
+        projection = dict.fromkeys(("status", "version", *fields), 1) if fields else None
+        job = await self.collection.find_one({"_id": task_id}, projection)
+        if job and job["status"] in TERMINAL_STATUSES and projection is None:
+            self._remember(job)
+        return job
+
+    async def list_group(self, group_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the jobs of a batch in submission order, with one indexed query.
+
+        Args:
+            group_id: The ID of the batch.
+            fields: Only read these fields (and `status`) from MongoDB.
+        """
+        projection = dict.fromkeys(("status", *fields), 1) if fields else None
+        cursor = self.collection.find({"group_id": group_id}, projection).sort("group_index", ASCENDING)
+        return await cursor.to_list(length=None)
+
+    async def list_unfinished(self, fields: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Returns every queued or running job.
+
+        Args:
+            fields: Only read these fields (and `status`) from MongoDB.
+        """
+        projection = dict.fromkeys(("status", *fields), 1)
+        cursor = self.collection.find({"status": {"$in": ["queued", "running"]}}, projection)
+        return await cursor.to_list(length=None)
+
+    async def wait_for_change(
+        self, task_id: str, version: int, timeout: float, fields: Optional[Sequence[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Waits until a job no longer has the given version, or for `timeout`
+        seconds. Finished jobs do not change, so they are returned at once.
+
+        Writes made by this process wake the waiter immediately. Jobs that
+        another process runs are re-read every `JOB_WAIT_POLL_INTERVAL`.
+
+        Returns:
+            The job as it is when the wait ends, or None if it does not exist.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(task_id, fields)
+            remaining = deadline - time.monotonic()
+            if (
+                job is None
+                or job.get("version", 0) != version
+                or job["status"] in TERMINAL_STATUSES
+                or remaining <= 0
+            ):
+                return job
+            changed = self._changed.get(task_id)
+            if changed is None:
+                changed = self._changed[task_id] = asyncio.Event()
+            try:
+                await asyncio.wait_for(changed.wait(), min(remaining, settings.JOB_WAIT_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+
+    async def request_cancel(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Flags an unfinished job for cancellation. The process running the job
+        notices the flag and stops it.
+
+        Returns:
+            The updated job document, or None if the job does not exist or
+            has already finished.
+        """
+        job = await self.collection.find_one_and_update(
+            {"_id": task_id, "status": {"$nin": list(TERMINAL_STATUSES)}},
+            {"$set": {"cancel_requested": True, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        self._notify(task_id)
+        return job
+
+    async def cancel_requested(self, task_id: str) -> bool:
+        job = await self.collection.find_one({"_id": task_id}, {"cancel_requested": 1})
+        return bool(job and job.get("cancel_requested"))
+
+    def _notify(self, task_id: str):
+        changed = self._changed.pop(task_id, None)
+        if changed is not None:
+            changed.set()
+
+    def _remember(self, job: Dict[str, Any]):
+        self._cache[job["_id"]] = job
+        self._cache.move_to_end(job["_id"])
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+def to_response(job: Dict[str, Any], view: str = "full") -> Dict[str, Any]:
+    """
+    Converts a job document to the shape returned by the task endpoints.
+
+    Args:
+        job: The job document.
+        view: "full" for every field, "status" for `STATUS_FIELDS` only.
+    """
+    if view == "status":
+        result = {k: job[k] for k in STATUS_FIELDS if k in job}
+    else:
+        result = {k: v for k, v in job.items() if k not in ("_id", "expires_at")}
+    result["task_id"] = job["_id"]
+    return result
+
+def summarize_group(jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregates the jobs of a batch.
+
+    Returns:
+        The number of jobs per status and the status of the batch: "queued"
+        until a job starts, "running" until every job has finished, then
+        "success" if all succeeded, "error" if any failed and "canceled"
+        otherwise.
+    """
+    counts: Dict[str, int] = {}
+    for job in jobs:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    finished = sum(counts.get(status, 0) for status in TERMINAL_STATUSES)
+    if finished == len(jobs):
+        if counts.get("success", 0) == len(jobs):
+            status = "success"
+        else:
+            status = "error" if counts.get("error") else "canceled"
+    elif counts.get("queued", 0) == len(jobs):
+        status = "queued"
+    else:
+        status = "running"
+    return {"status": status, "total": len(jobs), "finished": finished, "counts": counts}
+
+job_repository = JobRepository(
+    db.jobs,
+    cache_size=settings.JOB_CACHE_SIZE,
+    ttl_seconds=settings.JOB_RESULT_TTL_SECONDS,
+)
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from services import locks
+from services.process_identity import PROCESS_ID
+
+logger = logging.getLogger(__name__)
+
+"""
+This module lets processes tell whether another process is still alive.
+
+Every process holding jobs that only it can run keeps a lock named after it
+in the `locks` collection and renews its lease periodically; the jobs
+record the process's ID. Once the lease has expired, the process is
+considered dead and its jobs lost.
+"""
+
+def _lock_name(process_id: str) -> str:
+    return f"process:{process_id}"
+
+async def is_alive(process_id: str) -> bool:
+    """
+    Returns whether a process still renews its lease.
+    """
+    return await locks.held(_lock_name(process_id))
+
+async def run(ttl_seconds: int, on_lapse: Callable[[], Awaitable[None]]):
+    """
+    Renews this process's lease every third of `ttl_seconds` until canceled,
+    then releases it.
+
+    Args:
+        ttl_seconds: How long the process is considered alive after a renewal.
+        on_lapse: Stops the jobs of this process. It is called when the
+            lease could not be renewed for half of `ttl_seconds`, so the
+            jobs stop before other processes consider them lost, and again
+            whenever a renewal finds that the lease has expired.
+    """
+    name = _lock_name(PROCESS_ID)
+    renewed = time.monotonic()
+    try:
+        await locks.acquire(name, PROCESS_ID, ttl_seconds)
+    except Exception as e:
+        logger.error(f"Process {PROCESS_ID} could not take its liveness lease: {e}")
+    try:
+        while True:
+            await asyncio.sleep(ttl_seconds / 3)
+            try:
+                if not await locks.renew(name, PROCESS_ID, ttl_seconds):
+                    logger.error(f"Liveness lease of process {PROCESS_ID} expired, stopping its jobs")
+                    await on_lapse()
+                    await locks.acquire(name, PROCESS_ID, ttl_seconds)
+                renewed = time.monotonic()
+            except Exception as e:
+                logger.error(f"Process {PROCESS_ID} could not renew its liveness lease: {e}")
+                if time.monotonic() - renewed >= ttl_seconds / 2:
+                    await on_lapse()
+    finally:
+        try:
+            await locks.release(name, PROCESS_ID)
+        except Exception as e:
+            logger.error(f"Process {PROCESS_ID} could not release its liveness lease: {e}")
@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from db.database import db
+
+"""
+This module provides lease-based locks stored in MongoDB, shared by every
+API and worker process that uses the same database.
+"""
+
+collection = db.locks
+
+async def ensure_indexes():
+    """
+    Lets MongoDB remove lock records whose lease has expired.
+    """
+    await collection.create_index("expires_at", expireAfterSeconds=0)
+
+async def acquire(name: str, owner: str, ttl_seconds: int) -> bool:
+    """
+    Tries to take a lock without waiting.
+
+    A lock whose lease has expired is taken over, so a crashed holder can
+    never block others for longer than `ttl_seconds`.
+
+    Returns:
+        True if `owner` now holds the lock.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    try:
+        await collection.insert_one({"_id": name, "owner": owner, "expires_at": expires_at})
+        return True
+    except DuplicateKeyError:
+        taken = await collection.find_one_and_update(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": expires_at}},
+        )
+        return taken is not None
+
+async def renew(name: str, owner: str, ttl_seconds: int) -> bool:
+    """
+    Extends the lease of a lock `owner` holds.
+
+    Returns:
+        False if `owner` no longer holds the lock or its lease had already
+        expired, in which case someone else may have taken it over.
+    """
+    now = datetime.utcnow()
+    result = await collection.update_one(
+        {"_id": name, "owner": owner, "expires_at": {"$gte": now}},
+        {"$set": {"expires_at": now + timedelta(seconds=ttl_seconds)}},
+    )
+    return result.matched_count == 1
+
+async def held(name: str) -> bool:
+    """
+    Returns whether somebody holds a lock whose lease has not expired.
+    """
+    lock = await collection.find_one({"_id": name})
+    return lock is not None and lock["expires_at"] >= datetime.utcnow()
+
+async def release(name: str, owner: str):
+    """
+    Releases a lock if `owner` still holds it.
+    """
+    await collection.delete_one({"_id": name, "owner": owner})
+
+async def wait_released(name: str, timeout: float, poll_interval: float = 0.5) -> bool:
+    """
+    Waits until nobody holds a lock, or its lease expires.
+
+    Returns:
+        False if the lock was still held when the timeout elapsed.
+    """
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        lock = await collection.find_one({"_id": name})
+        if lock is None or lock["expires_at"] < datetime.utcnow():
+            return True
+        if asyncio.get_running_loop().time() >= deadline:
+            return False
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,90 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from services.playbook_index import classify_playbook
+
+"""
+This module provides an in-memory catalog of the playbooks in the local
+`ansible/` directory.
+"""
+
+ANSIBLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'ansible'))
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    playbooks: List[str]
+    names: FrozenSet[str]
+    etag: str
+    last_modified: datetime
+
+    @property
+    def last_modified_header(self) -> str:
+        return format_datetime(self.last_modified, usegmt=True)
+
+class PlaybookCatalog:
+    """
+    Lists the playbooks of a directory and rescans it only when it changes.
+
+    Adding, removing or renaming a file updates the directory's mtime, so
+    each lookup costs a single `stat` call until something actually changed.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._mtime_ns = None
+        self._snapshot = None
+        self._host_patterns: Dict[str, Tuple[int, Optional[List[str]]]] = {}
+
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        Returns the current playbook list, rescanning the directory if its mtime changed.
+        """
+        mtime_ns = os.stat(self.directory).st_mtime_ns
+        if self._snapshot is None or mtime_ns != self._mtime_ns:
+            self._snapshot = self._scan(mtime_ns)
+            self._mtime_ns = mtime_ns
+        return self._snapshot
+
+    def _scan(self, mtime_ns: int) -> CatalogSnapshot:
+        playbooks = sorted(
+            filename[:-len(".yml")]
+            for filename in os.listdir(self.directory)
+            if filename.endswith(".yml")
+        )
+        digest = hashlib.sha1("\n".join(playbooks).encode()).hexdigest()
+        # HTTP dates have a resolution of one second.
+        last_modified = datetime.fromtimestamp(mtime_ns // 1_000_000_000, tz=timezone.utc)
+        return CatalogSnapshot(
+            playbooks=playbooks,
+            names=frozenset(playbooks),
+            etag=f'"{digest[:16]}"',
+            last_modified=last_modified,
+        )
+
+    def exists(self, playbook_name: str) -> bool:
+        """
+        Returns True if the directory contains `<playbook_name>.yml`.
+        """
+        return playbook_name in self.snapshot().names
+
+    def path(self, playbook_name: str) -> str:
+        return os.path.join(self.directory, f"{playbook_name}.yml")
+
+    def host_patterns(self, playbook_name: str) -> Optional[List[str]]:
+        """
+        Returns the `hosts` patterns of a playbook's plays, re-reading the
+        file only when its mtime changed. None if the file is not a playbook.
+        """
+        path = self.path(playbook_name)
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self._host_patterns.get(playbook_name)
+        if cached is None or cached[0] != mtime_ns:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                metadata = classify_playbook(f.read())
+            cached = self._host_patterns[playbook_name] = (mtime_ns, metadata["hosts"] if metadata else None)
+        return cached[1]
+
+playbook_catalog = PlaybookCatalog(ANSIBLE_DIR)
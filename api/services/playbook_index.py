@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from db.database import db
+
+logger = logging.getLogger(__name__)
+
+"""
+This module builds and serves the playbook index of a project checkout.
+
+The index lists the files that are real playbooks (a top-level list of plays)
+along with their hosts patterns, declared variables and tags. It is built once
+per synced commit, stored in MongoDB and cached in memory, so listing a
+project's playbooks does not touch the filesystem.
+"""
+
+collection = db.playbook_indexes
+
+# Directories that hold variables, roles or CI configuration, never playbooks.
+SKIP_DIRS = {"group_vars", "host_vars", "roles", "collections", "molecule"}
+MAX_FILE_SIZE = 1024 * 1024
+IMPORT_KEYS = ("import_playbook", "ansible.builtin.import_playbook")
+
+# Latest index per project: project_id -> (commit_sha, playbooks)
+_cache: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {}
+
+class _PlaybookLoader(yaml.SafeLoader):
+    """
+    A safe loader that accepts Ansible tags such as !vault and !unsafe.
+    """
+
+def _construct_unknown(loader, tag_suffix, node):
+    if isinstance(node, yaml.ScalarNode):
+        return loader.construct_scalar(node)
+    if isinstance(node, yaml.SequenceNode):
+        return loader.construct_sequence(node)
+    return loader.construct_mapping(node)
+
+_PlaybookLoader.add_multi_constructor("!", _construct_unknown)
+
+def _as_list(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+def _task_tags(tasks) -> List[str]:
+    tags = []
+    for task in tasks or []:
+        if not isinstance(task, dict):
+            continue
+        tags.extend(_as_list(task.get("tags")))
+        for key in ("block", "rescue", "always"):
+            tags.extend(_task_tags(task.get(key)))
+    return tags
+
+def classify_playbook(content: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns playbook metadata if a YAML document is a playbook, else None.
+
+    A playbook is a top-level list whose items are all plays (mappings with
+    `hosts`) or playbook imports.
+    """
+    try:
+        document = yaml.load(content, Loader=_PlaybookLoader)
+    except yaml.YAMLError:
+        return None
+    if not isinstance(document, list) or not document:
+        return None
+
+    hosts, variables, tags, names = [], [], [], []
+    plays = 0
+    for item in document:
+        if not isinstance(item, dict):
+            return None
+        if any(key in item for key in IMPORT_KEYS):
+            continue
+        if "hosts" not in item:
+            return None
+        plays += 1
+        if item.get("name"):
+            names.append(str(item["name"]))
+        hosts.extend(_as_list(item.get("hosts")))
+        if isinstance(item.get("vars"), dict):
+            variables.extend(str(k) for k in item["vars"])
+        for prompt in item.get("vars_prompt") or []:
+            if isinstance(prompt, dict) and prompt.get("name"):
+                variables.append(str(prompt["name"]))
+        tags.extend(_as_list(item.get("tags")))
+        for section in ("pre_tasks", "tasks", "post_tasks", "handlers"):
+            tags.extend(_task_tags(item.get(section)))
+
+    def unique(values):
+        return list(dict.fromkeys(values))
+
+    return {
+        "plays": plays,
+        "names": names,
+        "hosts": unique(hosts),
+        "vars": unique(variables),
+        "tags": unique(tags),
+    }
+
+def _count_tasks(tasks) -> int:
+    count = 0
+    for task in tasks or []:
+        if not isinstance(task, dict):
+            continue
+        if any(key in task for key in ("block", "rescue", "always")):
+            # A rescue section only runs when the block fails.
+            count += _count_tasks(task.get("block")) + _count_tasks(task.get("always"))
+        else:
+            count += 1
+    return count
+
+def _role_name(role) -> Optional[str]:
+    if isinstance(role, dict):
+        role = role.get("role") or role.get("name")
+    return str(role) if role else None
+
+def _count_role_tasks(role: str, roles_dir: str) -> int:
+    for filename in ("main.yml", "main.yaml"):
+        path = os.path.join(roles_dir, role, "tasks", filename)
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                return _count_tasks(yaml.load(f, Loader=_PlaybookLoader))
+        except (OSError, yaml.YAMLError):
+            continue
+    return 1
+
+def estimate_task_count(playbook_path: str) -> Optional[int]:
+    """
+    Estimates how many tasks a playbook runs per host, by a static parse.
+
+    Fact gathering, blocks and the `tasks/main.yml` of roles next to the
+    playbook are taken into account; conditionals, loops and includes are
+    not, so the result is an estimate.
+
+    Returns:
+        The estimated task count, or None if the file is not a playbook.
+    """
+    try:
+        with open(playbook_path, encoding="utf-8", errors="replace") as f:
+            document = yaml.load(f, Loader=_PlaybookLoader)
+    except (OSError, yaml.YAMLError):
+        return None
+    if not isinstance(document, list):
+        return None
+    roles_dir = os.path.join(os.path.dirname(playbook_path), "roles")
+    count = 0
+    for play in document:
+        if not isinstance(play, dict) or "hosts" not in play:
+            continue
+        if play.get("gather_facts", True) not in (False, "false", "no"):
+            count += 1
+        for section in ("pre_tasks", "tasks", "post_tasks"):
+            count += _count_tasks(play.get(section))
+        for role in play.get("roles") or []:
+            name = _role_name(role)
+            if name:
+                count += _count_role_tasks(name, roles_dir)
+    return count
+
+def build_index(project_dir: str) -> List[Dict[str, Any]]:
+    """
+    Walks a checkout and classifies every YAML file in it.
+
+    Returns:
+        One metadata entry per playbook, sorted by path.
+    """
+    playbooks = []
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS]
+        for file in files:
+            if not file.endswith((".yml", ".yaml")):
+                continue
+            path = os.path.join(root, file)
+            try:
+                if os.path.getsize(path) > MAX_FILE_SIZE:
+                    continue
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    metadata = classify_playbook(f.read())
+            except OSError as e:
+                logger.warning(f"Could not read {path}: {e}")
+                continue
+            if metadata is not None:
+                playbooks.append({"path": os.path.relpath(path, project_dir), **metadata})
+    return sorted(playbooks, key=lambda p: p["path"])
+
+async def rebuild_index(project_id: str, commit_sha: str, project_dir: str) -> List[Dict[str, Any]]:
+    """
+    Builds the index of a checkout and stores it as the project's current index.
+    """
+    playbooks = await asyncio.to_thread(build_index, project_dir)
+    await collection.replace_one(
+        {"_id": f"{project_id}:{commit_sha}"},
+        {
+            "project_id": project_id,
+            "commit_sha": commit_sha,
+            "playbooks": playbooks,
+            "built_at": datetime.utcnow(),
+        },
+        upsert=True,
+    )
+    await collection.delete_many({"project_id": project_id, "commit_sha": {"$ne": commit_sha}})
+    _cache[project_id] = (commit_sha, playbooks)
+    return playbooks
+
+async def get_index(project_id: str, commit_sha: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Returns the stored index of a project at a commit, or None if it was never built.
+    """
+    cached = _cache.get(project_id)
+    if cached and cached[0] == commit_sha:
+        return cached[1]
+    document = await collection.find_one({"_id": f"{project_id}:{commit_sha}"})
+    if document is None:
+        return None
+    _cache[project_id] = (commit_sha, document["playbooks"])
+    return document["playbooks"]
+
+async def drop_index(project_id: str):
+    """
+    Removes every stored index of a project.
+    """
+    _cache.pop(project_id, None)
+    await collection.delete_many({"project_id": project_id})
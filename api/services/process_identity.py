@@ -0,0 +1,11 @@
+import os
+import socket
+import uuid
+
+"""
+This module identifies the running process to the other processes sharing
+the database, e.g. as the owner of locks, leases and claimed jobs.
+"""
+
+# Unique per process, even when a restarted process gets the same PID.
+PROCESS_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
@@ -0,0 +1,143 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from services.event_index import OUTCOMES
+from services.jobs import job_repository
+
+logger = logging.getLogger(__name__)
+
+"""
+This module aggregates the events of a running job into counters, so
+clients can follow large runs without reading events. Only aggregates are
+stored on the job; per-host and per-task figures are read from the event
+index, see `services.event_index`.
+"""
+
+# Minimum seconds between two progress writes of the same job.
+PERSIST_INTERVAL = 2.0
+HOST_OUTCOMES = ("ok", "changed", "failed", "unreachable", "skipped", "ignored")
+
+def host_status(counters: Dict[str, int], tasks_total: int, finished: bool) -> str:
+    """
+    Returns the status of a host from its result counters.
+
+    A host is done once it failed or became unreachable, which takes it out
+    of the play, or once it reported a result for every task of the run.
+
+    Args:
+        counters: The host's number of results per outcome in `HOST_OUTCOMES`.
+        tasks_total: The number of tasks of the run, as far as it is known.
+        finished: Whether the run has ended.
+    """
+    if counters["unreachable"]:
+        return "unreachable"
+    if counters["failed"]:
+        return "failed"
+    if finished or (tasks_total and sum(counters.values()) >= tasks_total):
+        return "changed" if counters["changed"] else "ok"
+    return "running"
+
+class JobProgress:
+    """
+    Updates counters as each runner event arrives.
+
+    Completion is the share of estimated tasks done, where the current task
+    counts by the share of active hosts that already reported it. Hosts that
+    failed or became unreachable leave the play, as in Ansible. The task
+    count comes from a static parse of the playbook and is raised whenever
+    the run proves it too low.
+    """
+    def __init__(self, task_id: str, estimated_tasks: Optional[int] = None):
+        self.task_id = task_id
+        self.estimated_tasks = estimated_tasks or 0
+        self.started = time.monotonic()
+        self.hosts: Dict[str, Dict[str, int]] = {}
+        self.removed_hosts = set()
+        self.tasks_started = 0
+        self.current_task: Optional[str] = None
+        self.current_task_hosts = set()
+        self.finished = False
+        self._persisted_at = 0.0
+
+    def add(self, event: Dict[str, Any]):
+        """
+        Applies one runner event to the counters.
+        """
+        name = event.get("event")
+        data = event.get("event_data") or {}
+        if name == "playbook_on_task_start":
+            self.tasks_started += 1
+            self.current_task = data.get("task")
+            self.current_task_hosts = set()
+            return
+        if name == "playbook_on_stats":
+            self.finished = True
+            return
+        outcome = OUTCOMES.get(name)
+        host = data.get("host")
+        if outcome is None or host is None:
+            return
+        res = data.get("res") if isinstance(data.get("res"), dict) else {}
+        if outcome == "ok" and res.get("changed"):
+            outcome = "changed"
+        if outcome == "failed" and data.get("ignore_errors"):
+            outcome = "ignored"
+        counters = self.hosts.setdefault(host, dict.fromkeys(HOST_OUTCOMES, 0))
+        counters[outcome] += 1
+        self.current_task_hosts.add(host)
+        if outcome in ("failed", "unreachable"):
+            self.removed_hosts.add(host)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns the `progress` field stored on the job. Its size does not
+        depend on the number of hosts or tasks.
+        """
+        total_tasks = max(self.estimated_tasks, self.tasks_started)
+        active_hosts = len(self.hosts) - len(self.removed_hosts)
+        if self.finished:
+            fraction = 1.0
+        elif total_tasks and self.tasks_started:
+            current = len(self.current_task_hosts - self.removed_hosts) / active_hosts if active_hosts > 0 else 0
+            # Never report completion before the run says so.
+            fraction = min(0.99, (self.tasks_started - 1 + min(1.0, current)) / total_tasks)
+        else:
+            fraction = 0.0
+        elapsed = time.monotonic() - self.started
+        eta = None
+        if 0 < fraction < 1:
+            eta = round(elapsed * (1 - fraction) / fraction, 1)
+
+        host_counts = dict.fromkeys(("total", "running", "ok", "changed", "failed", "unreachable"), 0)
+        host_counts["total"] = len(self.hosts)
+        for counters in self.hosts.values():
+            host_counts[host_status(counters, total_tasks, self.finished)] += 1
+        host_counts["done"] = host_counts["total"] - host_counts["running"]
+
+        return {
+            "progress": {
+                "percent": round(fraction * 100, 1),
+                "eta_seconds": eta,
+                "tasks_total": total_tasks or None,
+                "tasks_started": self.tasks_started,
+                "current_task": self.current_task,
+                "hosts": host_counts,
+                "percent_hosts_done": round(host_counts["done"] / len(self.hosts) * 100, 1) if self.hosts else 0.0,
+                "updated_at": datetime.utcnow(),
+            },
+        }
+
+    async def maybe_persist(self):
+        """
+        Stores a snapshot on the job, at most once every `PERSIST_INTERVAL` seconds.
+        """
+        now = time.monotonic()
+        if now - self._persisted_at < PERSIST_INTERVAL:
+            return
+        self._persisted_at = now
+        try:
+            await job_repository.update(self.task_id, self.snapshot())
+        except Exception as e:
+            logger.warning(f"Could not store the progress of job {self.task_id}: {e}")
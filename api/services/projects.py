@@ -1,16 +1,46 @@
 from bson import ObjectId
 from db.models import Project, ProjectCreate, ProjectUpdate, ProjectSync
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from db.database import db
 from datetime import datetime
-import subprocess
-import os
-import tempfile
-import shutil
+from core import tracing
+from core.config import settings
+from core.metrics import GIT_SYNC_SECONDS
+from services import git_sync, locks, playbook_index
+from services.process_identity import PROCESS_ID
+import asyncio
+import json
+import re
+import socket
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Syncs running in this process, shared by concurrent callers.
+_inflight_syncs: Dict[str, asyncio.Task] = {}
+
+sync_stats = {
+    "started": 0,
+    # Callers that joined a sync already running in this process.
+    "coalesced": 0,
+    # Callers that waited for a sync running in another process.
+    "coalesced_remote": 0,
+}
+
+# Fields that may be requested with the `fields` projection.
+PROJECT_FIELDS = {
+    "name", "description", "git_url", "branch", "status",
+    "created_at", "updated_at", "last_sync", "commit_sha",
+}
+
+async def ensure_indexes():
+    """
+    Creates the indexes used to filter and page through projects.
+    """
+    await db.projects.create_index("name")
+    await db.projects.create_index([("status", 1), ("_id", 1)])
+
 async def get_all_projects() -> List[Project]:
     """
     Retrieves all projects from the database.
@@ -20,6 +50,98 @@ async def get_all_projects() -> List[Project]:
         projects.append(Project(**project))
     return projects
 
+def _project_filter(after: Optional[str], status: Optional[str], name: Optional[str]) -> dict:
+    query = {}
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+    if status:
+        query["status"] = status
+    if name:
+        # An anchored prefix match can use the index on name.
+        query["name"] = {"$regex": f"^{re.escape(name)}"}
+    return query
+
+def _projection(fields: Optional[List[str]]) -> Optional[dict]:
+    if not fields:
+        return None
+    unknown = set(fields) - PROJECT_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return {field: 1 for field in fields}
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+async def list_projects(
+    limit: int,
+    after: Optional[str] = None,
+    status: Optional[str] = None,
+    name: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Retrieves one page of projects in `_id` order.
+
+    Args:
+        limit: The maximum number of projects to return.
+        after: The cursor returned with the previous page.
+        status: Only return projects with this status.
+        name: Only return projects whose name starts with this prefix.
+        fields: Only return these fields (plus `_id`).
+
+    Returns:
+        The project documents and the cursor of the next page, or None if
+        this is the last page.
+    """
+    cursor = db.projects.find(
+        _project_filter(after, status, name),
+        _projection(fields),
+    ).sort("_id", 1).limit(limit + 1)
+    documents = await cursor.to_list(length=limit + 1)
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = str(documents[-1]["_id"])
+    return documents, next_cursor
+
+def stream_projects(
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    status: Optional[str] = None,
+    name: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Returns an iterator of projects as newline-delimited JSON.
+
+    Documents are serialized while the cursor is iterated, so the full result
+    set is never held in memory. Invalid arguments raise immediately, before
+    anything is streamed.
+    """
+    cursor = db.projects.find(
+        _project_filter(after, status, name),
+        _projection(fields),
+        batch_size=500,
+    ).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    async def generate():
+        async for document in cursor:
+            yield (json.dumps(document, default=_json_default) + "\n").encode()
+
+    return generate()
+
+def encode_projects(documents: List[dict]) -> bytes:
+    """
+    Serializes raw project documents to a JSON array.
+    """
+    return json.dumps(documents, default=_json_default).encode()
+
 async def get_project_by_id(project_id: str) -> Optional[Project]:
     """
     Retrieves a project from the database by id.
@@ -38,6 +160,8 @@ async def create_project(project: ProjectCreate) -> Project:
     Creates a new project in the database.
     """
     project_dict = project.dict()
+    # BSON cannot encode pydantic's URL type.
+    project_dict["git_url"] = str(project.git_url)
     project_dict["status"] = "active"
     project_dict["created_at"] = datetime.utcnow()
     project_dict["updated_at"] = datetime.utcnow()
@@ -52,6 +176,8 @@ async def update_project(project_id: str, project_update: ProjectUpdate) -> Opti
     """
     try:
         update_data = {k: v for k, v in project_update.dict().items() if v is not None}
+        if "git_url" in update_data:
+            update_data["git_url"] = str(update_data["git_url"])
         if update_data:
             update_data["updated_at"] = datetime.utcnow()
             
@@ -75,7 +201,8 @@ async def delete_project(project_id: str) -> Optional[Project]:
         project = await db.projects.find_one_and_delete({"_id": ObjectId(project_id)})
         if project:
             # Clean up project directory if it exists
-            await _cleanup_project_directory(project_id)
+            await _cleanup_project_directory(project_id, project.get("git_url"))
+            await playbook_index.drop_index(project_id)
             return Project(**project)
         return None
     except Exception as e:
@@ -85,6 +212,74 @@ async def delete_project(project_id: str) -> Optional[Project]:
 async def sync_project(project_id: str) -> ProjectSync:
     """
     Syncs a project with its Git repository.
+
+    Concurrent calls for the same project share one sync: callers in this
+    process await the sync that is already running, and a lock record in
+    MongoDB keeps other processes on this host from touching the same
+    checkout at the same time.
+    """
+    task = _inflight_syncs.get(project_id)
+    if task is not None:
+        sync_stats["coalesced"] += 1
+    else:
+        task = asyncio.create_task(_sync_project_exclusive(project_id))
+        _inflight_syncs[project_id] = task
+        task.add_done_callback(lambda _: _inflight_syncs.pop(project_id, None))
+    # Shielded so a caller that disconnects does not cancel the shared sync.
+    return await asyncio.shield(task)
+
+def _sync_lock_name(project_id: str) -> str:
+    # Checkouts live on the local disk, so the lock is scoped to this host.
+    return f"project-sync:{socket.gethostname()}:{project_id}"
+
+async def _sync_project_exclusive(project_id: str) -> ProjectSync:
+    """
+    Runs a sync while holding the project's lock record, or waits for the
+    process that holds it and reports the project state it left behind.
+    """
+    lock_name = _sync_lock_name(project_id)
+    lock_ttl = settings.GIT_TIMEOUT * 3
+
+    if not await locks.acquire(lock_name, PROCESS_ID, lock_ttl):
+        sync_stats["coalesced_remote"] += 1
+        # The holder renews its lease while it syncs, and it expires if it dies.
+        while not await locks.wait_released(lock_name, timeout=lock_ttl):
+            pass
+        project = await get_project_by_id(project_id)
+        if not project:
+            return ProjectSync(project_id=project_id, status="error", message="Project not found")
+        return ProjectSync(
+            project_id=project_id,
+            status="error" if project.status == "error" else "success",
+            message="Sync was performed by another worker",
+            commit_sha=project.commit_sha
+        )
+
+    heartbeat = asyncio.create_task(_renew_sync_lock(lock_name, lock_ttl))
+    try:
+        sync_stats["started"] += 1
+        return await _run_sync(project_id)
+    finally:
+        heartbeat.cancel()
+        await locks.release(lock_name, PROCESS_ID)
+
+async def _renew_sync_lock(lock_name: str, lock_ttl: int):
+    """
+    Extends the sync lock every third of its TTL, so a sync that runs longer
+    than the TTL is not joined by a second one in the same checkout.
+    """
+    while True:
+        await asyncio.sleep(lock_ttl / 3)
+        try:
+            if not await locks.renew(lock_name, PROCESS_ID, lock_ttl):
+                logger.error(f"Sync lock {lock_name} expired before it could be renewed")
+                return
+        except Exception as e:
+            logger.warning(f"Could not renew sync lock {lock_name}: {e}")
+
+async def _run_sync(project_id: str) -> ProjectSync:
+    """
+    Performs a project sync and records its outcome on the project.
     """
     try:
         # Update project status to syncing
@@ -111,6 +306,15 @@ async def sync_project(project_id: str) -> ProjectSync:
             "updated_at": datetime.utcnow(),
             "last_sync": datetime.utcnow()
         }
+        if sync_result["success"]:
+            update_data["commit_sha"] = sync_result["commit_sha"]
+            # The index is keyed by commit, so it is only rebuilt when the commit changes.
+            if await playbook_index.get_index(project_id, sync_result["commit_sha"]) is None:
+                await playbook_index.rebuild_index(
+                    project_id,
+                    sync_result["commit_sha"],
+                    git_sync.project_dir(project_id)
+                )
         
         await db.projects.update_one(
             {"_id": ObjectId(project_id)},
@@ -120,7 +324,8 @@ async def sync_project(project_id: str) -> ProjectSync:
         return ProjectSync(
             project_id=project_id,
             status="success" if sync_result["success"] else "error",
-            message=sync_result["message"]
+            message=sync_result["message"],
+            commit_sha=sync_result.get("commit_sha")
         )
         
     except Exception as e:
@@ -141,85 +346,70 @@ async def _sync_git_repository(project: Project) -> dict:
     """
     Performs the actual Git repository synchronization.
     """
-    project_dir = f"/tmp/ansible_projects/{project.id}"
-    
+    start = time.perf_counter()
+    outcome = "error"
     try:
-        # Create project directory if it doesn't exist
-        os.makedirs(project_dir, exist_ok=True)
-        
-        # Check if it's already a git repository
-        if os.path.exists(os.path.join(project_dir, ".git")):
-            # Pull latest changes
-            result = subprocess.run(
-                ["git", "pull", "origin", project.branch],
-                cwd=project_dir,
-                capture_output=True,
-                text=True,
-                timeout=60
+        with tracing.span("git.sync", project_id=str(project.id)):
+            result = await git_sync.sync_repository(
+                str(project.id),
+                str(project.git_url),
+                project.branch,
+                known_commit=project.commit_sha
             )
-            
-            if result.returncode == 0:
-                return {"success": True, "message": "Repository updated successfully"}
-            else:
-                return {"success": False, "message": f"Git pull failed: {result.stderr}"}
-        else:
-            # Clone the repository
-            result = subprocess.run(
-                ["git", "clone", "-b", project.branch, str(project.git_url), project_dir],
-                capture_output=True,
-                text=True,
-                timeout=120
-            )
-            
-            if result.returncode == 0:
-                return {"success": True, "message": "Repository cloned successfully"}
-            else:
-                return {"success": False, "message": f"Git clone failed: {result.stderr}"}
-                
-    except subprocess.TimeoutExpired:
-        return {"success": False, "message": "Git operation timed out"}
+        outcome = "changed" if result.changed else "unchanged"
+        return {"success": True, "message": result.message, "commit_sha": result.commit_sha}
+    except git_sync.GitError as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         return {"success": False, "message": f"Git operation failed: {str(e)}"}
+    finally:
+        GIT_SYNC_SECONDS.labels(outcome).observe(time.perf_counter() - start)
 
-async def _cleanup_project_directory(project_id: str):
+async def _cleanup_project_directory(project_id: str, git_url: Optional[str] = None):
     """
     Cleans up the project directory when a project is deleted.
     """
-    project_dir = f"/tmp/ansible_projects/{project_id}"
     try:
-        if os.path.exists(project_dir):
-            shutil.rmtree(project_dir)
-            logger.info(f"Cleaned up project directory: {project_dir}")
+        await git_sync.remove_worktree(project_id, str(git_url) if git_url else None)
     except Exception as e:
-        logger.error(f"Error cleaning up project directory {project_dir}: {e}")
+        logger.error(f"Error cleaning up project directory {git_sync.project_dir(project_id)}: {e}")
 
-async def get_project_playbooks(project_id: str) -> List[str]:
+async def get_project_playbook_index(project_id: str) -> List[dict]:
     """
-    Gets the list of playbooks available in a project.
+    Gets the indexed playbooks of a project with their metadata.
+
+    The index of the last synced commit is served from memory or MongoDB. The
+    project is only synced when it has never been synced, or when the index
+    of its commit is missing.
     """
     try:
         project = await get_project_by_id(project_id)
         if not project:
             return []
-        
-        project_dir = f"/tmp/ansible_projects/{project_id}"
-        if not os.path.exists(project_dir):
-            # Try to sync the project first
-            sync_result = await sync_project(project_id)
-            if sync_result.status == "error":
-                return []
-        
-        # Find all .yml and .yaml files in the project directory
-        playbooks = []
-        for root, dirs, files in os.walk(project_dir):
-            for file in files:
-                if file.endswith(('.yml', '.yaml')):
-                    # Get relative path from project directory
-                    rel_path = os.path.relpath(os.path.join(root, file), project_dir)
-                    playbooks.append(rel_path)
-        
-        return sorted(playbooks)
-        
+
+        if project.commit_sha:
+            index = await playbook_index.get_index(project_id, project.commit_sha)
+            if index is not None:
+                return index
+
+        sync_result = await sync_project(project_id)
+        if sync_result.status == "error" or not sync_result.commit_sha:
+            return []
+        index = await playbook_index.get_index(project_id, sync_result.commit_sha)
+        if index is None:
+            index = await playbook_index.rebuild_index(
+                project_id,
+                sync_result.commit_sha,
+                git_sync.project_dir(project_id)
+            )
+        return index
+
     except Exception as e:
         logger.error(f"Error getting playbooks for project {project_id}: {e}")
-        return []
\ No newline at end of file
+        return []
+
+async def get_project_playbooks(project_id: str) -> List[str]:
+    """
+    Gets the list of playbooks available in a project.
+    """
+    return [playbook["path"] for playbook in await get_project_playbook_index(project_id)]
@@ -0,0 +1,47 @@
+"""
+A pre-warmed ansible-runner launcher, started ahead of time by
+`services.runner_pool`.
+
+The launcher imports ansible-runner, prints `{"launcher": "ready"}` and waits
+for one JSON line `{"args": [...], "cwd": "..."}` on stdin. It then runs
+ansible-runner's command line in-process with those arguments and exits with
+its return code, so its output is exactly that of `ansible-runner <args>`.
+
+The script runs under the interpreter ansible-runner is installed in, which
+may be inside WSL, so it only uses the standard library and ansible-runner.
+"""
+import json
+import os
+import sys
+
+# The script's directory holds the API's service modules; keep them from
+# shadowing the packages ansible-runner imports.
+if sys.path and os.path.abspath(sys.path[0] or ".") == os.path.dirname(os.path.abspath(__file__)):
+    sys.path.pop(0)
+
+def _send(message: dict):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+def main() -> int:
+    try:
+        from ansible_runner.__main__ import main as runner_main
+    except ImportError as e:
+        _send({"launcher": "error", "error": f"ansible-runner cannot be imported: {e}"})
+        return 1
+    _send({"launcher": "ready"})
+
+    line = sys.stdin.readline()
+    if not line:
+        # The pool shut down before handing over a run.
+        return 0
+    spec = json.loads(line)
+    os.chdir(spec["cwd"])
+    sys.argv = ["ansible-runner", *spec["args"]]
+    try:
+        return runner_main(spec["args"]) or 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
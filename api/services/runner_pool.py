@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Callable, Deque, List, Optional, Set
+
+from services import job_limits
+
+logger = logging.getLogger(__name__)
+
+"""
+This module keeps ansible-runner launchers started ahead of time, so a job
+does not pay for interpreter start-up and ansible-runner's imports (and the
+`wsl` wrapper, where used) before its first event.
+
+Each launcher (`services/runner_launcher.py`) serves exactly one run and is
+replaced in the background as soon as it is handed out, so runs never share
+a process and no state leaks from one run to the next.
+"""
+
+# Seconds to wait for a launcher still importing ansible-runner.
+READY_TIMEOUT = 30.0
+# ansible-runner events can be far larger than asyncio's 64 KiB line limit.
+STREAM_LIMIT = 16 * 1024 * 1024
+
+def _kill(process: asyncio.subprocess.Process):
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+
+class RunnerPool:
+    """
+    A pool of idle, single-use ansible-runner launchers.
+
+    If a launcher cannot be started or reports that ansible-runner cannot be
+    imported, the pool disables itself and every run falls back to starting
+    ansible-runner directly.
+    """
+    def __init__(self, command: Callable[[], List[str]], size: int):
+        """
+        Args:
+            command: Returns the command line starting one launcher.
+            size: The number of idle launchers to keep; 0 disables the pool.
+        """
+        self.command = command
+        self.size = size
+        self.disabled: Optional[str] = None
+        self._idle: Deque[asyncio.subprocess.Process] = deque()
+        self._spawning = 0
+        self._started = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self._started and self.size > 0 and self.disabled is None
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def start(self):
+        """
+        Starts filling the pool. Must be called from the event loop.
+        """
+        self._started = True
+        self._fill()
+
+    async def stop(self):
+        """
+        Stops the idle launchers. Launchers already running a job are not touched.
+        """
+        self._started = False
+        for task in list(self._tasks):
+            task.cancel()
+        while self._idle:
+            process = self._idle.popleft()
+            _kill(process)
+            await process.wait()
+
+    def _fill(self):
+        while self.enabled and len(self._idle) + self._spawning < self.size:
+            self._spawning += 1
+            task = asyncio.create_task(self._spawn())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _spawn(self):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.command(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=STREAM_LIMIT,
+                start_new_session=True,
+                preexec_fn=job_limits.preexec(),
+            )
+        except OSError as e:
+            self._disable(f"Could not start a runner launcher: {e}")
+            return
+        finally:
+            self._spawning -= 1
+        if self.enabled:
+            self._idle.append(process)
+        else:
+            _kill(process)
+
+    def _disable(self, reason: str):
+        if self.disabled is None:
+            logger.warning(f"{reason}; starting ansible-runner without pre-warming")
+        self.disabled = reason
+        while self._idle:
+            _kill(self._idle.popleft())
+
+    async def _ready(self, process: asyncio.subprocess.Process) -> bool:
+        """
+        Consumes the launcher's handshake line.
+
+        Returns:
+            Whether the launcher is ready to take a run.
+        """
+        try:
+            line = await asyncio.wait_for(process.stdout.readline(), READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            # A slow launcher is not a broken one; only this one is dropped.
+            _kill(process)
+            return False
+        try:
+            message = json.loads(line)
+        except ValueError:
+            message = None
+        if isinstance(message, dict) and message.get("launcher") == "ready":
+            return True
+        if isinstance(message, dict) and message.get("error"):
+            reason = message["error"]
+        elif not line:
+            reason = "The runner launcher exited before it was ready"
+        else:
+            reason = f"Unexpected output from the runner launcher: {line[:200]!r}"
+        _kill(process)
+        self._disable(reason)
+        return False
+
+    async def launch(
+        self, args: List[str], cwd: str, cgroup: Optional[str] = None
+    ) -> Optional[asyncio.subprocess.Process]:
+        """
+        Hands a run to an idle launcher.
+
+        Args:
+            args: The ansible-runner arguments, without the executable.
+            cwd: The working directory of the run, as seen by the launcher.
+            cgroup: The job's cgroup, joined before the run starts.
+
+        Returns:
+            The launcher process, whose stdout and stderr are those of
+            ansible-runner, or None if no launcher is available and the
+            caller has to start ansible-runner itself.
+        """
+        while self.enabled and self._idle:
+            process = self._idle.popleft()
+            self._fill()
+            if not await self._ready(process):
+                continue
+            try:
+                if cgroup:
+                    job_limits.join_cgroup(cgroup, process.pid)
+                process.stdin.write(json.dumps({"args": args, "cwd": cwd}).encode() + b"\n")
+                await process.stdin.drain()
+                process.stdin.close()
+            except OSError:
+                _kill(process)
+                continue
+            return process
+        return None
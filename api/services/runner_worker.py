@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Set
+
+from core.config import settings
+from services.broker import Broker
+from services.dispatch import run_job
+from services.jobs import job_repository
+from services.scheduler import JobScheduler
+
+logger = logging.getLogger(__name__)
+
+"""
+This module provides the runner worker that executes jobs claimed from the
+job broker.
+"""
+
+class RunnerWorker:
+    """
+    Claims jobs from a broker while its scheduler has free slots.
+
+    Every job the worker holds, queued locally or running, has its lease
+    extended on each heartbeat. A job is acknowledged once it has finished;
+    if the worker dies first, the lease runs out and another worker gets it.
+    """
+    def __init__(self, broker: Broker, scheduler: JobScheduler, worker_id: str):
+        self.broker = broker
+        self.scheduler = scheduler
+        self.worker_id = worker_id
+        self.held: Set[str] = set()
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """
+        Runs the claim loop until `stop` is called.
+        """
+        logger.info(f"Worker {self.worker_id} started")
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            while not self._stopping.is_set():
+                job = None
+                if self.scheduler.has_capacity():
+                    job = await self.broker.claim(self.worker_id, settings.JOB_LEASE_SECONDS)
+                if job is None:
+                    await self._sleep(settings.WORKER_POLL_INTERVAL)
+                    continue
+                await self._accept(job)
+        finally:
+            heartbeat.cancel()
+            await self.scheduler.shutdown()
+            logger.info(f"Worker {self.worker_id} stopped")
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _accept(self, job: Dict[str, Any]):
+        task_id = job["task_id"]
+        if job["attempts"] > settings.JOB_MAX_ATTEMPTS:
+            await job_repository.update(task_id, {
+                "status": "error",
+                "error": f"Job was abandoned by its worker {settings.JOB_MAX_ATTEMPTS} times",
+            })
+            await self.broker.ack(self.worker_id, task_id)
+            return
+
+        async def run():
+            cancelled = False
+            try:
+                await run_job(**job)
+            except asyncio.CancelledError:
+                # Shutting down: leave the job unacknowledged so it is redelivered.
+                cancelled = True
+                raise
+            finally:
+                self.held.discard(task_id)
+                if not cancelled:
+                    await self.broker.ack(self.worker_id, task_id)
+
+        self.held.add(task_id)
+        await job_repository.update(task_id, {"worker_id": self.worker_id, "attempts": job["attempts"]})
+        self.scheduler.submit(
+            task_id,
+            run,
+            playbook=job["playbook"],
+            project=job.get("project_id"),
+            priority=job["priority"],
+            waited=max(0.0, (datetime.utcnow() - job["enqueued_at"]).total_seconds()),
+        )
+
+    async def _heartbeat_loop(self):
+        interval = settings.JOB_LEASE_SECONDS / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.broker.heartbeat(self.worker_id, list(self.held), settings.JOB_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} heartbeat failed: {e}")
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,254 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque, defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from core.config import settings
+from core.metrics import JOB_QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+"""
+This module provides a bounded job scheduler that sits between the task
+router and the playbook execution engine.
+"""
+
+PRIORITY_LEVELS = {"high": 0, "normal": 1, "low": 2}
+
+# Project key used for playbooks from the local ansible/ directory.
+LOCAL_PROJECT = "local"
+
+WAIT_SAMPLE_SIZE = 1000
+
+@dataclass
+class ScheduledJob:
+    """
+    A job waiting for, or holding, a worker slot.
+    """
+    task_id: str
+    playbook: str
+    project: str
+    priority: str
+    run: Callable[[], Awaitable]
+    seq: int
+    # Seconds the job waited before it reached this scheduler.
+    waited: float = 0.0
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+
+class JobScheduler:
+    """
+    Runs jobs with a global worker limit and per-project/per-playbook caps.
+
+    Jobs are kept in one FIFO queue per priority level. Whenever a slot frees
+    up, the queues are scanned from the highest priority down and the oldest
+    job whose project and playbook are below their caps is started, so a
+    saturated project never holds back jobs of other projects.
+    """
+    def __init__(self, max_workers: int, max_per_project: int = 0, max_per_playbook: int = 0):
+        self.max_workers = max_workers
+        self.max_per_project = max_per_project
+        self.max_per_playbook = max_per_playbook
+        self._queues: Dict[str, Deque[ScheduledJob]] = {level: deque() for level in PRIORITY_LEVELS}
+        self._running: Dict[str, ScheduledJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._running_per_project: Dict[str, int] = defaultdict(int)
+        self._running_per_playbook: Dict[str, int] = defaultdict(int)
+        self._seq = itertools.count()
+        self._wait_samples: Deque[float] = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self._submitted = 0
+        self._completed = 0
+
+    def submit(
+        self,
+        task_id: str,
+        run: Callable[[], Awaitable],
+        playbook: str,
+        project: Optional[str] = None,
+        priority: str = "normal",
+        waited: float = 0.0,
+    ) -> int:
+        """
+        Queues a job and starts it right away if a slot is free.
+
+        Args:
+            task_id: The ID of the task the job belongs to.
+            run: A zero-argument coroutine function that executes the job.
+            playbook: The playbook name, used for the per-playbook cap.
+            project: The project ID, used for the per-project cap.
+            priority: One of "high", "normal" or "low".
+            waited: Seconds the job already waited elsewhere, e.g. in the
+                job broker, counted into its queue wait.
+
+        Returns:
+            The number of jobs queued ahead of this one, 0 if it started.
+        """
+        if priority not in PRIORITY_LEVELS:
+            raise ValueError(f"Unknown priority: {priority}")
+        job = ScheduledJob(
+            task_id=task_id,
+            playbook=playbook,
+            project=project or LOCAL_PROJECT,
+            priority=priority,
+            run=run,
+            seq=next(self._seq),
+            waited=waited,
+        )
+        self._queues[priority].append(job)
+        self._submitted += 1
+        self._dispatch()
+        if task_id in self._running:
+            return 0
+        return self.queue_position(task_id)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def task_ids(self) -> List[str]:
+        """
+        Returns the IDs of the running and queued jobs.
+        """
+        return [*self._running, *(job.task_id for level in PRIORITY_LEVELS for job in self._queues[level])]
+
+    def has_capacity(self) -> bool:
+        """
+        Returns True if a newly submitted job would not have to wait for a global slot.
+        """
+        return self.running + self.queued < self.max_workers
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """
+        Returns how many queued jobs are ahead of a task, or None if it is not queued.
+        """
+        position = 0
+        for level in PRIORITY_LEVELS:
+            for job in self._queues[level]:
+                if job.task_id == task_id:
+                    return position
+                position += 1
+        return None
+
+    def remove(self, task_id: str) -> bool:
+        """
+        Drops a job that is still waiting for a slot.
+
+        Returns:
+            True if the job was queued here.
+        """
+        for level in PRIORITY_LEVELS:
+            for job in self._queues[level]:
+                if job.task_id == task_id:
+                    self._queues[level].remove(job)
+                    return True
+        return False
+
+    def _eligible(self, job: ScheduledJob) -> bool:
+        if self.max_per_project and self._running_per_project[job.project] >= self.max_per_project:
+            return False
+        if self.max_per_playbook and self._running_per_playbook[job.playbook] >= self.max_per_playbook:
+            return False
+        return True
+
+    def _next_job(self) -> Optional[ScheduledJob]:
+        for level in PRIORITY_LEVELS:
+            queue = self._queues[level]
+            for job in queue:
+                if self._eligible(job):
+                    queue.remove(job)
+                    return job
+        return None
+
+    def _dispatch(self):
+        while len(self._running) < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                return
+            self._start(job)
+
+    def _start(self, job: ScheduledJob):
+        job.started_at = time.monotonic()
+        wait = job.waited + job.started_at - job.enqueued_at
+        self._wait_samples.append(wait)
+        JOB_QUEUE_WAIT_SECONDS.labels(job.priority).observe(wait)
+        self._running[job.task_id] = job
+        self._running_per_project[job.project] += 1
+        self._running_per_playbook[job.playbook] += 1
+        self._tasks[job.task_id] = asyncio.create_task(self._execute(job))
+
+    async def _execute(self, job: ScheduledJob):
+        try:
+            await job.run()
+        except Exception:
+            logger.exception(f"Job {job.task_id} ({job.playbook}) failed")
+        finally:
+            self._release(job)
+
+    def _release(self, job: ScheduledJob):
+        self._running.pop(job.task_id, None)
+        self._tasks.pop(job.task_id, None)
+        self._running_per_project[job.project] -= 1
+        if not self._running_per_project[job.project]:
+            del self._running_per_project[job.project]
+        self._running_per_playbook[job.playbook] -= 1
+        if not self._running_per_playbook[job.playbook]:
+            del self._running_per_playbook[job.playbook]
+        self._completed += 1
+        self._dispatch()
+
+    def stats(self) -> dict:
+        """
+        Returns queue depth, slot usage and wait-time statistics.
+        """
+        now = time.monotonic()
+        queued = [job for level in PRIORITY_LEVELS for job in self._queues[level]]
+        waits = sorted(self._wait_samples)
+
+        def percentile(pct: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(pct * len(waits)))], 3)
+
+        return {
+            "max_workers": self.max_workers,
+            "max_per_project": self.max_per_project,
+            "max_per_playbook": self.max_per_playbook,
+            "running": len(self._running),
+            "queued": len(queued),
+            "queued_by_priority": {level: len(self._queues[level]) for level in PRIORITY_LEVELS},
+            "running_by_project": dict(self._running_per_project),
+            "running_by_playbook": dict(self._running_per_playbook),
+            "oldest_queued_seconds": round(max((now - job.enqueued_at for job in queued), default=0.0), 3),
+            "wait_seconds": {
+                "samples": len(waits),
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(waits[-1], 3) if waits else None,
+            },
+            "submitted_total": self._submitted,
+            "completed_total": self._completed,
+        }
+
+    async def shutdown(self):
+        """
+        Drops queued jobs and cancels the running ones.
+        """
+        for level in PRIORITY_LEVELS:
+            self._queues[level].clear()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+scheduler = JobScheduler(
+    max_workers=settings.SCHEDULER_MAX_WORKERS,
+    max_per_project=settings.SCHEDULER_MAX_PER_PROJECT,
+    max_per_playbook=settings.SCHEDULER_MAX_PER_PLAYBOOK,
+)
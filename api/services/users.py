@@ -1,7 +1,8 @@
-from db.models import User, UserCreate, UserInDB
-from core.password import get_password_hash, verify_password
+from db.models import User, UserCreate, UserInDB, UserUpdate
+from core.password import get_password_hash_async, verify_password_async
 from db.database import db
 from core.token import decode_access_token
+from core.auth_cache import auth_cache, token_version_cache
 
 async def get_user_by_email(email: str) -> UserInDB | None:
     user = await db.users.find_one({"email": email})
@@ -9,28 +10,103 @@ async def get_user_by_email(email: str) -> UserInDB | None:
         return UserInDB(**user)
     return None
 
-async def get_user_by_token(token: str) -> User | None:
+async def get_token_version(email: str) -> int | None:
+    """
+    Returns the current token version of a user, or None if the user does not exist.
+
+    Versions are cached in memory for a short time, so revocation checks
+    rarely reach the database.
+    """
+    hit, version = token_version_cache.get(email)
+    if hit:
+        return version
+    db_user = await db.users.find_one({"email": email}, {"token_version": 1})
+    version = db_user.get("token_version", 0) if db_user else None
+    token_version_cache.put(email, version)
+    return version
+
+async def verify_token_claims(token: str) -> dict | None:
+    """
+    Returns the claims of a valid access token whose version is still current.
+    """
     decoded_token = decode_access_token(token)
+    if not decoded_token:
+        return None
+    if decoded_token.get("ver", 0) != await get_token_version(decoded_token["sub"]):
+        return None
+    return decoded_token
+
+async def get_user_by_token(token: str) -> User | None:
+    """
+    Returns the user a valid access token belongs to.
+
+    Verified tokens are cached, so repeated calls with the same token skip
+    decoding and the database lookup until the cache entry expires.
+    """
+    user = auth_cache.get(token)
+    if user is not None:
+        return user
+    decoded_token = await verify_token_claims(token)
     if decoded_token:
-        return await db.users.find_one({"email": decoded_token["sub"]})
+        db_user = await db.users.find_one({"email": decoded_token["sub"]})
+        if db_user:
+            user = User(**db_user)
+            auth_cache.put(token, user.email, user, decoded_token["exp"])
+            return user
     return None
 
 async def create_user(user: UserCreate) -> User:
     """
     Creates a new user in the database.
     """
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = UserInDB(email=user.email, hashed_password=hashed_password)
     await db.users.insert_one(db_user.dict(by_alias=True))
     return db_user
 
+async def update_user(email: str, user_update: UserUpdate) -> User | None:
+    """
+    Updates a user's email, roles or password.
+
+    The user's token version is bumped, which revokes every token issued so
+    far. Cached tokens are invalidated, so the change takes effect on the
+    next request in this process. An update without fields leaves the user
+    and their tokens as they are.
+
+    Returns:
+        The updated user, or None if the user does not exist.
+    """
+    update_data = {k: v for k, v in user_update.dict().items() if v is not None}
+    password = update_data.pop("password", None)
+    if password:
+        update_data["hashed_password"] = await get_password_hash_async(password)
+    if not update_data:
+        user = await get_user_by_email(email)
+        return User(**user.dict(by_alias=True)) if user else None
+
+    result = await db.users.find_one_and_update(
+        {"email": email},
+        {"$set": update_data, "$inc": {"token_version": 1}},
+        return_document=True
+    )
+    auth_cache.invalidate_user(email)
+    token_version_cache.invalidate(email)
+    if update_data.get("email"):
+        token_version_cache.invalidate(update_data["email"])
+    if result:
+        return User(**result)
+    return None
+
 async def authenticate_user(email: str, password: str):
     """
     Authenticates a user by email and password.
+
+    The bcrypt check runs on the password hashing pool, so it does not
+    block the event loop.
     """
     user = await get_user_by_email(email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
-    return user
\ No newline at end of file
+    return user
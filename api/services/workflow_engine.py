@@ -0,0 +1,460 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from core.config import settings
+from db.database import db
+from db.models import Workflow
+from services import inventories as inventory_service
+from services.dispatch import cancel_job, is_lost, mark_lost, submit_job
+from services.jobs import TERMINAL_STATUSES, job_repository
+from services.process_identity import PROCESS_ID
+
+logger = logging.getLogger(__name__)
+
+"""
+This module runs workflows: it starts each node's playbook as a job once the
+nodes before it have finished, and records the state of every run in the
+`workflow_runs` collection so that a run outlives the process driving it.
+
+Variables a playbook publishes with `set_stats` (ansible-runner's artifact
+data) are passed on to the nodes after it as extra variables, together with
+everything the nodes before it passed on.
+"""
+
+ACTIVE_STATUSES = ("queued", "running")
+FAILED_STATUSES = ("error", "canceled")
+# Node statuses after which the node's outgoing edges are decided.
+RESOLVED_STATUSES = TERMINAL_STATUSES + ("skipped",)
+
+class _LeaseLost(Exception):
+    """
+    Raised when another process took over a run this process was driving.
+    """
+
+def _fires(edge: Dict[str, Any], status: str) -> bool:
+    """
+    Returns whether an edge is followed after its source ended with `status`.
+    """
+    if status == "skipped":
+        return False
+    if edge["on"] == "always":
+        return True
+    return (status == "success") == (edge["on"] == "success")
+
+def _artifacts(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the `set_stats` data of a finished job, which ansible-runner
+    reports in its final `playbook_on_stats` event.
+    """
+    event_data = (job.get("data") or {}).get("event_data") or {}
+    return event_data.get("artifact_data") or {}
+
+class _Execution:
+    """
+    Drives one run: launches the nodes whose parents have finished, follows
+    their jobs and records every change, until no node is left to run.
+    """
+    def __init__(self, engine: "WorkflowEngine", run: Dict[str, Any]):
+        self.engine = engine
+        self.run = run
+        self.nodes = {node["id"]: node for node in run["definition"]["nodes"]}
+        self.incoming: Dict[str, List[Dict[str, Any]]] = {node_id: [] for node_id in self.nodes}
+        self.outgoing: Dict[str, List[Dict[str, Any]]] = {node_id: [] for node_id in self.nodes}
+        for edge in run["definition"]["edges"]:
+            self.incoming[edge["target"]].append(edge)
+            self.outgoing[edge["source"]].append(edge)
+        self.state: Dict[str, Dict[str, Any]] = run["nodes"]
+        self.canceled: Set[str] = set()
+
+    async def execute(self):
+        followers: Dict[asyncio.Task, str] = {}
+        try:
+            for node_id, node in self.state.items():
+                if node["status"] in ACTIVE_STATUSES:
+                    followers[asyncio.create_task(self._follow(node_id))] = node_id
+            while True:
+                canceling = await self._cancel_requested()
+                if canceling:
+                    await self._cancel_jobs()
+                for node_id in await self._decide(canceling):
+                    followers[asyncio.create_task(self._follow(node_id))] = node_id
+                if not followers:
+                    break
+                done, _ = await asyncio.wait(followers, return_when=asyncio.FIRST_COMPLETED)
+                for follower in done:
+                    await self._finish(followers.pop(follower), follower.result())
+            await self._complete(canceling)
+        finally:
+            # Jobs keep running; whoever drives the run next follows them.
+            for follower in followers:
+                follower.cancel()
+
+    async def _decide(self, canceling: bool) -> List[str]:
+        """
+        Launches or skips every pending node whose parents are all resolved.
+        Skipping a node can resolve the parents of others, so this repeats
+        until nothing changes.
+
+        Returns:
+            The IDs of the launched nodes.
+        """
+        launched = []
+        changed = True
+        while changed:
+            changed = False
+            for node_id, node in self.nodes.items():
+                if self.state[node_id]["status"] != "pending":
+                    continue
+                parents = self.incoming[node_id]
+                if any(self.state[edge["source"]]["status"] not in RESOLVED_STATUSES for edge in parents):
+                    continue
+                fired = self._fired(node_id)
+                if node["converge"] == "all":
+                    ready = len(fired) == len(parents)
+                else:
+                    ready = not parents or bool(fired)
+                if ready and not canceling:
+                    await self._save_node(node_id, {
+                        "status": "queued",
+                        "task_id": str(uuid.uuid4()),
+                        "started_at": datetime.utcnow(),
+                    })
+                    launched.append(node_id)
+                else:
+                    await self._save_node(node_id, {"status": "skipped"})
+                changed = True
+        return launched
+
+    def _fired(self, node_id: str) -> List[Dict[str, Any]]:
+        return [edge for edge in self.incoming[node_id] if _fires(edge, self.state[edge["source"]]["status"])]
+
+    def _inherited(self, node_id: str) -> Dict[str, Any]:
+        """
+        Returns the artifacts passed on to a node by the parents that started it.
+        """
+        inherited: Dict[str, Any] = {}
+        for edge in self._fired(node_id):
+            inherited.update(self.state[edge["source"]].get("artifacts") or {})
+        return inherited
+
+    async def _submit(self, node_id: str) -> Optional[str]:
+        """
+        Queues a node's job under the task ID recorded for it.
+
+        Returns:
+            An error message if the job could not be queued, otherwise None.
+        """
+        node = self.nodes[node_id]
+        inventory = node["inventory"]
+        if node["inventory_id"] is not None:
+            stored = await inventory_service.get_inventory_by_id(node["inventory_id"])
+            if not stored:
+                return f"Inventory {node['inventory_id']} not found"
+            inventory = stored.content
+        # The run's own variables win over artifacts, which win over the node's defaults.
+        extra_vars = {
+            **(node["extra_vars"] or {}),
+            **self._inherited(node_id),
+            **(self.run["extra_vars"] or {}),
+            "workflow_run_id": self.run["_id"],
+            "workflow_node_id": node_id,
+        }
+        await submit_job(
+            self.state[node_id]["task_id"],
+            node["playbook"],
+            inventory=inventory,
+            extra_vars=extra_vars,
+            project_id=node["project_id"],
+            priority=node["priority"],
+            limit=node["limit"],
+        )
+        return None
+
+    async def _follow(self, node_id: str) -> Dict[str, Any]:
+        """
+        Submits a node's job unless that already happened, and waits until
+        it finishes, recording when it starts running.
+
+        A job held by a process that died, e.g. the one that drove the run
+        before, is marked as failed. A job whose process is still alive is
+        followed to its end, even if that process lost the run.
+
+        Returns:
+            The finished job.
+        """
+        task_id = self.state[node_id]["task_id"]
+        if await job_repository.get(task_id, ("status",)) is None:
+            # Just launched, or recorded by a process that stopped before submitting it.
+            error = await self._submit(node_id)
+            if error:
+                return {"status": "error", "error": error}
+
+        version, status = 0, self.state[node_id]["status"]
+        while True:
+            job = await job_repository.wait_for_change(
+                task_id, version, settings.JOB_LEASE_SECONDS, ("status", "process_id")
+            )
+            if job is None:
+                return {"status": "error", "error": f"Job {task_id} no longer exists"}
+            if job["status"] in TERMINAL_STATUSES:
+                return await job_repository.get(task_id) or job
+            # Only a job that stopped changing needs a look at its process.
+            if job["version"] == version or not version:
+                if await is_lost(job):
+                    await mark_lost(task_id, job["process_id"])
+                    continue
+            version = job["version"]
+            if job["status"] != status:
+                status = job["status"]
+                await self._save_node(node_id, {"status": status})
+
+    async def _finish(self, node_id: str, job: Dict[str, Any]):
+        fields = {
+            "status": job["status"],
+            "finished_at": datetime.utcnow(),
+            "artifacts": {**self._inherited(node_id), **_artifacts(job)},
+        }
+        if job.get("error"):
+            fields["error"] = job["error"]
+        await self._save_node(node_id, fields)
+
+    async def _complete(self, canceling: bool):
+        """
+        Records the outcome of the run: "canceled" if it was canceled,
+        "error" if a node failed without an edge handling its failure, and
+        "success" otherwise.
+        """
+        if canceling:
+            status = "canceled"
+        elif any(
+            self.state[node_id]["status"] in FAILED_STATUSES
+            and not any(edge["on"] != "success" for edge in self.outgoing[node_id])
+            for node_id in self.nodes
+        ):
+            status = "error"
+        else:
+            status = "success"
+        now = datetime.utcnow()
+        await self._save({
+            "status": status,
+            "finished_at": now,
+            "expires_at": now + timedelta(seconds=settings.JOB_RESULT_TTL_SECONDS),
+        })
+        logger.info(f"Workflow run {self.run['_id']} finished with status {status}")
+
+    async def _cancel_requested(self) -> bool:
+        run = await self.engine.collection.find_one({"_id": self.run["_id"]}, {"cancel_requested": 1})
+        return bool(run and run.get("cancel_requested"))
+
+    async def _cancel_jobs(self):
+        for node_id, node in self.state.items():
+            if node["status"] in ACTIVE_STATUSES and node_id not in self.canceled:
+                self.canceled.add(node_id)
+                await cancel_job(node["task_id"])
+
+    async def _save_node(self, node_id: str, fields: Dict[str, Any]):
+        await self._save({f"nodes.{node_id}.{key}": value for key, value in fields.items()})
+        self.state[node_id].update(fields)
+
+    async def _save(self, fields: Dict[str, Any]):
+        result = await self.engine.collection.update_one(
+            {"_id": self.run["_id"], "owner": self.engine.owner_id},
+            {"$set": {**fields, "updated_at": datetime.utcnow()}},
+        )
+        if result.matched_count == 0:
+            raise _LeaseLost()
+
+class WorkflowEngine:
+    """
+    Runs workflows, each as a task of this process that launches nodes
+    through the job dispatcher as soon as their parents have finished, so
+    independent branches run in parallel.
+
+    A process holds each run it drives under a lease, renewed on every
+    heartbeat. When a process stops, its leases are released; when it dies,
+    they run out. Either way the next engine to look claims the run and
+    resumes it from its stored state.
+    """
+    def __init__(self, collection, owner_id: str, lease_seconds: int):
+        self.collection = collection
+        self.owner_id = owner_id
+        self.lease_seconds = lease_seconds
+        self._runs: Dict[str, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+    async def ensure_indexes(self):
+        """
+        Creates the query, claim and expiry indexes of the runs collection.
+        """
+        await self.collection.create_index([("workflow_id", ASCENDING), ("created_at", DESCENDING)])
+        await self.collection.create_index([("status", ASCENDING), ("lease_expires_at", ASCENDING)])
+        # Only finished runs have `expires_at`, so running ones never expire.
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def start(self, workflow: Workflow, extra_vars: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Records a new run of a workflow and starts driving it.
+
+        Args:
+            workflow: The workflow to run. The run keeps a copy of its
+                nodes and edges, so later changes to the workflow do not
+                affect it.
+            extra_vars: Variables passed to every node, overriding all others.
+
+        Returns:
+            The stored run document.
+        """
+        now = datetime.utcnow()
+        run = {
+            "_id": str(uuid.uuid4()),
+            "workflow_id": str(workflow.id),
+            "workflow_name": workflow.name,
+            "status": "running",
+            "extra_vars": extra_vars,
+            "definition": {
+                "nodes": [node.dict() for node in workflow.nodes],
+                "edges": [edge.dict() for edge in workflow.edges],
+            },
+            "nodes": {node.id: {"status": "pending"} for node in workflow.nodes},
+            "cancel_requested": False,
+            "owner": self.owner_id,
+            "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.collection.insert_one(run)
+        self._drive(run)
+        return run
+
+    async def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": run_id})
+
+    async def list_runs(self, workflow_id: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Returns the latest runs of a workflow, newest first, without the
+        definition they ran.
+        """
+        cursor = self.collection.find({"workflow_id": workflow_id}, {"definition": 0})
+        return await cursor.sort("created_at", DESCENDING).limit(limit).to_list(length=None)
+
+    async def cancel(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancels a run: its queued and running jobs are canceled, and nodes
+        that have not started are skipped.
+
+        Returns:
+            The run, or None if it does not exist or has already finished.
+        """
+        run = await self.collection.find_one_and_update(
+            {"_id": run_id, "status": "running"},
+            {"$set": {"cancel_requested": True, "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if run is None:
+            return None
+        # The process driving the run cancels jobs launched after this too.
+        for node in run["nodes"].values():
+            if node["status"] in ACTIVE_STATUSES:
+                await cancel_job(node["task_id"])
+        return run
+
+    async def run(self):
+        """
+        Renews the leases of the runs driven here and claims abandoned runs,
+        until `stop` is called.
+        """
+        self._stopping = asyncio.Event()
+        logger.info(f"Workflow engine {self.owner_id} started")
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await self._heartbeat()
+                    while (run := await self._claim()) is not None:
+                        if run["_id"] not in self._runs:
+                            logger.info(f"Resuming workflow run {run['_id']}")
+                            self._drive(run)
+                except Exception as e:
+                    logger.error(f"Workflow engine {self.owner_id} could not renew or claim runs: {e}")
+                await self._sleep(self.lease_seconds / 3)
+        finally:
+            runs = list(self._runs)
+            tasks = list(self._runs.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                # Let another process resume these runs right away.
+                await self.collection.update_many(
+                    {"_id": {"$in": runs}, "owner": self.owner_id},
+                    {"$set": {"lease_expires_at": datetime.utcnow()}},
+                )
+            except Exception as e:
+                logger.error(f"Workflow engine {self.owner_id} could not release its runs: {e}")
+            logger.info(f"Workflow engine {self.owner_id} stopped")
+
+    def stop(self):
+        self._stopping.set()
+
+    def _drive(self, run: Dict[str, Any]):
+        run_id = run["_id"]
+
+        async def drive():
+            try:
+                await _Execution(self, run).execute()
+            except _LeaseLost:
+                logger.warning(f"Workflow run {run_id} was taken over by another process")
+            except Exception:
+                # The lease is no longer renewed, so the run is retried once it expires.
+                logger.exception(f"Workflow run {run_id} failed")
+
+        task = self._runs[run_id] = asyncio.create_task(drive())
+        task.add_done_callback(lambda _: self._runs.pop(run_id, None))
+
+    async def _heartbeat(self):
+        """
+        Renews the leases of the runs driven here, and stops driving those
+        another process has taken over since the last heartbeat.
+        """
+        if not self._runs:
+            return
+        runs = list(self._runs)
+        await self.collection.update_many(
+            {"_id": {"$in": runs}, "owner": self.owner_id},
+            {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+        )
+        cursor = self.collection.find({"_id": {"$in": runs}, "owner": self.owner_id}, {"_id": 1})
+        owned = {run["_id"] for run in await cursor.to_list(length=None)}
+        for run_id in runs:
+            task = self._runs.get(run_id)
+            if run_id not in owned and task is not None:
+                logger.warning(f"Workflow run {run_id} was taken over by another process")
+                task.cancel()
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"status": "running", "lease_expires_at": {"$lt": now}},
+            {"$set": {"owner": self.owner_id, "lease_expires_at": now + timedelta(seconds=self.lease_seconds)}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+def to_response(run: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts a run document to the shape returned by the workflow endpoints.
+    """
+    result = {k: v for k, v in run.items() if k not in ("_id", "owner", "lease_expires_at", "expires_at")}
+    result["run_id"] = run["_id"]
+    return result
+
+workflow_engine = WorkflowEngine(db.workflow_runs, PROCESS_ID, settings.WORKFLOW_LEASE_SECONDS)
@@ -0,0 +1,151 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from core.config import settings
+from db.database import db
+from db.models import Workflow, WorkflowCreate, WorkflowEdge, WorkflowNode, WorkflowUpdate
+from services.playbook_catalog import playbook_catalog
+
+"""
+This module stores workflows in MongoDB: DAGs of playbook runs whose edges
+start a run after another one succeeded, failed or finished either way.
+`services.workflow_engine` runs them.
+"""
+
+class WorkflowError(ValueError):
+    """
+    Raised for a workflow that cannot be run, e.g. one with a cycle.
+    """
+
+async def ensure_indexes():
+    await db.workflows.create_index("name")
+
+def validate(nodes: List[WorkflowNode], edges: List[WorkflowEdge]):
+    """
+    Checks that a workflow's nodes and edges form a DAG of known playbooks.
+
+    Raises:
+        WorkflowError: If a node ID is repeated, an edge names an unknown
+            node or repeats another edge, the edges form a cycle, a playbook
+            does not exist or a node sets both inventory and inventory_id.
+    """
+    if len(nodes) > settings.WORKFLOW_MAX_NODES:
+        raise WorkflowError(f"A workflow has at most {settings.WORKFLOW_MAX_NODES} nodes")
+    children: Dict[str, List[str]] = {}
+    for node in nodes:
+        if node.id in children:
+            raise WorkflowError(f"Node {node.id} is defined twice")
+        if not playbook_catalog.exists(node.playbook):
+            raise WorkflowError(f"nodes[{node.id}]: Playbook {node.playbook}.yml not found")
+        if node.inventory is not None and node.inventory_id is not None:
+            raise WorkflowError(f"nodes[{node.id}]: Pass either inventory or inventory_id, not both")
+        children[node.id] = []
+    seen = set()
+    for edge in edges:
+        for end in (edge.source, edge.target):
+            if end not in children:
+                raise WorkflowError(f"Edge {edge.source} -> {edge.target} names unknown node {end}")
+        if (edge.source, edge.target) in seen:
+            raise WorkflowError(f"Nodes {edge.source} and {edge.target} are joined by more than one edge")
+        seen.add((edge.source, edge.target))
+        children[edge.source].append(edge.target)
+
+    # Depth-first search; a node reached again while on the path closes a cycle.
+    state: Dict[str, int] = {}
+    for root in children:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(children[root]))]
+        while stack:
+            node, pending = stack[-1]
+            child = next(pending, None)
+            if child is None:
+                state[node] = 2
+                stack.pop()
+            elif state.get(child) == 1:
+                raise WorkflowError(f"The edges form a cycle through {child}")
+            elif child not in state:
+                state[child] = 1
+                stack.append((child, iter(children[child])))
+
+async def get_all_workflows() -> List[Workflow]:
+    """
+    Retrieves all workflows from the database.
+    """
+    workflows = []
+    async for workflow in db.workflows.find().sort("name", 1):
+        workflows.append(Workflow(**workflow))
+    return workflows
+
+async def get_workflow_by_id(workflow_id: str) -> Optional[Workflow]:
+    """
+    Retrieves a workflow by ID, or None if it does not exist.
+    """
+    try:
+        workflow = await db.workflows.find_one({"_id": ObjectId(workflow_id)})
+    except InvalidId:
+        return None
+    if workflow:
+        return Workflow(**workflow)
+    return None
+
+async def create_workflow(workflow: WorkflowCreate) -> Workflow:
+    """
+    Validates and stores a new workflow.
+
+    Raises:
+        WorkflowError: If the workflow is not a valid DAG, see `validate`.
+    """
+    validate(workflow.nodes, workflow.edges)
+    document = workflow.dict()
+    document["created_at"] = document["updated_at"] = datetime.utcnow()
+    result = await db.workflows.insert_one(document)
+    document["_id"] = result.inserted_id
+    return Workflow(**document)
+
+async def update_workflow(workflow_id: str, workflow_update: WorkflowUpdate) -> Optional[Workflow]:
+    """
+    Updates a workflow. New nodes or edges are validated together with the
+    stored ones they replace. Runs already started keep the definition they
+    started with.
+
+    Raises:
+        WorkflowError: If the updated workflow is not a valid DAG.
+    """
+    update_data = {k: v for k, v in workflow_update.dict().items() if v is not None}
+    if not update_data:
+        return None
+    if "nodes" in update_data or "edges" in update_data:
+        current = await get_workflow_by_id(workflow_id)
+        if not current:
+            return None
+        validate(
+            workflow_update.nodes if workflow_update.nodes is not None else current.nodes,
+            workflow_update.edges if workflow_update.edges is not None else current.edges,
+        )
+    update_data["updated_at"] = datetime.utcnow()
+    try:
+        result = await db.workflows.find_one_and_update(
+            {"_id": ObjectId(workflow_id)},
+            {"$set": update_data},
+            return_document=True
+        )
+    except InvalidId:
+        return None
+    if result:
+        return Workflow(**result)
+    return None
+
+async def delete_workflow(workflow_id: str) -> bool:
+    """
+    Deletes a workflow. Returns False if it did not exist. Its runs are kept.
+    """
+    try:
+        result = await db.workflows.delete_one({"_id": ObjectId(workflow_id)})
+    except InvalidId:
+        return False
+    return result.deleted_count == 1
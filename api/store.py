@@ -1 +0,0 @@
-task_results = {}
\ No newline at end of file
@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+"""
+Shared fixtures. The tests run without MongoDB or Ansible: the database is
+replaced by mongomock-motor before any service binds its collections, and
+playbooks are run by `benchmarks/fake_runner.py` instead of ansible-runner.
+"""
+
+# The API is not an installed package; its modules import each other from api/.
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+# Settings are read on first import, so the scratch directories go first.
+_scratch = tempfile.mkdtemp(prefix="ansible_aap_tests_")
+for name in ("ARTIFACTS_DIR", "PROJECTS_DIR", "RUNNER_WORK_DIR"):
+    os.environ[name] = os.path.join(_scratch, name.lower())
+os.environ["RUNNER_POOL_SIZE"] = "0"
+os.environ["MONGODB_DB_NAME"] = "ansible_aap_tests"
+
+from mongomock.store import CollectionStore  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from db import database  # noqa: E402
+
+database.db = AsyncMongoMockClient()[os.environ["MONGODB_DB_NAME"]]
+# mongomock scans a collection for expired documents on every access when it
+# has a TTL index; MongoDB expires documents in the background.
+CollectionStore._remove_expired_documents = lambda self: None
+
+FAKE_RUNNER = os.path.join(API_DIR, "benchmarks", "fake_runner.py")
+
+class FakeRunner:
+    """
+    Builds fake_runner.py command lines in place of ansible-runner's. Each
+    playbook can get its own fake_runner options, e.g. `["--rc", "1"]`.
+    """
+    def __init__(self):
+        self.default = ["--duration", "0.2", "--events", "2"]
+        self.options = {}
+
+    def command(self, private_data_dir, project_dir, playbook_name, ident=None, limit=None):
+        return [sys.executable, FAKE_RUNNER, *self.default, *self.options.get(playbook_name, [])]
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def fake_runner(monkeypatch):
+    from services import ansible_runner
+
+    runner = FakeRunner()
+    monkeypatch.setattr(ansible_runner, "_build_command", runner.command)
+    return runner
+
+@pytest.fixture
+def client(fake_runner):
+    """
+    A test client of the API with its background services running.
+    """
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def wait_for_task(client):
+    """
+    Returns a function that waits until a task has finished and returns it.
+    """
+    def wait(task_id, timeout=15.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            task = client.get(f"/api/v1/tasks/{task_id}").json()
+            if task["status"] in ("success", "error", "canceled"):
+                return task
+            time.sleep(0.1)
+        raise AssertionError(f"Task {task_id} did not finish within {timeout} seconds")
+    return wait
@@ -0,0 +1,56 @@
+import time
+
+from core.config import settings
+
+def _run(client, playbook="monitoring"):
+    response = client.post(f"/api/v1/playbooks/{playbook}/run", json={})
+    assert response.status_code == 202, response.text
+    return response.json()["task_id"]
+
+def _wait_running(client, task_id):
+    for _ in range(100):
+        if client.get(f"/api/v1/tasks/{task_id}").json()["status"] == "running":
+            return
+        time.sleep(0.05)
+    raise AssertionError(f"Task {task_id} did not start")
+
+def test_cancel_running_job(client, fake_runner, wait_for_task):
+    fake_runner.options["monitoring"] = ["--duration", "30", "--events", "30"]
+    task_id = _run(client)
+    _wait_running(client, task_id)
+    started = time.monotonic()
+    assert client.post(f"/api/v1/tasks/{task_id}/cancel").json() == {"task_id": task_id, "status": "canceling"}
+    assert wait_for_task(task_id)["status"] == "canceled"
+    assert time.monotonic() - started < 10
+
+def test_cancel_queued_job(client, fake_runner, monkeypatch, wait_for_task):
+    from services.scheduler import scheduler
+
+    monkeypatch.setattr(scheduler, "max_workers", 1)
+    fake_runner.options["monitoring"] = ["--duration", "30", "--events", "30"]
+    running, queued = _run(client), _run(client)
+    assert client.post(f"/api/v1/tasks/{queued}/cancel").json()["status"] == "canceled"
+    assert client.get(f"/api/v1/tasks/{queued}").json()["status"] == "canceled"
+    client.post(f"/api/v1/tasks/{running}/cancel")
+    assert wait_for_task(running)["status"] == "canceled"
+
+def test_cancel_finished_or_unknown_job(client, wait_for_task):
+    task_id = _run(client)
+    wait_for_task(task_id)
+    assert client.post(f"/api/v1/tasks/{task_id}/cancel").status_code == 409
+    assert client.post("/api/v1/tasks/nope/cancel").status_code == 404
+
+def test_run_timeout(client, fake_runner, monkeypatch, wait_for_task):
+    monkeypatch.setattr(settings, "JOB_TIMEOUT_SECONDS", 1)
+    fake_runner.options["monitoring"] = ["--duration", "30", "--events", "30"]
+    task = wait_for_task(_run(client))
+    assert task["status"] == "error"
+    assert "timeout of 1 seconds" in task["error"]
+
+def test_idle_timeout(client, fake_runner, monkeypatch, wait_for_task):
+    monkeypatch.setattr(settings, "JOB_IDLE_TIMEOUT_SECONDS", 1)
+    # One event after 30 seconds: silent in between.
+    fake_runner.options["monitoring"] = ["--duration", "30", "--events", "1"]
+    task = wait_for_task(_run(client))
+    assert task["status"] == "error"
+    assert "no output for 1 seconds" in task["error"]
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from services import event_index
+from services.event_index import EventIndexer
+
+def _result(counter, host="web1"):
+    return {"event": "runner_on_ok", "counter": counter, "event_data": {"host": host, "task": "ping"}}
+
+async def _indexed(job_id):
+    return await event_index.collection.count_documents({"job_id": job_id})
+
+@pytest.mark.anyio
+async def test_quiet_run_is_flushed_by_the_timer(monkeypatch):
+    monkeypatch.setattr(event_index, "FLUSH_INTERVAL", 0.2)
+    indexer = EventIndexer("quiet", "monitoring")
+    await indexer.add(_result(1))
+    await indexer.add({"event": "playbook_on_task_start", "event_data": {"task": "ping"}})
+    assert await _indexed("quiet") == 0
+    # No further event arrives; the timer writes the batch on its own.
+    await asyncio.sleep(0.4)
+    assert await _indexed("quiet") == 1
+
+    await indexer.add(_result(2))
+    await indexer.flush()
+    assert await _indexed("quiet") == 2
+
+@pytest.mark.anyio
+async def test_full_batch_is_written_at_once(monkeypatch):
+    monkeypatch.setattr(event_index, "BATCH_SIZE", 3)
+    indexer = EventIndexer("busy", "monitoring")
+    for counter in range(1, 5):
+        await indexer.add(_result(counter, host=f"web{counter}"))
+    assert await _indexed("busy") == 3
+    await indexer.flush()
+    assert await _indexed("busy") == 4
@@ -0,0 +1,94 @@
+import os
+import subprocess
+
+import pytest
+
+from core.config import settings
+from services import git_sync
+
+pytestmark = pytest.mark.anyio
+
+def _git(*args, cwd=None):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+def _commit(work, name, content):
+    with open(os.path.join(work, name), "w") as f:
+        f.write(content)
+    _git("add", name, cwd=work)
+    _git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", name, cwd=work)
+    _git("push", "-q", "origin", "HEAD:main", cwd=work)
+    return _git("rev-parse", "HEAD", cwd=work)
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """
+    A local bare repository with one commit on `main`, and a clone to push
+    more commits from. Served over file:// so shallow fetches work.
+    """
+    monkeypatch.setattr(settings, "PROJECTS_DIR", str(tmp_path / "projects"))
+    bare = tmp_path / "remote.git"
+    _git("init", "-q", "--bare", "-b", "main", str(bare))
+    work = tmp_path / "work"
+    _git("clone", "-q", str(bare), str(work))
+    first = _commit(str(work), "site.yml", "- hosts: all\n")
+    return {"url": f"file://{bare}", "work": str(work), "first": first}
+
+async def test_first_sync_checks_out_the_branch(remote):
+    result = await git_sync.sync_repository("p1", remote["url"], "main")
+    assert result.commit_sha == remote["first"]
+    assert result.changed
+    assert os.path.isfile(os.path.join(git_sync.project_dir("p1"), "site.yml"))
+
+async def test_unchanged_remote_skips_the_fetch(remote):
+    await git_sync.sync_repository("p1", remote["url"], "main")
+    result = await git_sync.sync_repository("p1", remote["url"], "main", known_commit=remote["first"])
+    assert not result.changed
+    assert "already up to date" in result.message
+
+async def test_new_commit_is_synced(remote):
+    await git_sync.sync_repository("p1", remote["url"], "main")
+    second = _commit(remote["work"], "other.yml", "- hosts: web\n")
+    result = await git_sync.sync_repository("p1", remote["url"], "main", known_commit=remote["first"])
+    assert result.commit_sha == second
+    assert result.changed
+    assert os.path.isfile(os.path.join(git_sync.project_dir("p1"), "other.yml"))
+
+async def test_projects_share_the_cache(remote):
+    await git_sync.sync_repository("p1", remote["url"], "main")
+    await git_sync.sync_repository("p2", remote["url"], "main")
+    cache = os.path.realpath(git_sync.cache_dir(remote["url"]))
+    assert git_sync._worktree_of(git_sync.project_dir("p1")) == cache
+    assert git_sync._worktree_of(git_sync.project_dir("p2")) == cache
+    assert len(os.listdir(os.path.dirname(cache))) == 1
+
+async def test_stray_directory_is_replaced(remote):
+    path = git_sync.project_dir("p1")
+    os.makedirs(path)
+    with open(os.path.join(path, "leftover"), "w") as f:
+        f.write("old clone")
+    await git_sync.sync_repository("p1", remote["url"], "main")
+    assert not os.path.exists(os.path.join(path, "leftover"))
+    assert os.path.isfile(os.path.join(path, "site.yml"))
+
+async def test_local_changes_are_discarded(remote):
+    await git_sync.sync_repository("p1", remote["url"], "main")
+    path = git_sync.project_dir("p1")
+    with open(os.path.join(path, "site.yml"), "w") as f:
+        f.write("edited")
+    with open(os.path.join(path, "untracked.yml"), "w") as f:
+        f.write("new")
+    _commit(remote["work"], "other.yml", "- hosts: web\n")
+    await git_sync.sync_repository("p1", remote["url"], "main", known_commit=remote["first"])
+    with open(os.path.join(path, "site.yml")) as f:
+        assert f.read() == "- hosts: all\n"
+    assert not os.path.exists(os.path.join(path, "untracked.yml"))
+
+async def test_missing_branch(remote):
+    with pytest.raises(git_sync.GitError):
+        await git_sync.sync_repository("p1", remote["url"], "nope", known_commit=remote["first"])
+
+async def test_remove_worktree(remote):
+    await git_sync.sync_repository("p1", remote["url"], "main")
+    await git_sync.remove_worktree("p1", remote["url"])
+    assert not os.path.exists(git_sync.project_dir("p1"))
+    assert _git("--git-dir", git_sync.cache_dir(remote["url"]), "worktree", "list").count("\n") == 0
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from services.inventory_parser import InventoryError, parse_inventory, resolve, resolve_targets
+
+INI = """
+[web]
+web[01:03]
+
+[db]
+db1:5432 ansible_user=postgres
+db2
+
+[prod:children]
+web
+db
+
+[prod:vars]
+env=prod
+"""
+
+YAML = """
+all:
+  children:
+    web:
+      hosts:
+        web1:2222:
+        web2:
+          ansible_port: 2200
+    db:
+      hosts:
+        db1:
+"""
+
+def test_ini_groups_and_ranges():
+    inventory = parse_inventory(INI)
+    assert list(inventory.hosts) == ["web01", "web02", "web03", "db1", "db2"]
+    assert inventory.members("prod") == ["web01", "web02", "web03", "db1", "db2"]
+    assert inventory.group("prod").vars == {"env": "prod"}
+
+@pytest.mark.parametrize("line, host, port", [
+    ("web1:2222", "web1", 2222),
+    ("10.0.0.1:23", "10.0.0.1", 23),
+    ("[::1]:22", "::1", 22),
+    ("fe80::1", "fe80::1", None),
+    ("web1", "web1", None),
+])
+def test_ini_host_port(line, host, port):
+    inventory = parse_inventory(f"[web]\n{line}\n")
+    assert list(inventory.hosts) == [host]
+    assert inventory.hosts[host].get("ansible_port") == port
+
+def test_ini_range_with_port():
+    inventory = parse_inventory("[web]\nweb[1:2]:2222\n")
+    assert dict(inventory.hosts) == {"web1": {"ansible_port": 2222}, "web2": {"ansible_port": 2222}}
+
+def test_explicit_port_variable_wins():
+    inventory = parse_inventory("[web]\nweb1:2222 ansible_port=22\n")
+    assert inventory.hosts["web1"] == {"ansible_port": 22}
+
+def test_yaml_host_port():
+    inventory = parse_inventory(YAML)
+    assert inventory.hosts["web1"] == {"ansible_port": 2222}
+    assert inventory.hosts["web2"] == {"ansible_port": 2200}
+    assert inventory.members("web") == ["web1", "web2"]
+
+def test_limit_matches_host_with_port():
+    inventory = parse_inventory("[web]\nweb1:2222\nweb2\n")
+    assert resolve_targets(inventory, ["all"], "web1") == ["web1"]
+
+@pytest.mark.parametrize("pattern, hosts", [
+    ("web", ["web01", "web02", "web03"]),
+    ("prod:!db", ["web01", "web02", "web03"]),
+    ("prod:&db", ["db1", "db2"]),
+    ("web[0:1]", ["web01", "web02"]),
+    ("db*", ["db1", "db2"]),
+    ("~web0[13]", ["web01", "web03"]),
+    ("web01,db2", ["web01", "db2"]),
+    ("nope", []),
+])
+def test_patterns(pattern, hosts):
+    assert resolve(parse_inventory(INI), pattern) == hosts
+
+def test_invalid_section():
+    with pytest.raises(InventoryError):
+        parse_inventory("[web:nope]\nweb1\n")
+
+def test_large_inventory_parses_in_linear_time():
+    content = "[web]\n" + "\n".join(f"web{i}" for i in range(50000)) + "\n[db]\ndb1\n"
+    start = time.monotonic()
+    inventory = parse_inventory(content)
+    assert time.monotonic() - start < 2
+    assert len(inventory.members("web")) == 50000
+    assert list(inventory.groups["ungrouped"].hosts) == []
+
+@pytest.mark.parametrize("pattern", ["h[0:99999999]", "h[0:999][0:999]", "h[1:3:0]", "h[a:9]"])
+def test_oversized_or_invalid_ranges_are_rejected(pattern):
+    start = time.monotonic()
+    with pytest.raises(InventoryError):
+        parse_inventory(f"[web]\n{pattern}\n")
+    assert time.monotonic() - start < 1
+
+def test_host_limit_counts_every_line(monkeypatch):
+    from services import inventory_parser
+
+    monkeypatch.setattr(inventory_parser.settings, "INVENTORY_MAX_HOSTS", 5)
+    assert len(parse_inventory("[a]\nh[1:3]\n[b]\nh[1:3]\ng[1:2]\n").hosts) == 5
+    with pytest.raises(InventoryError):
+        parse_inventory("[a]\nh[1:3]\n[b]\ng[1:3]\n")
+
+def test_multiple_ranges_in_one_pattern():
+    assert list(parse_inventory("rack[1:2]-node[a:b]\n").hosts) == [
+        "rack1-nodea", "rack1-nodeb", "rack2-nodea", "rack2-nodeb"
+    ]
+
+def test_invalid_regex_in_limit():
+    with pytest.raises(InventoryError):
+        resolve(parse_inventory(INI), "~(")
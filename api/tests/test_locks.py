@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.models import ProjectSync
+from services import locks
+from services import projects as project_service
+
+@pytest.mark.anyio
+async def test_acquire_renew_release():
+    assert await locks.acquire("lock-a", "one", 30)
+    assert not await locks.acquire("lock-a", "two", 30)
+    assert await locks.renew("lock-a", "one", 30)
+    assert not await locks.renew("lock-a", "two", 30)
+    assert await locks.held("lock-a")
+    await locks.release("lock-a", "two")
+    assert await locks.held("lock-a")
+    await locks.release("lock-a", "one")
+    assert not await locks.held("lock-a")
+
+@pytest.mark.anyio
+async def test_expired_lease_is_not_renewed():
+    assert await locks.acquire("lock-b", "one", 30)
+    await locks.collection.update_one({"_id": "lock-b"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    assert not await locks.held("lock-b")
+    # Someone else may have taken it over already.
+    assert not await locks.renew("lock-b", "one", 30)
+    assert await locks.acquire("lock-b", "two", 30)
+
+@pytest.mark.anyio
+async def test_sync_lock_is_renewed_while_the_sync_runs(monkeypatch):
+    monkeypatch.setattr(project_service.settings, "GIT_TIMEOUT", 0.2)
+    lock_name = project_service._sync_lock_name("slow")
+    calls = []
+
+    async def slow_sync(project_id):
+        calls.append(project_id)
+        # Three times the lock's TTL of 0.6 seconds.
+        await asyncio.sleep(1.8)
+        return ProjectSync(project_id=project_id, status="success", message="synced")
+
+    monkeypatch.setattr(project_service, "_run_sync", slow_sync)
+    sync = asyncio.create_task(project_service._sync_project_exclusive("slow"))
+    await asyncio.sleep(1.2)
+    assert await locks.held(lock_name)
+    assert not await locks.acquire(lock_name, "another-process", 1)
+    assert (await sync).status == "success"
+    assert not await locks.held(lock_name)
+    assert calls == ["slow"]
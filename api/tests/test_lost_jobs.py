@@ -0,0 +1,25 @@
+import pytest
+
+from services import locks
+from services.dispatch import reap_lost_jobs
+from services.jobs import job_repository
+
+@pytest.mark.anyio
+async def test_jobs_of_dead_processes_are_failed():
+    await job_repository.create("orphan-queued", "monitoring", process_id="dead-process")
+    await job_repository.create("orphan-running", "monitoring", process_id="dead-process")
+    await job_repository.update("orphan-running", {"status": "running"})
+    await job_repository.create("held", "monitoring", process_id="live-process")
+    await job_repository.create("brokered", "monitoring")
+    await locks.acquire("process:live-process", "live-process", 60)
+
+    assert await reap_lost_jobs() == 2
+    for task_id in ("orphan-queued", "orphan-running"):
+        job = await job_repository.get(task_id)
+        assert job["status"] == "error"
+        assert "dead-process" in job["error"]
+        # Finished, so it expires like every other job.
+        assert job["expires_at"]
+    assert (await job_repository.get("held"))["status"] == "queued"
+    assert (await job_repository.get("brokered"))["status"] == "queued"
+    assert await reap_lost_jobs() == 0
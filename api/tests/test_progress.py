@@ -0,0 +1,66 @@
+from services.progress import JobProgress
+
+def _task(name):
+    return {"event": "playbook_on_task_start", "event_data": {"task": name}}
+
+def _result(host, task, event="runner_on_ok", **data):
+    return {"event": event, "event_data": {"host": host, "task": task, **data}}
+
+def test_snapshot_only_holds_aggregates():
+    progress = JobProgress("job", estimated_tasks=2)
+    for i in range(50):
+        progress.add(_task("setup") if i == 0 else _result(f"host{i}", "setup"))
+    snapshot = progress.snapshot()
+    assert list(snapshot) == ["progress"]
+    assert snapshot["progress"]["hosts"]["total"] == 49
+
+def test_hosts_are_done_once_they_completed_every_task():
+    progress = JobProgress("job", estimated_tasks=2)
+    progress.add(_task("one"))
+    for host in ("a", "b", "c", "d"):
+        progress.add(_result(host, "one"))
+    progress.add(_result("d", "one", event="runner_on_unreachable"))
+    progress.add(_task("two"))
+    progress.add(_result("a", "two", res={"changed": True}))
+
+    hosts = progress.snapshot()["progress"]["hosts"]
+    # a completed both tasks, d left the play; b and c still have one to go.
+    assert hosts == {
+        "total": 4, "running": 2, "ok": 0, "changed": 1, "failed": 0, "unreachable": 1, "done": 2
+    }
+    assert progress.snapshot()["progress"]["percent_hosts_done"] == 50.0
+
+    progress.add(_result("b", "two"))
+    progress.add(_result("c", "two", event="runner_on_failed"))
+    assert progress.snapshot()["progress"]["percent_hosts_done"] == 100.0
+    assert progress.snapshot()["progress"]["percent"] < 100
+
+def test_host_status_and_task_summary(client, fake_runner, wait_for_task):
+    fake_runner.options["monitoring"] = ["--hosts", "5", "--events", "3", "--fail-every", "4"]
+    response = client.post("/api/v1/playbooks/monitoring/run", json={})
+    task_id = response.json()["task_id"]
+    task = wait_for_task(task_id)
+    assert "host_status" not in task and "task_summary" not in task
+    assert task["progress"]["hosts"]["total"] == 5
+
+    first = client.get(f"/api/v1/tasks/{task_id}/host_status", params={"limit": 3}).json()
+    assert [host["host"] for host in first["hosts"]] == ["host0000", "host0001", "host0002"]
+    assert first["next_after"] == "host0002"
+    rest = client.get(f"/api/v1/tasks/{task_id}/host_status", params={"after": first["next_after"]}).json()
+    assert [host["host"] for host in rest["hosts"]] == ["host0003", "host0004"]
+    assert rest["next_after"] is None
+
+    hosts = {host["host"]: host for host in first["hosts"] + rest["hosts"]}
+    # Every fourth of the 15 results failed: results 4, 8 and 12.
+    assert hosts["host0003"]["status"] == "failed"
+    assert hosts["host0003"]["failed"] == 1
+    assert hosts["host0000"]["status"] == "ok"
+    assert hosts["host0000"]["ok"] == 3
+    assert sum(host["status"] == "failed" for host in hosts.values()) == 3
+
+    tasks = client.get(f"/api/v1/tasks/{task_id}/task_summary").json()["tasks"]
+    assert [task["task"] for task in tasks] == ["task 0", "task 1", "task 2"]
+    assert sum(task["ok"] + task["failed"] for task in tasks) == 15
+
+def test_host_status_of_unknown_task(client):
+    assert client.get("/api/v1/tasks/nope/host_status").status_code == 404
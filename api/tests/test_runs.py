@@ -0,0 +1,148 @@
+import os
+import stat
+
+def _run(client, playbook="monitoring", **body):
+    response = client.post(f"/api/v1/playbooks/{playbook}/run", json=body)
+    assert response.status_code == 202, response.text
+    return response.json()["task_id"]
+
+def test_successful_run(client, wait_for_task):
+    task = wait_for_task(_run(client))
+    assert task["status"] == "success"
+    assert task["data"]["event"] == "playbook_on_stats"
+    assert task["finished_at"]
+
+def test_run_returns_the_status_etag(client, wait_for_task):
+    response = client.post("/api/v1/playbooks/monitoring/run", json={})
+    etag = response.headers["etag"]
+    task_id = response.json()["task_id"]
+    # The first long-poll already waits for a change.
+    changed = client.get(
+        f"/api/v1/tasks/{task_id}", params={"view": "status", "wait": 10}, headers={"If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+def test_long_poll_until_finished(client, fake_runner):
+    fake_runner.options["monitoring"] = ["--duration", "1"]
+    response = client.post("/api/v1/playbooks/monitoring/run", json={})
+    task_id = response.json()["task_id"]
+    # Held through queued -> running until the task is done.
+    finished = client.get(
+        f"/api/v1/tasks/{task_id}",
+        params={"view": "status", "wait": 10, "until": "finished"},
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+    assert finished.status_code == 200
+    assert finished.json()["status"] == "success"
+
+def test_failed_run(client, fake_runner, wait_for_task):
+    fake_runner.options["monitoring"] = ["--rc", "2"]
+    task = wait_for_task(_run(client))
+    assert task["status"] == "error"
+    assert task["returncode"] == 2
+    # The final stats event is kept, for the artifacts set before the failure.
+    assert task["data"]["event"] == "playbook_on_stats"
+
+def test_finished_job_keeps_its_status(client):
+    from services.dispatch import run_job
+    from services.jobs import job_repository
+
+    client.portal.call(job_repository.create, "finished", "monitoring")
+    client.portal.call(job_repository.update, "finished", {"status": "error", "error": "lost"})
+    assert client.portal.call(job_repository.update, "finished", {"status": "success"}) is None
+    # E.g. a job another process declared lost is not started any more.
+    result = client.portal.call(run_job, "finished", "monitoring", None, None)
+    assert result["status"] == "error"
+    assert client.portal.call(job_repository.get, "finished")["error"] == "lost"
+
+def test_unknown_playbook(client):
+    assert client.post("/api/v1/playbooks/nope/run", json={}).status_code == 404
+
+def test_runner_that_cannot_start(client, monkeypatch, tmp_path, wait_for_task):
+    from services import ansible_runner
+
+    script = tmp_path / "runner"
+    script.write_text("#!/bin/sh\n")
+    os.chmod(script, stat.S_IRUSR)
+    monkeypatch.setattr(ansible_runner, "_build_command", lambda *args: [str(script)])
+
+    task = wait_for_task(_run(client))
+    assert task["status"] == "error"
+    assert "Permission denied" in task["error"]
+
+def test_command_that_cannot_be_built(client, monkeypatch, wait_for_task):
+    from services import ansible_runner
+
+    def fail(*args):
+        raise ValueError("not a Windows path")
+    monkeypatch.setattr(ansible_runner, "_build_command", fail)
+
+    task = wait_for_task(_run(client))
+    assert task["status"] == "error"
+    assert task["error"] == "not a Windows path"
+
+def test_limit_matching_no_host(client):
+    response = client.post(
+        "/api/v1/playbooks/monitoring/run", json={"inventory": "[web]\nweb1:2222\n", "limit": "db1"}
+    )
+    assert response.status_code == 422
+
+def test_limit_on_host_with_port(client, wait_for_task):
+    task_id = _run(client, inventory="[web]\nweb1:2222\nweb2\n", limit="web1")
+    assert wait_for_task(task_id)["status"] == "success"
+
+def test_invalid_regex_limit(client):
+    response = client.post("/api/v1/playbooks/monitoring/run", json={"inventory": "[web]\nweb1\n", "limit": "~("})
+    assert response.status_code == 422
+
+def test_stream_follows_a_job_run_by_another_process(client, monkeypatch):
+    import asyncio
+    import json
+    import sys
+    from services.artifact_store import artifact_store
+    from services.jobs import job_repository
+
+    monkeypatch.setattr(sys.modules["services.artifact_store"], "TAIL_POLL_SECONDS", 0.05)
+    task_id = "worker-run"
+    client.portal.call(job_repository.create, task_id, "monitoring")
+
+    async def run_elsewhere():
+        # Like a runner worker: events only reach the artifact store.
+        await job_repository.update(task_id, {"status": "running"})
+        for i in range(100):
+            artifact_store.open(task_id).append({"event": "runner_on_ok", "counter": i})
+            if i % 40 == 0:
+                await asyncio.sleep(0.2)
+        artifact_store.close(task_id)
+        await job_repository.update(task_id, {"status": "success"})
+
+    client.portal.start_task_soon(run_elsewhere)
+    with client.stream("GET", f"/api/v1/tasks/{task_id}/events/stream") as response:
+        lines = [line for line in response.iter_lines() if line.startswith("data: ")]
+    counters = [json.loads(line[6:]).get("counter") for line in lines]
+    assert counters == [*range(100), None]
+
+def test_stale_job_dirs_of_unfinished_jobs_are_kept(tmp_path, monkeypatch):
+    from core.config import settings
+    from services import job_dirs
+
+    monkeypatch.setattr(settings, "RUNNER_WORK_DIR", str(tmp_path))
+    for task_id in ("finished", "long-running"):
+        job_dir = job_dirs.create(task_id, None, None)
+        os.utime(job_dir, (0, 0))
+    assert job_dirs.remove_stale(3600, active={"long-running"}) == 1
+    assert os.listdir(tmp_path) == ["long-running"]
+
+def test_failed_index_flush_still_finalizes_the_job(client, wait_for_task, monkeypatch, tmp_path):
+    from core.config import settings
+    from services.event_index import EventIndexer
+
+    async def broken_flush(self):
+        raise RuntimeError("MongoDB is gone")
+
+    monkeypatch.setattr(EventIndexer, "flush", broken_flush)
+    monkeypatch.setattr(settings, "RUNNER_WORK_DIR", str(tmp_path))
+    task = wait_for_task(_run(client))
+    assert task["status"] == "success"
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from services.scheduler import JobScheduler
+
+pytestmark = pytest.mark.anyio
+
+class Jobs:
+    """
+    Jobs that run until released, recording the order they started in.
+    """
+    def __init__(self):
+        self.started = []
+        self._release = {}
+
+    def job(self, task_id):
+        self._release[task_id] = asyncio.Event()
+
+        async def run():
+            self.started.append(task_id)
+            await self._release[task_id].wait()
+        return run
+
+    async def finish(self, task_id):
+        self._release[task_id].set()
+        # Let the job end and the scheduler start the next one.
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+async def test_worker_limit():
+    scheduler, jobs = JobScheduler(max_workers=2), Jobs()
+    positions = [scheduler.submit(f"j{i}", jobs.job(f"j{i}"), playbook="site") for i in range(4)]
+    await asyncio.sleep(0)
+    assert positions == [0, 0, 0, 1]
+    assert jobs.started == ["j0", "j1"]
+    assert (scheduler.running, scheduler.queued) == (2, 2)
+    await jobs.finish("j0")
+    assert jobs.started == ["j0", "j1", "j2"]
+    await scheduler.shutdown()
+
+async def test_wait_before_submission_is_counted():
+    scheduler, jobs = JobScheduler(max_workers=1), Jobs()
+    # E.g. the time a job spent in the broker before a worker claimed it.
+    scheduler.submit("brokered", jobs.job("brokered"), playbook="site", waited=5.0)
+    await asyncio.sleep(0)
+    assert scheduler.stats()["wait_seconds"]["max"] >= 5.0
+    await scheduler.shutdown()
+
+async def test_priority_order():
+    scheduler, jobs = JobScheduler(max_workers=1), Jobs()
+    scheduler.submit("first", jobs.job("first"), playbook="site")
+    scheduler.submit("low", jobs.job("low"), playbook="site", priority="low")
+    scheduler.submit("normal", jobs.job("normal"), playbook="site")
+    scheduler.submit("high", jobs.job("high"), playbook="site", priority="high")
+    assert scheduler.queue_position("high") == 0
+    assert scheduler.queue_position("low") == 2
+    for task_id in ("first", "high", "normal"):
+        await jobs.finish(task_id)
+    assert jobs.started == ["first", "high", "normal", "low"]
+    await scheduler.shutdown()
+
+async def test_project_cap_does_not_block_other_projects():
+    scheduler, jobs = JobScheduler(max_workers=3, max_per_project=1), Jobs()
+    scheduler.submit("a1", jobs.job("a1"), playbook="site", project="a")
+    scheduler.submit("a2", jobs.job("a2"), playbook="site", project="a")
+    scheduler.submit("b1", jobs.job("b1"), playbook="site", project="b")
+    await asyncio.sleep(0)
+    assert jobs.started == ["a1", "b1"]
+    await jobs.finish("a1")
+    assert jobs.started == ["a1", "b1", "a2"]
+    await scheduler.shutdown()
+
+async def test_playbook_cap():
+    scheduler, jobs = JobScheduler(max_workers=3, max_per_playbook=1), Jobs()
+    scheduler.submit("s1", jobs.job("s1"), playbook="site")
+    scheduler.submit("s2", jobs.job("s2"), playbook="site")
+    scheduler.submit("b1", jobs.job("b1"), playbook="backup")
+    await asyncio.sleep(0)
+    assert jobs.started == ["s1", "b1"]
+    await scheduler.shutdown()
+
+async def test_remove_queued_job():
+    scheduler, jobs = JobScheduler(max_workers=1), Jobs()
+    scheduler.submit("j0", jobs.job("j0"), playbook="site")
+    scheduler.submit("j1", jobs.job("j1"), playbook="site")
+    assert scheduler.remove("j1")
+    assert not scheduler.remove("j0")
+    await jobs.finish("j0")
+    assert jobs.started == ["j0"]
+    assert scheduler.stats()["completed_total"] == 1
+
+async def test_failing_job_frees_its_slot():
+    scheduler, jobs = JobScheduler(max_workers=1), Jobs()
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    scheduler.submit("bad", fail, playbook="site")
+    scheduler.submit("next", jobs.job("next"), playbook="site")
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert jobs.started == ["next"]
+    await scheduler.shutdown()
+
+async def test_unknown_priority():
+    with pytest.raises(ValueError):
+        JobScheduler(max_workers=1).submit("j", Jobs().job("j"), playbook="site", priority="urgent")
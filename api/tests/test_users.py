@@ -0,0 +1,38 @@
+import pytest
+
+from core.security import get_token_claims
+from db.models import UserCreate, UserUpdate
+from services import users as user_service
+
+@pytest.fixture
+def admin(client):
+    client.app.dependency_overrides[get_token_claims] = lambda: {"sub": "admin", "roles": ["admin"]}
+    yield client
+    client.app.dependency_overrides.clear()
+
+def test_empty_update_is_rejected(admin):
+    admin.portal.call(user_service.create_user, UserCreate(email="empty@example.com", password="secret"))
+    response = admin.put("/api/v1/users/empty@example.com", json={})
+    assert response.status_code == 422
+    assert admin.put("/api/v1/users/nobody@example.com", json={}).status_code == 422
+
+def test_empty_update_leaves_the_user_alone(admin):
+    admin.portal.call(user_service.create_user, UserCreate(email="same@example.com", password="secret"))
+    user = admin.portal.call(user_service.update_user, "same@example.com", UserUpdate())
+    assert user.email == "same@example.com"
+    stored = admin.portal.call(user_service.get_user_by_email, "same@example.com")
+    assert stored.token_version == 0
+    assert admin.portal.call(user_service.update_user, "nobody@example.com", UserUpdate()) is None
+
+def test_update_unknown_user(admin):
+    assert admin.put("/api/v1/users/nobody@example.com", json={"roles": ["user"]}).status_code == 404
+
+def test_email_change_to_a_taken_email_is_rejected(admin):
+    for email in ("first@example.com", "second@example.com"):
+        admin.portal.call(user_service.create_user, UserCreate(email=email, password="secret"))
+    response = admin.put("/api/v1/users/first@example.com", json={"email": "second@example.com"})
+    assert response.status_code == 409
+    assert admin.portal.call(user_service.get_user_by_email, "first@example.com") is not None
+    # Keeping the own email is not a conflict.
+    response = admin.put("/api/v1/users/first@example.com", json={"email": "first@example.com"})
+    assert response.status_code == 200
@@ -0,0 +1,230 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.security import get_token_claims
+
+@pytest.fixture
+def admin(client):
+    client.app.dependency_overrides[get_token_claims] = lambda: {"sub": "admin", "roles": ["admin"]}
+    yield client
+    client.app.dependency_overrides.clear()
+
+@pytest.fixture
+def fast_engine(monkeypatch):
+    """
+    Makes the workflow engine renew and claim runs every few tenths of a second.
+    """
+    from services.workflow_engine import workflow_engine
+
+    monkeypatch.setattr(workflow_engine, "lease_seconds", 0.6)
+    return workflow_engine
+
+def _create(client, nodes, edges=()):
+    response = client.post("/api/v1/workflows/", json={"name": "test", "nodes": nodes, "edges": list(edges)})
+    assert response.status_code == 200, response.text
+    return response.json()["_id"]
+
+def _start(client, workflow_id, **body):
+    response = client.post(f"/api/v1/workflows/{workflow_id}/runs", json=body)
+    assert response.status_code == 202, response.text
+    return response.json()["run_id"]
+
+def _wait(client, run_id, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        run = client.get(f"/api/v1/workflows/runs/{run_id}").json()
+        if run["status"] != "running":
+            return run
+        time.sleep(0.1)
+    raise AssertionError(f"Workflow run {run_id} did not finish within {timeout} seconds")
+
+def _wait_for_node(client, run_id, node_id, status, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        run = client.get(f"/api/v1/workflows/runs/{run_id}").json()
+        if run["nodes"][node_id]["status"] == status:
+            return run
+        time.sleep(0.05)
+    raise AssertionError(f"Node {node_id} of run {run_id} did not become {status} within {timeout} seconds")
+
+def _orphan(client, job_fields):
+    """
+    Stores a run whose process died while its node `a` was running, with
+    an edge to `b` on failure, as a stopped API process would leave it.
+    """
+    from db.database import db
+    from services.jobs import job_repository
+
+    task_id = str(uuid.uuid4())
+    run_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    run = {
+        "_id": run_id,
+        "workflow_id": "orphaned",
+        "workflow_name": "orphaned",
+        "status": "running",
+        "extra_vars": None,
+        "definition": {
+            "nodes": [
+                {"id": node_id, "playbook": "monitoring", "inventory": None, "inventory_id": None,
+                 "limit": None, "extra_vars": None, "project_id": None, "priority": "normal", "converge": "any"}
+                for node_id in ("a", "b")
+            ],
+            "edges": [{"source": "a", "target": "b", "on": "failure"}],
+        },
+        "nodes": {"a": {"status": "running", "task_id": task_id, "started_at": now}, "b": {"status": "pending"}},
+        "cancel_requested": False,
+        "owner": "stopped-engine",
+        "lease_expires_at": now - timedelta(seconds=1),
+        "created_at": now,
+        "updated_at": now,
+    }
+
+    async def store():
+        await job_repository.create(task_id, "monitoring", **job_fields)
+        await job_repository.update(task_id, {"status": "running"})
+        await db.workflow_runs.insert_one(run)
+
+    client.portal.call(store)
+    return run_id, task_id
+
+def test_invalid_workflows(admin):
+    def create(nodes, edges=()):
+        return admin.post("/api/v1/workflows/", json={"name": "bad", "nodes": nodes, "edges": list(edges)})
+
+    cycle = create(
+        [{"id": "a", "playbook": "monitoring"}, {"id": "b", "playbook": "backup"}],
+        [{"source": "a", "target": "b"}, {"source": "b", "target": "a"}],
+    )
+    assert cycle.status_code == 422
+    assert "cycle" in cycle.json()["detail"]
+    assert create([{"id": "a", "playbook": "nope"}]).status_code == 422
+    assert create([{"id": "a", "playbook": "monitoring"}], [{"source": "a", "target": "b"}]).status_code == 422
+    assert create([{"id": "a", "playbook": "monitoring"}, {"id": "a", "playbook": "backup"}]).status_code == 422
+
+def test_parallel_branches(admin, fake_runner):
+    fake_runner.options["backup"] = ["--duration", "1"]
+    fake_runner.options["logging"] = ["--duration", "1"]
+    workflow_id = _create(
+        admin,
+        [{"id": "start", "playbook": "monitoring"}, {"id": "left", "playbook": "backup"},
+         {"id": "right", "playbook": "logging"}, {"id": "join", "playbook": "documentation", "converge": "all"}],
+        [{"source": "start", "target": "left"}, {"source": "start", "target": "right"},
+         {"source": "left", "target": "join"}, {"source": "right", "target": "join"}],
+    )
+    run = _wait(admin, _start(admin, workflow_id))
+    assert run["status"] == "success"
+    nodes = run["nodes"]
+    assert {node["status"] for node in nodes.values()} == {"success"}
+    assert nodes["left"]["started_at"] < nodes["right"]["finished_at"]
+    assert nodes["right"]["started_at"] < nodes["left"]["finished_at"]
+    assert nodes["join"]["started_at"] >= max(nodes["left"]["finished_at"], nodes["right"]["finished_at"])
+
+def test_edges_follow_the_outcome(admin, fake_runner):
+    fake_runner.options["backup"] = ["--rc", "2"]
+    workflow_id = _create(
+        admin,
+        [{"id": "backup", "playbook": "backup"}, {"id": "on_success", "playbook": "monitoring"},
+         {"id": "on_failure", "playbook": "restore"}, {"id": "always", "playbook": "logging"}],
+        [{"source": "backup", "target": "on_success", "on": "success"},
+         {"source": "backup", "target": "on_failure", "on": "failure"},
+         {"source": "backup", "target": "always", "on": "always"}],
+    )
+    run = _wait(admin, _start(admin, workflow_id))
+    statuses = {node_id: node["status"] for node_id, node in run["nodes"].items()}
+    assert statuses == {"backup": "error", "on_success": "skipped", "on_failure": "success", "always": "success"}
+    # The failure is handled by an edge, so the run succeeds.
+    assert run["status"] == "success"
+
+def test_unhandled_failure_fails_the_run(admin, fake_runner):
+    fake_runner.options["backup"] = ["--rc", "2"]
+    workflow_id = _create(
+        admin,
+        [{"id": "backup", "playbook": "backup"}, {"id": "next", "playbook": "monitoring"}],
+        [{"source": "backup", "target": "next"}],
+    )
+    run = _wait(admin, _start(admin, workflow_id))
+    assert run["status"] == "error"
+    assert run["nodes"]["next"]["status"] == "skipped"
+
+def test_artifacts_are_passed_on(admin, fake_runner):
+    fake_runner.options["backup"] = ["--artifacts", '{"snapshot": "s1", "size": 3}']
+    fake_runner.options["restore"] = ["--artifacts", '{"restored": true}', "--rc", "2"]
+    workflow_id = _create(
+        admin,
+        [{"id": "backup", "playbook": "backup"}, {"id": "restore", "playbook": "restore"},
+         {"id": "report", "playbook": "documentation"}],
+        [{"source": "backup", "target": "restore"}, {"source": "restore", "target": "report", "on": "failure"}],
+    )
+    run = _wait(admin, _start(admin, workflow_id))
+    nodes = run["nodes"]
+    assert nodes["backup"]["artifacts"] == {"snapshot": "s1", "size": 3}
+    # Artifacts set before a failure travel along the failure edge.
+    assert nodes["restore"]["status"] == "error"
+    assert nodes["restore"]["artifacts"] == {"snapshot": "s1", "size": 3, "restored": True}
+    assert nodes["report"]["artifacts"] == {"snapshot": "s1", "size": 3, "restored": True}
+
+def test_cancel(admin, fake_runner):
+    fake_runner.options["backup"] = ["--duration", "10"]
+    workflow_id = _create(
+        admin,
+        [{"id": "backup", "playbook": "backup"}, {"id": "next", "playbook": "monitoring", "converge": "any"}],
+        [{"source": "backup", "target": "next", "on": "always"}],
+    )
+    run_id = _start(admin, workflow_id)
+    _wait_for_node(admin, run_id, "backup", "running")
+    response = admin.post(f"/api/v1/workflows/runs/{run_id}/cancel")
+    assert response.status_code == 202
+    run = _wait(admin, run_id)
+    assert run["status"] == "canceled"
+    assert run["nodes"]["backup"]["status"] == "canceled"
+    assert run["nodes"]["next"]["status"] == "skipped"
+    assert admin.post(f"/api/v1/workflows/runs/{run_id}/cancel").status_code == 409
+    assert admin.post("/api/v1/workflows/runs/nope/cancel").status_code == 404
+
+def test_resume_marks_jobs_of_a_dead_process_lost(fast_engine, client):
+    run_id, _ = _orphan(client, {"process_id": "dead-process"})
+    run = _wait(client, run_id)
+    assert run["nodes"]["a"]["status"] == "error"
+    assert "dead-process" in run["nodes"]["a"]["error"]
+    assert run["nodes"]["b"]["status"] == "success"
+    assert run["status"] == "success"
+
+def test_resume_follows_jobs_of_a_live_process(fast_engine, client):
+    from services import locks
+    from services.jobs import job_repository
+
+    run_id, task_id = _orphan(client, {"process_id": "live-process"})
+    client.portal.call(locks.acquire, "process:live-process", "live-process", 60)
+    _wait_for_node(client, run_id, "b", "pending")
+    time.sleep(1)
+    run = client.get(f"/api/v1/workflows/runs/{run_id}").json()
+    assert run["status"] == "running"
+    assert run["nodes"]["a"]["status"] == "running"
+
+    # The process holding the job finishes it.
+    client.portal.call(job_repository.update, task_id, {"status": "success", "data": None})
+    run = _wait(client, run_id)
+    assert run["nodes"]["a"]["status"] == "success"
+    assert run["nodes"]["b"]["status"] == "skipped"
+    assert run["status"] == "success"
+
+def test_taken_over_run_is_left_alone(fast_engine, admin, fake_runner):
+    from db.database import db
+
+    fake_runner.options["backup"] = ["--duration", "3"]
+    workflow_id = _create(admin, [{"id": "backup", "playbook": "backup"}])
+    run_id = _start(admin, workflow_id)
+    _wait_for_node(admin, run_id, "backup", "running")
+    admin.portal.call(
+        db.workflow_runs.update_one,
+        {"_id": run_id},
+        {"$set": {"owner": "other-engine", "lease_expires_at": datetime.utcnow() + timedelta(seconds=60)}},
+    )
+    deadline = time.monotonic() + 5
+    while run_id in fast_engine._runs and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert run_id not in fast_engine._runs
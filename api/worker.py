@@ -0,0 +1,54 @@
+"""
+Standalone runner worker.
+
+Pulls playbook jobs from the job broker and executes them, so playbook
+execution can be scaled across nodes independently of the API servers.
+
+Usage:
+    JOB_DISPATCH=broker python worker.py [--worker-id ID] [--metrics-port PORT]
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from core import metrics
+from core.config import settings
+from services.ansible_runner import runner_pool
+from services.artifact_store import artifact_store, run_retention
+from services.broker import broker
+from services.playbook_catalog import ANSIBLE_DIR
+from services.process_identity import PROCESS_ID
+from services.runner_worker import RunnerWorker
+from services.scheduler import scheduler
+
+async def main(worker_id: str, metrics_port: int = 0):
+    await broker.ensure_indexes()
+    worker = RunnerWorker(broker, scheduler, worker_id)
+    metrics.JOBS_RUNNING.set_function(lambda: scheduler.running)
+    metrics.JOBS_QUEUED.set_function(lambda: scheduler.queued)
+    metrics.RUNNER_POOL_IDLE.set_function(lambda: runner_pool.idle)
+    metrics_task = asyncio.create_task(metrics.serve(metrics_port)) if metrics_port else None
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, worker.stop)
+    retention_task = asyncio.create_task(
+        run_retention(artifact_store, ANSIBLE_DIR, settings.ARTIFACT_PRUNE_INTERVAL_SECONDS)
+    )
+    runner_pool.start()
+    try:
+        await worker.run()
+    finally:
+        retention_task.cancel()
+        if metrics_task:
+            metrics_task.cancel()
+        await runner_pool.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a playbook runner worker.")
+    parser.add_argument("--worker-id", default=PROCESS_ID)
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve /metrics on this port (0: off).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(main(args.worker_id, args.metrics_port))
+    except KeyboardInterrupt:
+        pass
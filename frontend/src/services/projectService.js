@@ -39,11 +39,18 @@ api.interceptors.response.use(
 )
 
 export const projectService = {
-  // Get all projects
+  // Get all projects, following the pagination cursor page by page
   async getProjects() {
     try {
-      const response = await api.get('/projects/')
-      return response.data
+      const projects = []
+      let after = null
+      do {
+        const params = { limit: 1000, ...(after ? { after } : {}) }
+        const response = await api.get('/projects/', { params })
+        projects.push(...response.data)
+        after = response.headers['x-next-cursor']
+      } while (after)
+      return projects
     } catch (error) {
       console.error('Error fetching projects:', error)
       throw error